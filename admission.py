@@ -0,0 +1,192 @@
+import threading
+import time
+
+# Tokens a request takes from its buckets. Heavy reads walk or encode whole
+# collections and cost the most; single-record writes cost one token. Any
+# action not listed costs DEFAULT_COST.
+ACTION_COSTS = {
+    "list_dashboard": 20,
+    "export": 50,
+    "list_users": 5,
+    "list_games": 5,
+    "list_rentals": 5,
+    "overdue": 5,
+    "stats": 2,
+    "import_users": 10,
+    "import_games": 10,
+    "import_rentals": 10,
+}
+DEFAULT_COST = 1
+# Never throttled or queued: cheap, and needed to watch an overloaded server
+EXEMPT_ACTIONS = frozenset({"ping", "logout", "metrics", "replication"})
+# Served first by the admission queue, so rental latency stays bounded
+# while heavy reads wait or are shed
+PRIORITY_ACTIONS = frozenset({"create_rental", "return_rental", "reserve_games"})
+
+DEFAULT_QUEUE = 64
+DEFAULT_MAX_WAIT = 0.5
+MIN_RETRY_AFTER = 0.05
+THROTTLED_MESSAGE = "Rate limit exceeded, retry later"
+BUSY_MESSAGE = "Server busy, try again later"
+
+
+def cost_of(action):
+    return ACTION_COSTS.get(action, DEFAULT_COST) if isinstance(action, str) else DEFAULT_COST
+
+def retry_reply(message, seconds):
+    return {"status": "error", "message": message, "retry_after": round(max(seconds, MIN_RETRY_AFTER), 3)}
+
+
+# --- Rate limits ---
+class TokenBucket:
+    # Holds up to `burst` tokens and refills at `rate` per second. Not
+    # thread-safe: a connection's bucket is only used by that connection,
+    # and RateLimiter guards the shared per-user buckets.
+    __slots__ = ("rate", "burst", "tokens", "updated")
+
+    def __init__(self, rate, burst, now=None):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic() if now is None else now
+
+    def take(self, cost, now):
+        # 0.0 when the tokens were taken, else seconds until there will be
+        # enough. A cost above the burst is capped, or it could never pass.
+        cost = min(cost, self.burst)
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= cost:
+            self.tokens -= cost
+            return 0.0
+        return (cost - self.tokens) / self.rate
+
+    def give(self, cost):
+        self.tokens = min(self.burst, self.tokens + min(cost, self.burst))
+
+
+class ClientLimit:
+    # One connection's view of the limits: its own bucket and the shared
+    # bucket of the user it authenticated as
+    __slots__ = ("limiter", "bucket", "username")
+
+    def __init__(self, limiter, username):
+        self.limiter = limiter
+        self.bucket = TokenBucket(limiter.rate, limiter.burst) if limiter.rate else None
+        self.username = username
+
+    def check(self, action):
+        # None when allowed, else the seconds to wait before retrying
+        return self.limiter.check(self, cost_of(action))
+
+
+class RateLimiter:
+    # Token buckets per connection and per authenticated user; a rate of 0
+    # turns that limit off. A request must fit in both; when the user's
+    # bucket refuses it the connection's tokens are handed back.
+    def __init__(self, rate=0.0, burst=0.0, user_rate=0.0, user_burst=0.0):
+        self.rate = rate
+        self.burst = burst or rate
+        self.user_rate = user_rate
+        self.user_burst = user_burst or user_rate
+        self.throttled = 0
+        self._users = {}
+        self._lock = threading.Lock()
+
+    def client(self, username):
+        return ClientLimit(self, username)
+
+    def check(self, client, cost):
+        now = time.monotonic()
+        wait = client.bucket.take(cost, now) if client.bucket is not None else 0.0
+        if not wait and self.user_rate and client.username is not None:
+            with self._lock:
+                bucket = self._users.get(client.username)
+                if bucket is None:
+                    bucket = self._users[client.username] = TokenBucket(self.user_rate, self.user_burst, now)
+                wait = bucket.take(cost, now)
+            if wait and client.bucket is not None:
+                client.bucket.give(cost)
+        if not wait:
+            return None
+        with self._lock:
+            self.throttled += 1
+        return wait
+
+
+# --- Admission ---
+class AdmissionQueue:
+    # At most `limit` requests run at once (0: no limit), and with a limit
+    # above one, the last slot is kept for priority requests so a rental
+    # never waits behind a full set of heavy reads. Beyond that, requests
+    # wait in line: up to `queue` priority requests and as many others,
+    # each for at most `max_wait` seconds. Priority requests go first
+    # whenever a slot frees up; a request that finds its line full or
+    # waits too long is shed with an estimate of when to retry.
+    def __init__(self, limit=0, queue=DEFAULT_QUEUE, max_wait=DEFAULT_MAX_WAIT):
+        self.limit = limit
+        self.queue = queue
+        self.max_wait = max_wait
+        self.active = 0
+        self.waiting = 0
+        self.priority_waiting = 0
+        self.admitted = 0
+        self.shed = 0
+        # Moving average of how long a request holds its slot
+        self.service_time = 0.001
+        self._ready = threading.Condition(threading.Lock())
+
+    def enter(self, priority):
+        # Returns None once the caller holds a slot (release it with
+        # leave(elapsed)), else the seconds to wait before retrying
+        if not self.limit:
+            return None
+        with self._ready:
+            if self._free(priority):
+                return self._admit()
+            if (self.priority_waiting if priority else self.waiting - self.priority_waiting) >= self.queue:
+                return self._refuse()
+            self.waiting += 1
+            if priority:
+                self.priority_waiting += 1
+            deadline = time.monotonic() + self.max_wait
+            try:
+                while not self._free(priority):
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        return self._refuse()
+                    self._ready.wait(remaining)
+                return self._admit()
+            finally:
+                self.waiting -= 1
+                if priority:
+                    self.priority_waiting -= 1
+
+    def _free(self, priority):
+        if priority:
+            return self.active < self.limit
+        return self.active < max(self.limit - 1, 1) and not self.priority_waiting
+
+    def _admit(self):
+        self.active += 1
+        self.admitted += 1
+        return None
+
+    def _refuse(self):
+        # Long enough for the work already admitted or in line to drain
+        self.shed += 1
+        return (self.active + self.waiting + 1) * self.service_time / max(self.limit, 1)
+
+    def leave(self, elapsed):
+        if not self.limit:
+            return
+        with self._ready:
+            self.active -= 1
+            self.service_time += (elapsed - self.service_time) * 0.05
+            self._ready.notify_all()
+
+    def stats(self):
+        with self._ready:
+            return {"limit": self.limit, "active": self.active, "waiting": self.waiting,
+                    "admitted": self.admitted, "shed": self.shed,
+                    "service_ms": round(self.service_time * 1000, 3)}
@@ -0,0 +1,107 @@
+import datetime
+import heapq
+import threading
+from functools import lru_cache
+
+LATE_FEE_PER_DAY = 2
+
+
+# --- Dates ---
+# Rentals hold due/return dates as proleptic Gregorian ordinals (ints), so
+# comparisons and fee arithmetic are plain integer operations. The ISO
+# strings only appear at the edges (replies, journal records); both
+# conversions are cached because only a few hundred distinct days are live.
+@lru_cache(maxsize=4096)
+def date_ordinal(value):
+    return datetime.date.fromisoformat(value).toordinal()
+
+@lru_cache(maxsize=4096)
+def ordinal_date(ordinal):
+    return datetime.date.fromordinal(ordinal).isoformat()
+
+def today_ordinal():
+    return datetime.date.today().toordinal()
+
+def late_fee(due_day, return_day):
+    return max(0, (return_day - due_day) * LATE_FEE_PER_DAY)
+
+
+class DashboardAggregates:
+    # Running totals for the ops screens, updated by the store on every
+    # mutation. Open rentals are bucketed by due day; when the calendar moves
+    # past a bucket its count is folded into the overdue totals, so reading
+    # the stats costs O(days elapsed since the last read), never O(rentals).
+    #
+    # Fees accruing on open overdue rentals are
+    #   LATE_FEE_PER_DAY * sum(today - due) = fee * (count * today - sum(due))
+    # which only needs the overdue count and the sum of their due ordinals.
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.games = 0
+        self.stock_on_hand = 0
+        self.active_rentals = 0
+        self.total_rentals = 0
+        self.charged_late_fees = 0
+        self.overdue_rentals = 0
+        self._overdue_due_sum = 0
+        self._open_by_due = {}
+        self._due_heap = []
+        self._overdue_before = 0
+
+    # --- Updates from the store ---
+    def game_added(self, stock):
+        with self._lock:
+            self.games += 1
+            self.stock_on_hand += stock
+
+    def rental_opened(self, due):
+        with self._lock:
+            self.stock_on_hand -= 1
+            self.active_rentals += 1
+            self.total_rentals += 1
+            if due < self._overdue_before:
+                self.overdue_rentals += 1
+                self._overdue_due_sum += due
+            elif due in self._open_by_due:
+                self._open_by_due[due] += 1
+            else:
+                self._open_by_due[due] = 1
+                heapq.heappush(self._due_heap, due)
+
+    def rental_closed(self, due, fee):
+        with self._lock:
+            self.stock_on_hand += 1
+            self.active_rentals -= 1
+            self.charged_late_fees += fee
+            if due < self._overdue_before:
+                self.overdue_rentals -= 1
+                self._overdue_due_sum -= due
+            else:
+                self._open_by_due[due] -= 1
+
+    # --- Reads ---
+    def _advance(self, today):
+        # Caller holds the lock
+        heap = self._due_heap
+        while heap and heap[0] < today:
+            due = heapq.heappop(heap)
+            count = self._open_by_due.pop(due)
+            self.overdue_rentals += count
+            self._overdue_due_sum += due * count
+        self._overdue_before = max(self._overdue_before, today)
+
+    def snapshot(self, today=None):
+        today = (today or datetime.date.today()).toordinal()
+        with self._lock:
+            self._advance(today)
+            accrued = LATE_FEE_PER_DAY * (self.overdue_rentals * today - self._overdue_due_sum)
+            return {
+                "games": self.games,
+                "stock_on_hand": self.stock_on_hand,
+                "active_rentals": self.active_rentals,
+                "total_rentals": self.total_rentals,
+                "overdue_rentals": self.overdue_rentals,
+                "accrued_late_fees": accrued,
+                "charged_late_fees": self.charged_late_fees,
+                "outstanding_late_fees": accrued + self.charged_late_fees,
+            }
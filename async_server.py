@@ -0,0 +1,284 @@
+import asyncio
+import logging
+import signal
+from concurrent.futures import ThreadPoolExecutor
+
+import bulk
+import server
+from feed import HEARTBEAT_INTERVAL, end_notice, heartbeat
+from persistence import SYNC
+from protocol import MODE_FRAMED, FrameDecoder, ProtocolError, RECV_SIZE, encode_message
+
+# --- Defaults ---
+DEFAULT_MAX_CONNECTIONS = 10000
+DEFAULT_IDLE_TIMEOUT = 300.0
+DEFAULT_DRAIN_TIMEOUT = 10.0
+# Threads that run requests for the loop. Nearly every request takes the
+# store's locks (game stripes, the change feed, the aggregates), which
+# scheduler and snapshot threads hold too, so none runs on the loop itself:
+# a loop waiting on a lock would stall every connection. Follow streams
+# also hold a thread each while they wait for records.
+DEFAULT_WORKERS = 32
+
+BUSY_RESPONSE = {"status": "error", "message": "Server busy, try again later"}
+
+
+class Connection:
+    __slots__ = ("address", "busy", "streaming", "last_active")
+
+    def __init__(self, address, now):
+        self.address = address
+        self.busy = False
+        self.streaming = False
+        self.last_active = now
+
+
+class AsyncServer:
+    # Event loop plus worker pool. Every connection is a coroutine on one
+    # loop instead of an OS thread, so idle connections cost no thread; the
+    # loop only reads, writes and waits. Requests run on the pool's threads
+    # (DEFAULT_WORKERS), through the same server.authenticate and
+    # server.process_request dispatch as handle_client.
+    def __init__(self, host="0.0.0.0", port=5000, backlog=server.DEFAULT_BACKLOG,
+                 max_connections=DEFAULT_MAX_CONNECTIONS,
+                 idle_timeout=DEFAULT_IDLE_TIMEOUT,
+                 drain_timeout=DEFAULT_DRAIN_TIMEOUT, reuse_port=False, workers=DEFAULT_WORKERS):
+        self.host = host
+        self.port = port
+        self.backlog = backlog
+        self.max_connections = max_connections
+        self.idle_timeout = idle_timeout
+        self.drain_timeout = drain_timeout
+        self.reuse_port = reuse_port
+        self.workers = workers
+        self.connections = {}
+        self.draining = False
+        self._server = None
+        self._reaper = None
+
+    async def start(self):
+        asyncio.get_running_loop().set_default_executor(
+            ThreadPoolExecutor(self.workers, thread_name_prefix="async-worker"))
+        self._server = await asyncio.start_server(
+            self._handle, self.host, self.port, backlog=self.backlog, reuse_port=self.reuse_port or None)
+        self.port = self._server.sockets[0].getsockname()[1]
+        if self.idle_timeout:
+            self._reaper = asyncio.create_task(self._reap_idle())
+        return self
+
+    async def serve_forever(self):
+        async with self._server:
+            await self._server.serve_forever()
+
+    async def _reap_idle(self):
+        # One sweep every quarter timeout is far cheaper than arming a timer
+        # around every read on every connection.
+        loop = asyncio.get_running_loop()
+        interval = max(self.idle_timeout / 4, 0.05)
+        while True:
+            await asyncio.sleep(interval)
+            cutoff = loop.time() - self.idle_timeout
+            for task, conn in list(self.connections.items()):
+                if not conn.busy and not conn.streaming and conn.last_active < cutoff:
+                    logging.info(f"Idle timeout: {conn.address}")
+                    task.cancel()
+
+    async def _read_payload(self, reader, decoder, conn):
+        while not decoder.pending:
+            data = await reader.read(RECV_SIZE)
+            if not data:
+                return None
+            conn.last_active = asyncio.get_running_loop().time()
+            decoder.feed(data)
+        return decoder.next_payload()
+
+    async def _handle(self, reader, writer):
+        address = writer.get_extra_info("peername")
+        task = asyncio.current_task()
+        conn = Connection(address, asyncio.get_running_loop().time())
+        decoder = FrameDecoder()
+        over_capacity = len(self.connections) >= self.max_connections
+        self.connections[task] = conn
+        server.counters.connection_opened()
+        try:
+            # Refused before reading anything, so a rejected connection does
+            # not hold its slot until the client speaks. The client's framing
+            # is not known yet; framed is what current clients use.
+            if over_capacity or self.draining:
+                logging.info(f"Rejected connection (busy): {address}")
+                _write(writer, encode_message(BUSY_RESPONSE, MODE_FRAMED))
+                await writer.drain()
+                return
+
+            # --- Authentication ---
+            auth_data = await self._read_payload(reader, decoder, conn)
+            if auth_data is None:
+                return
+            mode = decoder.mode
+            loop = asyncio.get_running_loop()
+            authenticated, response, data, username = await loop.run_in_executor(None, server.authenticate, auth_data)
+            if response is not None:
+                _write(writer, encode_message(response, mode))
+                await writer.drain()
+            if not authenticated:
+                return
+
+            # --- Handle requests ---
+            client = server.limiter.client(username)
+            while not self.draining:
+                if data is None:
+                    data = await self._read_payload(reader, decoder, conn)
+                    if data is None:
+                        break
+                conn.busy = True
+                # One executor hop for the whole pipelined batch
+                replies, subscriber, export, stream, data = await loop.run_in_executor(
+                    None, _process_batch, data, decoder, mode, client)
+                journal = server.store.journal
+                if journal is not None and journal.durability == SYNC:
+                    # Group commit without blocking the loop. journal.lsn rather
+                    # than the thread's own, since the batch was appended from
+                    # an executor thread.
+                    await loop.run_in_executor(None, journal.wait_durable, journal.lsn)
+                _write(writer, b"".join(replies))
+                # Backpressure: a slow reader suspends only its own coroutine
+                await writer.drain()
+                if export is not None:
+                    for chunk in bulk.export_chunks(export, mode):
+                        _write(writer, chunk)
+                        await writer.drain()
+                conn.busy = False
+                if subscriber is not None:
+                    conn.streaming = True
+                    await self._stream_events(writer, subscriber, mode)
+                    break
+                if stream is not None:
+                    conn.streaming = True
+                    await self._stream_replication(writer, stream, mode)
+                    break
+
+        except asyncio.CancelledError:
+            pass
+        except ProtocolError as pe:
+            logging.error(f"Protocol error from {address}: {pe}")
+        except Exception as e:
+            logging.error(f"Error handling client {address}: {e}")
+        finally:
+            self.connections.pop(task, None)
+            server.counters.connection_closed()
+            writer.close()
+            logging.info(f"Closed connection: {address}")
+
+    async def _stream_events(self, writer, subscriber, mode):
+        loop = asyncio.get_running_loop()
+        ready = asyncio.Event()
+
+        def wakeup():
+            # Publishers may run on other threads; hop onto the loop
+            if not ready.is_set():
+                loop.call_soon_threadsafe(ready.set)
+
+        subscriber.attach(wakeup)
+        try:
+            while True:
+                try:
+                    await asyncio.wait_for(ready.wait(), HEARTBEAT_INTERVAL)
+                except asyncio.TimeoutError:
+                    pass
+                ready.clear()
+                batch = subscriber.take()
+                if batch:
+                    _write(writer, b"".join(event.encode(mode) for event in batch))
+                elif subscriber.overflowed or subscriber.closed:
+                    _write(writer, encode_message(end_notice(subscriber), mode))
+                    await writer.drain()
+                    logging.info(f"Dropped subscriber at seq {subscriber.last_seq}")
+                    return
+                else:
+                    _write(writer, encode_message(heartbeat(server.store.feed.seq), mode))
+                await writer.drain()
+        finally:
+            server.store.feed.unsubscribe(subscriber)
+
+    async def _stream_replication(self, writer, stream, mode):
+        # The follow stream blocks between records, so each message is
+        # pulled on an executor thread
+        loop = asyncio.get_running_loop()
+        try:
+            while True:
+                message = await loop.run_in_executor(None, next, stream, None)
+                if message is None:
+                    return
+                _write(writer, encode_message(message, mode))
+                await writer.drain()
+        finally:
+            stream.close()
+
+    async def shutdown(self):
+        # Graceful drain: stop accepting, drop idle connections straight away
+        # and give in-flight batches up to drain_timeout to finish.
+        self.draining = True
+        if self._reaper is not None:
+            self._reaper.cancel()
+        if self._server is not None:
+            self._server.close()
+        for task, conn in list(self.connections.items()):
+            if not conn.busy:
+                task.cancel()
+        pending = list(self.connections)
+        if pending:
+            done, still_running = await asyncio.wait(pending, timeout=self.drain_timeout)
+            for task in still_running:
+                task.cancel()
+            if still_running:
+                await asyncio.wait(still_running)
+        if self._server is not None:
+            await self._server.wait_closed()
+        logging.info("Async server drained")
+
+
+def _process_batch(data, decoder, mode, client):
+    # Runs on an executor thread: the request in data and any others
+    # already decoded behind it, up to one that hands the connection over
+    # (subscribe, follow) or streams an export after its reply. Returns the
+    # encoded replies, what was handed over, and the next undone request.
+    replies = []
+    subscriber = export = stream = None
+    while data is not None:
+        response = server.process_request(data, True, client)
+        subscriber = response.pop("subscriber", None) if isinstance(response, dict) else None
+        export = response.pop("export", None) if isinstance(response, dict) else None
+        stream = response.pop("stream", None) if isinstance(response, dict) else None
+        replies.append(encode_message(response, mode))
+        if subscriber is not None or stream is not None:
+            break
+        data = decoder.next_payload()
+        if export is not None:
+            break
+    return replies, subscriber, export, stream, data
+
+
+def _write(writer, data):
+    writer.write(data)
+    server.counters.sent(len(data))
+
+
+def run(host="0.0.0.0", port=5000, **options):
+    async def _main():
+        engine = await AsyncServer(host, port, **options).start()
+        try:
+            asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, asyncio.current_task().cancel)
+        except NotImplementedError:
+            pass
+        print(f"GameHub async server running on {host}:{engine.port}")
+        try:
+            await engine.serve_forever()
+        except asyncio.CancelledError:
+            pass
+        finally:
+            await engine.shutdown()
+
+    try:
+        asyncio.run(_main())
+    except KeyboardInterrupt:
+        pass
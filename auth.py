@@ -0,0 +1,149 @@
+import hashlib
+import hmac
+import os
+import re
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+SCHEME = "pbkdf2_sha256"
+DEFAULT_ITERATIONS = 100000
+SALT_BYTES = 16
+VERIFY_CACHE_SIZE = 4096
+DEFAULT_SESSION_TTL = 12 * 3600
+
+# Iterations for newly hashed passwords; the server sets this from
+# --hash-iterations. Stored hashes carry their own count.
+iterations = DEFAULT_ITERATIONS
+
+
+# --- Password hashing ---
+# Stored form: "pbkdf2_sha256$<iterations>$<salt hex>$<digest hex>"
+def hash_password(password, rounds=None, salt=None):
+    rounds = rounds or iterations
+    salt = salt or os.urandom(SALT_BYTES)
+    digest = hashlib.pbkdf2_hmac("sha256", password.encode(), salt, rounds)
+    return f"{SCHEME}${rounds}${salt.hex()}${digest.hex()}"
+
+def hash_passwords(passwords):
+    # Key derivation releases the GIL, so a batch is spread over all cores
+    passwords = list(passwords)
+    if len(passwords) < 2:
+        return [hash_password(p) for p in passwords]
+    with ThreadPoolExecutor(min(len(passwords), os.cpu_count() or 1)) as pool:
+        return list(pool.map(hash_password, passwords))
+
+def is_hashed(stored):
+    return stored.startswith(SCHEME + "$")
+
+def _check(password, stored):
+    if not is_hashed(stored):
+        # Plaintext written before hashing was introduced
+        return hmac.compare_digest(password.encode(), stored.encode())
+    try:
+        _, rounds, salt, digest = stored.split("$")
+        expected = bytes.fromhex(digest)
+        actual = hashlib.pbkdf2_hmac("sha256", password.encode(), bytes.fromhex(salt), int(rounds))
+    except ValueError:
+        return False
+    return hmac.compare_digest(actual, expected)
+
+
+class VerifyCache:
+    # Remembers successful verifications so a client that logs in again
+    # costs one HMAC instead of a full key derivation. Entries are keyed by
+    # an HMAC under a per-process secret, so neither the password nor a
+    # fast unsalted hash of it is held in memory. Failures are never cached.
+    def __init__(self, size=VERIFY_CACHE_SIZE):
+        self.size = size
+        self._key = os.urandom(32)
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _fingerprint(self, password, stored):
+        return hmac.new(self._key, f"{stored}\0{password}".encode(), hashlib.sha256).digest()
+
+    def verify(self, password, stored):
+        if not isinstance(password, str) or not isinstance(stored, str):
+            return False
+        fingerprint = self._fingerprint(password, stored)
+        with self._lock:
+            if fingerprint in self._entries:
+                self._entries.move_to_end(fingerprint)
+                return True
+        if not _check(password, stored):
+            return False
+        with self._lock:
+            self._entries[fingerprint] = True
+            if len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+        return True
+
+
+verify_cache = VerifyCache()
+
+def verify_password(password, stored):
+    return verify_cache.verify(password, stored)
+
+
+# --- New-user checks ---
+# Compiled once; shared by add_user and import_users
+EMAIL_PATTERN = re.compile(r"^[\w\.-]+@[\w\.-]+\.\w+$")
+PASSWORD_PATTERN = re.compile(r"^(?=.*[a-z])(?=.*[A-Z])(?=.*\d)(?=.*[@$!%*?&])[A-Za-z\d@$!%*?&]{8,}$")
+EMAIL_ERROR = "Invalid email format"
+PASSWORD_ERROR = "Password must be at least 8 characters, include upper/lowercase, number, and special char"
+
+def check_new_user(email, password):
+    # Returns the reason a new account is rejected, or None
+    if not isinstance(email, str) or not EMAIL_PATTERN.match(email):
+        return EMAIL_ERROR
+    if not isinstance(password, str) or not PASSWORD_PATTERN.match(password):
+        return PASSWORD_ERROR
+    return None
+
+
+# --- Sessions ---
+class SessionManager:
+    # Opaque random tokens mapped to (username, expiry). Checking a token is
+    # a dict lookup; expired entries are swept when new tokens are issued.
+    def __init__(self, ttl=DEFAULT_SESSION_TTL):
+        self.ttl = ttl
+        self._sessions = {}
+        self._lock = threading.Lock()
+        self._next_sweep = time.monotonic() + ttl
+
+    def issue(self, username):
+        token = secrets.token_urlsafe(32)
+        now = time.monotonic()
+        with self._lock:
+            self._sessions[token] = (username, now + self.ttl)
+            if now >= self._next_sweep:
+                self._sessions = {t: s for t, s in self._sessions.items() if s[1] > now}
+                self._next_sweep = now + self.ttl
+        return token
+
+    def check(self, token):
+        # Returns the username for a live token, otherwise None
+        if not isinstance(token, str):
+            return None
+        session = self._sessions.get(token)
+        if session is None:
+            return None
+        if session[1] <= time.monotonic():
+            self.revoke(token)
+            return None
+        return session[0]
+
+    def add(self, token, username, ttl):
+        # A session issued by another cluster worker, with its remaining ttl
+        with self._lock:
+            self._sessions[token] = (username, time.monotonic() + ttl)
+
+    def revoke(self, token):
+        with self._lock:
+            return self._sessions.pop(token, None) is not None
+
+    def __len__(self):
+        return len(self._sessions)
@@ -0,0 +1,105 @@
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import queries
+from protocol import encode_message
+from sqlite_store import SqliteStore
+from store import Store, StoreError
+
+USERS = 10000
+GAMES = 5000
+
+
+# --- Fixtures ---
+def dataset(rentals):
+    # Deterministic rows shared by both backends; about a third stay open
+    rng = random.Random(0)
+    rows = []
+    for rental_id in range(1, rentals + 1):
+        returned = rng.random() < 0.66
+        rows.append((rental_id, rng.randint(1, USERS), rng.randint(1, GAMES), "2025-01-08",
+                     int(returned), 0, "2025-01-07" if returned else None))
+    return rows
+
+def load_memory(rows):
+    store = Store()
+    for i in range(1, USERS + 1):
+        store.apply_record(["U", i, f"user{i}", f"user{i}@example.com", "Passw0rd!"])
+    for i in range(1, GAMES + 1):
+        store.apply_record(["G", i, f"Game {i}", 1000])
+    for rental_id, user_id, game_id, due, returned, fee, return_date in rows:
+        store.apply_record(["R", rental_id, user_id, game_id, due, 1000])
+        if returned:
+            store.apply_record(["X", rental_id, return_date, fee, 1000])
+    store.rebuild_aggregates()
+    return store
+
+def load_sqlite(rows, path):
+    store = SqliteStore(path)
+    conn = store._connection()
+    with store._write():
+        conn.executemany("INSERT INTO users VALUES (?, ?, ?, ?)",
+                         ((i, f"user{i}", f"user{i}@example.com", "Passw0rd!") for i in range(1, USERS + 1)))
+        conn.executemany("INSERT INTO games VALUES (?, ?, ?)",
+                         ((i, f"Game {i}", 1000) for i in range(1, GAMES + 1)))
+        conn.executemany("INSERT INTO rentals VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+    store.rebuild_aggregates()
+    return store
+
+
+# --- Measurements ---
+def timed(fn, repeat):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - started) / repeat * 1000
+
+def run(store, repeat):
+    rng = random.Random(1)
+    results = {}
+
+    def rent_and_return():
+        try:
+            rental = store.create_rental(rng.randint(1, USERS), rng.randint(1, GAMES))
+            store.return_rental(rental.rental_id)
+        except StoreError:
+            pass
+    results["rent+return"] = timed(rent_and_return, repeat)
+    results["open page"] = timed(lambda: queries.list_rentals(store, {"status": "open", "limit": 50,
+                                                                      "cursor": rng.randint(0, 1000)}), repeat)
+    results["user page"] = timed(lambda: queries.list_rentals(store, {"user_id": rng.randint(1, USERS)}), repeat)
+    results["game count"] = timed(lambda: store.count_rentals("open", None, rng.randint(1, GAMES)), repeat)
+    results["stats"] = timed(lambda: store.aggregates.snapshot(), repeat)
+    results["dashboard"] = timed(lambda: encode_message(store.dashboard()), 1)
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the memory and SQLite backends")
+    parser.add_argument("--rentals", type=int, default=200000)
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    rows = dataset(args.rentals)
+    path = os.path.join(tempfile.mkdtemp(prefix="gamehub-sqlite-"), "bench.db")
+    backends = {}
+    for name, load in (("memory", lambda: load_memory(rows)), ("sqlite", lambda: load_sqlite(rows, path))):
+        started = time.perf_counter()
+        store = load()
+        print(f"loaded {args.rentals} rentals into {name} in {time.perf_counter() - started:.1f}s")
+        backends[name] = run(store, args.repeat)
+
+    print()
+    print(f"{'ms per operation':<18}" + "".join(f"{name:>12}" for name in backends))
+    for metric in backends["memory"]:
+        print(f"{metric:<18}" + "".join(f"{backends[name][metric]:>12.3f}" for name in backends))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+import argparse
+import multiprocessing
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from protocol import MessageReader, send_message, send_messages
+
+AUTH = {"type": "auth", "username": "admin", "password": "password123"}
+BASE_ARGS = ["--hash-iterations", "1000", "--log-level", "off", "--overdue-interval", "0"]
+STOCK = 1000000
+
+
+# --- Server process ---
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def start_server(port, workers, engine):
+    workdir = tempfile.mkdtemp(prefix="gamehub-cluster-")
+    cmd = [sys.executable, os.path.join(ROOT, "server.py"), "--host", "127.0.0.1", "--port", str(port),
+           "--peer-port", str(free_port()), "--workers", str(workers), "--engine", engine, *BASE_ARGS]
+    proc = subprocess.Popen(cmd, cwd=workdir, stdout=subprocess.DEVNULL)
+    deadline = time.time() + 10
+    while time.time() < deadline:
+        try:
+            connect(port)[0].close()
+            return proc
+        except OSError:
+            time.sleep(0.1)
+    proc.kill()
+    raise RuntimeError("server did not start")
+
+def connect(port):
+    sock = socket.create_connection(("127.0.0.1", port))
+    reader = MessageReader(sock)
+    send_message(sock, AUTH)
+    if reader.read_message().get("status") != "ok":
+        raise ConnectionError("authentication failed")
+    return sock, reader
+
+def call(sock, reader, request):
+    send_message(sock, request)
+    return reader.read_message()
+
+
+# --- Workload ---
+def populate(port, users, games):
+    sock, reader = connect(port)
+    game_ids = call(sock, reader, {"action": "import_games", "records": [
+        {"title": f"Game {i}", "stock": STOCK} for i in range(games)]})["ids"]
+    user_ids = call(sock, reader, {"action": "import_users", "records": [
+        {"name": f"user{i}", "email": f"user{i}@example.com", "password": "Passw0rd!"} for i in range(users)]})["ids"]
+    sock.close()
+    return user_ids, game_ids
+
+def next_request(rng, user_ids, game_ids, rentals):
+    roll = rng.random()
+    if roll < 0.05:
+        return {"action": "stats"}
+    if roll < 0.45 and rentals:
+        return {"action": "return_rental", "rental_id": rentals.pop(rng.randrange(len(rentals)))}
+    return {"action": "create_rental", "user_id": rng.choice(user_ids), "game_id": rng.choice(game_ids)}
+
+def client(port, seconds, pipeline, user_ids, game_ids, seed, results):
+    # Each client keeps `pipeline` requests in flight on its own connection
+    rng = random.Random(seed)
+    sock, reader = connect(port)
+    rentals = []
+    done = 0
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        batch = [next_request(rng, user_ids, game_ids, rentals) for _ in range(pipeline)]
+        send_messages(sock, batch)
+        for request in batch:
+            reply = reader.read_message()
+            if reply.get("status") != "ok":
+                raise RuntimeError(f"{request['action']} failed: {reply}")
+            if request["action"] == "create_rental":
+                rentals.append(reply["rental_id"])
+        done += len(batch)
+    sock.close()
+    results.put(done)
+
+def run(workers, args):
+    port = free_port()
+    proc = start_server(port, workers, args.engine)
+    try:
+        user_ids, game_ids = populate(port, args.users, args.games)
+        results = multiprocessing.Queue()
+        clients = [multiprocessing.Process(target=client, args=(port, args.seconds, args.pipeline,
+                                                                user_ids, game_ids, seed, results))
+                   for seed in range(args.clients)]
+        for c in clients:
+            c.start()
+        total = sum(results.get() for _ in clients)
+        for c in clients:
+            c.join()
+        # Every copy is either on the shelf or out on an open rental
+        sock, reader = connect(port)
+        stats = call(sock, reader, {"action": "stats"})["stats"]
+        sock.close()
+        consistent = stats["stock_on_hand"] + stats["active_rentals"] == STOCK * args.games
+    finally:
+        proc.terminate()
+        proc.wait()
+    return total / args.seconds, consistent
+
+def main():
+    parser = argparse.ArgumentParser(description="Throughput of the sharded server by worker count")
+    parser.add_argument("--workers", type=int, nargs="+",
+                        default=sorted({1, *(n for n in (2, 4, 8) if n <= (os.cpu_count() or 1))}))
+    parser.add_argument("--engine", choices=["threaded", "async"], default="threaded")
+    parser.add_argument("--clients", type=int, default=8, help="client processes")
+    parser.add_argument("--pipeline", type=int, default=16, help="requests in flight per client")
+    parser.add_argument("--seconds", type=float, default=10.0)
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--games", type=int, default=500)
+    args = parser.parse_args()
+
+    print(f"{os.cpu_count()} CPUs, {args.clients} client processes, mix: 55% rent, 40% return, 5% stats")
+    print(f"{'workers':>8}{'req/s':>12}{'speedup':>10}  consistent")
+    baseline = None
+    for workers in args.workers:
+        rate, consistent = run(workers, args)
+        baseline = baseline or rate
+        print(f"{workers:>8}{rate:>12.0f}{rate / baseline:>9.2f}x  {'yes' if consistent else 'NO'}")
+
+if __name__ == "__main__":
+    main()
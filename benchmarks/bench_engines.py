@@ -0,0 +1,121 @@
+import argparse
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from protocol import FrameDecoder, encode_message, decode_payload
+
+AUTH = {"type": "auth", "username": "admin", "password": "password123"}
+
+# --- Server process ---
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def start_server(engine, port, backlog, max_connections):
+    # Each run gets its own working directory so server_log.txt stays out of the repo
+    workdir = tempfile.mkdtemp(prefix=f"gamehub-{engine}-")
+    cmd = [sys.executable, os.path.join(ROOT, "server.py"), "--host", "127.0.0.1",
+           "--port", str(port), "--engine", engine, "--backlog", str(backlog),
+           "--max-connections", str(max_connections)]
+    proc = subprocess.Popen(cmd, cwd=workdir, stdout=subprocess.DEVNULL)
+    deadline = time.time() + 10
+    while time.time() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.5).close()
+            return proc
+        except OSError:
+            time.sleep(0.05)
+    proc.kill()
+    raise RuntimeError(f"{engine} server did not start")
+
+# --- Client side ---
+async def read_message(reader, decoder):
+    while not decoder.pending:
+        data = await reader.read(65536)
+        if not data:
+            raise ConnectionError("server closed connection")
+        decoder.feed(data)
+    return decode_payload(decoder.next_payload())
+
+async def open_client(port):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    decoder = FrameDecoder()
+    writer.write(encode_message(AUTH))
+    reply = await read_message(reader, decoder)
+    if reply.get("status") != "ok":
+        writer.close()
+        raise ConnectionError(reply.get("message"))
+    return reader, writer, decoder
+
+async def hold_connections(port, target, batch=200):
+    held = []
+    for start in range(0, target, batch):
+        results = await asyncio.gather(*(open_client(port) for _ in range(min(batch, target - start))),
+                                       return_exceptions=True)
+        held.extend(r for r in results if not isinstance(r, BaseException))
+    return held
+
+async def client_load(port, requests, pipeline, latencies):
+    reader, writer, decoder = await open_client(port)
+    sent = 0
+    while sent < requests:
+        count = min(pipeline, requests - sent)
+        batch = [{"action": "add_game", "title": f"Bench {sent + i}", "stock": 1} for i in range(count)]
+        started = time.perf_counter()
+        writer.write(b"".join(encode_message(m) for m in batch))
+        for _ in range(count):
+            await read_message(reader, decoder)
+        latencies.append((time.perf_counter() - started) / count)
+        sent += count
+    writer.close()
+
+async def measure_throughput(port, clients, requests, pipeline):
+    latencies = []
+    started = time.perf_counter()
+    await asyncio.gather(*(client_load(port, requests, pipeline, latencies) for _ in range(clients)))
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    p99 = latencies[int(len(latencies) * 0.99) - 1] if latencies else 0.0
+    return clients * requests / elapsed, p99
+
+async def run_engine(engine, args):
+    port = free_port()
+    proc = start_server(engine, port, args.backlog, args.connections + args.clients + 10)
+    try:
+        held = await hold_connections(port, args.connections)
+        rps, p99 = await measure_throughput(port, args.clients, args.requests, args.pipeline)
+        for _, writer, _ in held:
+            writer.close()
+        return len(held), rps, p99
+    finally:
+        proc.terminate()
+        proc.wait()
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare threaded and async server engines")
+    parser.add_argument("--engines", default="threaded,async")
+    parser.add_argument("--connections", type=int, default=2000,
+                        help="idle authenticated connections to hold open")
+    parser.add_argument("--clients", type=int, default=50,
+                        help="concurrent clients for the throughput phase")
+    parser.add_argument("--requests", type=int, default=200, help="requests per client")
+    parser.add_argument("--pipeline", type=int, default=1, help="requests in flight per client")
+    parser.add_argument("--backlog", type=int, default=4096)
+    args = parser.parse_args()
+
+    print(f"{'engine':<10}{'held':>8}{'req/s':>12}{'p99 ms':>10}")
+    for engine in args.engines.split(","):
+        held, rps, p99 = asyncio.run(run_engine(engine, args))
+        print(f"{engine:<10}{held:>8}{rps:>12.0f}{p99 * 1000:>10.2f}")
+
+if __name__ == "__main__":
+    main()
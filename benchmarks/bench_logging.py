@@ -0,0 +1,140 @@
+import argparse
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from protocol import MessageReader, send_message
+
+AUTH = {"type": "auth", "username": "admin", "password": "password123"}
+
+# add_user is part of the mix; keep password hashing from dominating it
+BASE_ARGS = ["--hash-iterations", "1000"]
+
+CONFIGS = {
+    "off": ["--log-level", "off"],
+    "on": ["--log-level", "info"],
+    "on, sampled": ["--log-level", "info", "--log-sample", "list_dashboard=0.01",
+                    "--log-sample", "stats=0.01"],
+}
+
+
+# --- Server process ---
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def start_server(port, extra):
+    # Each run gets its own working directory so the log stays out of the repo
+    workdir = tempfile.mkdtemp(prefix="gamehub-logging-")
+    cmd = [sys.executable, os.path.join(ROOT, "server.py"), "--host", "127.0.0.1",
+           "--port", str(port), *BASE_ARGS, *extra]
+    proc = subprocess.Popen(cmd, cwd=workdir, stdout=subprocess.DEVNULL)
+    deadline = time.time() + 10
+    while time.time() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.5).close()
+            return proc, workdir
+        except OSError:
+            time.sleep(0.05)
+    proc.kill()
+    raise RuntimeError("server did not start")
+
+def connect(port):
+    sock = socket.create_connection(("127.0.0.1", port))
+    reader = MessageReader(sock)
+    send_message(sock, AUTH)
+    if reader.read_message().get("status") != "ok":
+        raise ConnectionError("authentication failed")
+    return sock, reader
+
+def call(sock, reader, request):
+    send_message(sock, request)
+    return reader.read_message()
+
+
+# --- Workload ---
+def populate(port, users, games):
+    sock, reader = connect(port)
+    for i in range(games):
+        call(sock, reader, {"action": "add_game", "title": f"Game {i}", "stock": 1000})
+    for i in range(users):
+        call(sock, reader, {"action": "add_user", "name": f"user{i}",
+                            "email": f"user{i}@example.com", "password": "Passw0rd!"})
+    sock.close()
+
+def next_request(rng, users, games, rentals):
+    roll = rng.random()
+    if roll < 0.05:
+        return {"action": "list_dashboard"}
+    if roll < 0.15:
+        return {"action": "stats"}
+    if roll < 0.35:
+        return {"action": "add_user", "name": "bench", "email": f"bench{rng.random()}@example.com",
+                "password": "Passw0rd!"}
+    if roll < 0.60 and rentals:
+        return {"action": "return_rental", "rental_id": rentals.pop()}
+    return {"action": "create_rental", "user_id": rng.randint(1, users), "game_id": rng.randint(1, games)}
+
+def client(port, requests, users, games, seed, latencies):
+    rng = random.Random(seed)
+    sock, reader = connect(port)
+    rentals = []
+    for _ in range(requests):
+        request = next_request(rng, users, games, rentals)
+        started = time.perf_counter()
+        reply = call(sock, reader, request)
+        latencies.append(time.perf_counter() - started)
+        if "rental_id" in reply and request["action"] == "create_rental":
+            rentals.append(reply["rental_id"])
+    sock.close()
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+def run(extra, args):
+    port = free_port()
+    proc, workdir = start_server(port, extra)
+    try:
+        populate(port, args.users, args.games)
+        latencies = []
+        threads = [threading.Thread(target=client, args=(port, args.requests, args.users, args.games, seed, latencies))
+                   for seed in range(args.clients)]
+        started = time.perf_counter()
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        elapsed = time.perf_counter() - started
+    finally:
+        proc.terminate()
+        proc.wait()
+    log_path = os.path.join(workdir, "server_log.txt")
+    log_size = os.path.getsize(log_path) if os.path.exists(log_path) else 0
+    return latencies, elapsed, log_size
+
+def main():
+    parser = argparse.ArgumentParser(description="Request latency with request logging on and off")
+    parser.add_argument("--clients", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=2000, help="per client")
+    parser.add_argument("--users", type=int, default=2000)
+    parser.add_argument("--games", type=int, default=500)
+    args = parser.parse_args()
+
+    print(f"{'logging':<14}{'req/s':>10}{'p50 ms':>10}{'p99 ms':>10}{'log MB':>10}")
+    for name, extra in CONFIGS.items():
+        latencies, elapsed, log_size = run(extra, args)
+        print(f"{name:<14}{len(latencies) / elapsed:>10.0f}{percentile(latencies, 0.5) * 1000:>10.3f}"
+              f"{percentile(latencies, 0.99) * 1000:>10.3f}{log_size / 1e6:>10.1f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+import argparse
+import os
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import persistence
+from store import Store, StoreError
+
+USERS = 1000
+GAMES = 1000
+
+
+# --- Mutation throughput ---
+def populate(store):
+    for i in range(USERS):
+        store.add_user(f"user{i}", f"user{i}@example.com", "Passw0rd!")
+    for i in range(GAMES):
+        store.add_game(f"Game {i}", 1000)
+
+def mutate(store, journal, seed, operations):
+    rng = random.Random(seed)
+    mine = []
+    for _ in range(operations):
+        try:
+            if mine and rng.random() < 0.5:
+                store.return_rental(mine.pop())
+            else:
+                mine.append(store.create_rental(rng.randint(1, USERS), rng.randint(1, GAMES)).rental_id)
+        except StoreError:
+            pass
+        if journal is not None:
+            journal.wait_durable()  # what a request handler does before replying
+
+def bench_throughput(mode, threads, operations):
+    directory = tempfile.mkdtemp(prefix="gamehub-wal-")
+    try:
+        store = Store()
+        journal = None
+        if mode != "off":
+            journal = persistence.Journal(store, directory, mode).open()
+        populate(store)
+        workers = [threading.Thread(target=mutate, args=(store, journal, seed, operations))
+                   for seed in range(threads)]
+        started = time.perf_counter()
+        for w in workers:
+            w.start()
+        for w in workers:
+            w.join()
+        elapsed = time.perf_counter() - started
+        if journal is not None:
+            journal.close()
+        return threads * operations / elapsed
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+# --- Recovery time ---
+def write_journal(directory, records):
+    # Writes a realistic journal directly, without going through the store,
+    # so very large logs can be generated quickly.
+    rng = random.Random(0)
+    stock = [1000] * (GAMES + 1)
+    open_rentals = []
+    lsn = 0
+    with open(os.path.join(directory, "wal-%020d.log" % 1), "wb") as f:
+        batch = []
+        def emit(record):
+            nonlocal lsn
+            lsn += 1
+            batch.append(persistence.encode_record(lsn, record))
+            if len(batch) >= 10000:
+                f.write(b"".join(batch))
+                batch.clear()
+        for i in range(1, USERS + 1):
+            emit(["U", i, f"user{i}", f"user{i}@example.com", "Passw0rd!"])
+        for i in range(1, GAMES + 1):
+            emit(["G", i, f"Game {i}", 1000])
+        rental_id = 0
+        while lsn < records:
+            if open_rentals and (rng.random() < 0.5 or len(open_rentals) > 500000):
+                rid, game_id = open_rentals.pop(rng.randrange(len(open_rentals)))
+                stock[game_id] += 1
+                emit(["X", rid, "2025-01-10", 0, stock[game_id]])
+            else:
+                game_id = rng.randint(1, GAMES)
+                if stock[game_id] == 0:
+                    continue
+                stock[game_id] -= 1
+                rental_id += 1
+                open_rentals.append((rental_id, game_id))
+                emit(["R", rental_id, rng.randint(1, USERS), game_id, "2025-01-08", stock[game_id]])
+        f.write(b"".join(batch))
+    return lsn
+
+def bench_recovery(records, snapshot):
+    directory = tempfile.mkdtemp(prefix="gamehub-recover-")
+    try:
+        written = write_journal(directory, records)
+        if snapshot:
+            # Compact everything into a snapshot, then time snapshot + empty tail
+            store = Store()
+            journal = persistence.Journal(store, directory).open()
+            journal.snapshot()
+            journal.close()
+        store = Store()
+        started = time.perf_counter()
+        persistence.recover(store, directory)
+        elapsed = time.perf_counter() - started
+        return written, elapsed, len(store.rentals)
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Journal throughput and recovery benchmarks")
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--operations", type=int, default=2000, help="mutations per thread")
+    parser.add_argument("--records", type=int, default=10000000, help="journal size for recovery")
+    parser.add_argument("--skip-recovery", action="store_true")
+    args = parser.parse_args()
+
+    print(f"{'durability':<12}{'mutations/s':>14}")
+    for mode in ("off", persistence.RELAXED, persistence.SYNC):
+        print(f"{mode:<12}{bench_throughput(mode, args.threads, args.operations):>14.0f}")
+
+    if not args.skip_recovery:
+        print()
+        print(f"{'recovery from':<16}{'records':>12}{'rentals':>12}{'seconds':>10}{'records/s':>12}")
+        for label, snapshot in (("journal", False), ("snapshot", True)):
+            written, elapsed, rentals = bench_recovery(args.records, snapshot)
+            print(f"{label:<16}{written:>12}{rentals:>12}{elapsed:>10.2f}{written / elapsed:>12.0f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+import argparse
+import multiprocessing
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from protocol import MessageReader, send_message
+
+AUTH = {"type": "auth", "username": "admin", "password": "password123"}
+BASE_ARGS = ["--hash-iterations", "1000", "--log-level", "off", "--overdue-interval", "0"]
+
+
+# --- Server processes ---
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def start_server(port, extra, env=None):
+    workdir = tempfile.mkdtemp(prefix="gamehub-replicas-")
+    cmd = [sys.executable, os.path.join(ROOT, "server.py"), "--host", "127.0.0.1", "--port", str(port),
+           *BASE_ARGS, *extra]
+    proc = subprocess.Popen(cmd, cwd=workdir, stdout=subprocess.DEVNULL, env=env)
+    deadline = time.time() + 10
+    while time.time() < deadline:
+        try:
+            connect(port)[0].close()
+            return proc
+        except OSError:
+            time.sleep(0.1)
+    proc.kill()
+    raise RuntimeError("server did not start")
+
+def connect(port):
+    sock = socket.create_connection(("127.0.0.1", port))
+    reader = MessageReader(sock)
+    send_message(sock, AUTH)
+    if reader.read_message().get("status") != "ok":
+        raise ConnectionError("authentication failed")
+    return sock, reader
+
+def call(sock, reader, request):
+    send_message(sock, request)
+    return reader.read_message()
+
+
+# --- Workload ---
+def populate(port, users, games, rentals):
+    sock, reader = connect(port)
+    call(sock, reader, {"action": "import_games", "records": [
+        {"title": f"Game {i}", "stock": 1000} for i in range(games)]})
+    call(sock, reader, {"action": "import_users", "records": [
+        {"name": f"user{i}", "email": f"user{i}@example.com", "password": "Passw0rd!"} for i in range(users)]})
+    rng = random.Random(0)
+    for start in range(0, rentals, 5000):
+        call(sock, reader, {"action": "import_rentals", "records": [
+            {"user_id": rng.randint(1, users), "game_id": rng.randint(1, games)}
+            for _ in range(min(5000, rentals - start))]})
+    sock.close()
+
+def reader_loop(port, seconds, results):
+    # Dashboard traffic: full list_dashboard reads, back to back
+    sock, reader = connect(port)
+    done = 0
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        call(sock, reader, {"action": "list_dashboard"})
+        done += 1
+    sock.close()
+    results.put(done)
+
+def writer_loop(port, seconds, users, games):
+    # Rentals on the primary; returns per-request latencies
+    rng = random.Random(1)
+    sock, reader = connect(port)
+    latencies, open_rentals = [], []
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        if open_rentals and rng.random() < 0.5:
+            request = {"action": "return_rental", "rental_id": open_rentals.pop()}
+        else:
+            request = {"action": "create_rental", "user_id": rng.randint(1, users), "game_id": rng.randint(1, games)}
+        started = time.perf_counter()
+        reply = call(sock, reader, request)
+        latencies.append(time.perf_counter() - started)
+        if "rental_id" in reply:
+            open_rentals.append(reply["rental_id"])
+    sock.close()
+    return latencies
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+def run(read_ports, primary_port, args):
+    results = multiprocessing.Queue()
+    readers = [multiprocessing.Process(target=reader_loop, args=(read_ports[i % len(read_ports)], args.seconds, results))
+               for i in range(args.readers)]
+    for r in readers:
+        r.start()
+    latencies = writer_loop(primary_port, args.seconds, args.users, args.games)
+    reads = sum(results.get() for _ in readers)
+    for r in readers:
+        r.join()
+    return latencies, reads / args.seconds
+
+def main():
+    parser = argparse.ArgumentParser(description="Rental latency with dashboard reads on the primary or on replicas")
+    parser.add_argument("--replicas", type=int, default=2)
+    parser.add_argument("--readers", type=int, default=4, help="dashboard reader processes")
+    parser.add_argument("--seconds", type=float, default=10.0)
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--games", type=int, default=200)
+    parser.add_argument("--rentals", type=int, default=20000, help="rentals loaded before measuring")
+    args = parser.parse_args()
+
+    primary_port = free_port()
+    procs = [start_server(primary_port, ["--replicas", "100000"])]
+    try:
+        populate(primary_port, args.users, args.games, args.rentals)
+        env = dict(os.environ, GAMEHUB_PRIMARY_PASSWORD=AUTH["password"])
+        replica_ports = [free_port() for _ in range(args.replicas)]
+        for port in replica_ports:
+            procs.append(start_server(port, ["--replica-of", f"127.0.0.1:{primary_port}"], env))
+        time.sleep(1)
+
+        print(f"{os.cpu_count()} CPUs, {args.readers} dashboard readers, {args.rentals} rentals loaded")
+        print(f"{'reads go to':<16}{'dash/s':>10}{'rent p50 ms':>14}{'rent p99 ms':>14}")
+        for name, ports in (("primary", [primary_port]), (f"{args.replicas} replicas", replica_ports)):
+            latencies, read_rate = run(ports, primary_port, args)
+            print(f"{name:<16}{read_rate:>10.1f}{percentile(latencies, 0.5) * 1000:>14.3f}"
+                  f"{percentile(latencies, 0.99) * 1000:>14.3f}")
+
+        sock, reader = connect(replica_ports[0])
+        status = call(sock, reader, {"action": "replication"})["replication"]
+        sock.close()
+        print(f"replica lag after run: {status['lag_records']} records, {status['lag_seconds']} s")
+    finally:
+        for proc in procs:
+            proc.terminate()
+            proc.wait()
+
+if __name__ == "__main__":
+    main()
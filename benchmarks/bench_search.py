@@ -0,0 +1,108 @@
+import argparse
+import os
+import random
+import resource
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import queries
+from store import Store
+
+SYLLABLES = ("ka", "zel", "mar", "io", "dra", "ven", "tor", "lu", "ske", "rim", "qua", "bo", "nix", "fal",
+             "ora", "the", "gen", "sol", "wyn", "pa", "cro", "mi", "dun", "ae", "rok", "sha", "vel", "ty")
+
+
+# --- Catalog ---
+def vocabulary(rng, size):
+    words = set()
+    while len(words) < size:
+        words.add("".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4))))
+    return sorted(words)
+
+def catalog(games, users, seed=0):
+    # Titles of one to three words from a shared vocabulary, some with a
+    # sequel number; users with a first and last name and a unique email
+    rng = random.Random(seed)
+    words = vocabulary(rng, 20000)
+    titles = []
+    for _ in range(games):
+        title = " ".join(rng.choice(words).title() for _ in range(rng.randint(1, 3)))
+        if rng.random() < 0.3:
+            title += f" {rng.randint(2, 9)}"
+        titles.append(title)
+    people = [(rng.choice(words).title(), rng.choice(words).title()) for _ in range(users)]
+    return words, titles, people
+
+def load(titles, people):
+    store = Store()
+    for game_id, title in enumerate(titles, 1):
+        store.apply_record(["G", game_id, title, 1])
+    for user_id, (first, last) in enumerate(people, 1):
+        store.apply_record(["U", user_id, f"{first} {last}", f"{first}.{last}{user_id}@example.com".lower(), "x"])
+    store.rebuild_aggregates()
+    return store
+
+
+# --- Queries ---
+def typo(rng, word):
+    i = rng.randrange(len(word))
+    return word[:i] + rng.choice("aeiourst") + word[i + 1:]
+
+def query_sets(rng, words, titles, count):
+    picks = [rng.choice(words) for _ in range(count)]
+    two = [" ".join(rng.choice(titles).split()[:2]) for _ in range(count)]
+    return {
+        "prefix, 3 chars": ([w[:3] for w in picks], False),
+        "whole word": (picks, False),
+        "two words": (two, False),
+        "fuzzy, one typo": ([typo(rng, w) for w in picks], True),
+        "no match": (["qqqzzz"] * count, False),
+    }
+
+def timed(store, queries_, fuzzy, limit):
+    times = []
+    for text in queries_:
+        started = time.perf_counter()
+        store.search_games(text, limit, fuzzy)
+        times.append(time.perf_counter() - started)
+    times.sort()
+    return times[len(times) // 2] * 1000, times[int(len(times) * 0.99)] * 1000
+
+def main():
+    parser = argparse.ArgumentParser(description="Game title search: word index vs scanning")
+    parser.add_argument("--games", type=int, default=1000000)
+    parser.add_argument("--users", type=int, default=100000)
+    parser.add_argument("--queries", type=int, default=2000)
+    parser.add_argument("--limit", type=int, default=10)
+    args = parser.parse_args()
+
+    words, titles, people = catalog(args.games, args.users)
+    before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    started = time.perf_counter()
+    store = load(titles, people)
+    loaded = time.perf_counter() - started
+    grown = (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - before) / 1024
+    print(f"{args.games} games, {args.users} users loaded and indexed in {loaded:.1f} s "
+          f"(store and indexes: {grown:.0f} MB); {len(store.game_search)} distinct title words")
+
+    rng = random.Random(1)
+    print(f"\n{'ms per search_games':<22}{'p50':>10}{'p99':>10}")
+    for name, (texts, fuzzy) in query_sets(rng, words, titles, args.queries).items():
+        p50, p99 = timed(store, texts, fuzzy, args.limit)
+        print(f"{name:<22}{p50:>10.3f}{p99:>10.3f}")
+
+    # What a client had before: a substring scan (list_games "match")
+    text = rng.choice(words)[:3]
+    started = time.perf_counter()
+    queries.list_games(store, {"match": text, "limit": args.limit})
+    scan = (time.perf_counter() - started) * 1000
+    started = time.perf_counter()
+    queries.list_games(store, {"match": "qqqzzz", "limit": args.limit})
+    miss = (time.perf_counter() - started) * 1000
+    print(f"\nlist_games match scan: {scan:.3f} ms for '{text}', {miss:.1f} ms for a miss")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+import argparse
+import itertools
+import json
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import serializer
+from bench_backends import dataset, load_memory
+from protocol import MAX_FRAME_SIZE
+
+
+# --- Measurements ---
+def timed(fn, repeat):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - started) / repeat * 1000
+
+def run(store, repeat):
+    # ms per list_dashboard reply: its two halves (building the record dicts,
+    # encoding them), the reply path before this layer, and a cached reply
+    # that misses (a write landed since) or hits (nothing changed)
+    results = {}
+    reply = store.dashboard()
+    results["build dicts"] = timed(store.dashboard, repeat)
+    results["json.dumps().encode()"] = timed(lambda: json.dumps(reply).encode(), repeat)
+    results[f"{serializer.BACKEND} dumps"] = timed(lambda: serializer.dumps(reply), repeat)
+    results["stdlib reply"] = timed(lambda: json.dumps(store.dashboard()).encode(), repeat)
+    cache = serializer.ResponseCache()
+    writes = itertools.count(1)
+    results["cached, miss"] = timed(lambda: cache.get("dashboard", next(writes), store.dashboard), repeat)
+    results["cached, hit"] = timed(lambda: cache.get("dashboard", 0, store.dashboard), repeat * 100)
+    return results, len(serializer.dumps(reply))
+
+def main():
+    parser = argparse.ArgumentParser(description="list_dashboard encoding: stdlib, serializer backend and cache")
+    parser.add_argument("--rentals", type=int, nargs="+", default=[10000, 100000, 1000000])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    sizes = {}
+    for rentals in args.rentals:
+        store = load_memory(dataset(rentals))
+        results, size = run(store, args.repeat)
+        sizes[rentals] = results
+        note = " (over the frame limit; the server refuses to send it)" if size > MAX_FRAME_SIZE else ""
+        print(f"{rentals} rentals: reply is {size / 1e6:.1f} MB{note}")
+        del store
+
+    print()
+    print(f"{'ms per dashboard':<22}" + "".join(f"{rentals:>12}" for rentals in sizes))
+    for metric in sizes[args.rentals[0]]:
+        print(f"{metric:<22}" + "".join(f"{sizes[rentals][metric]:>12.3f}" for rentals in sizes))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+import os
+import random
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import auth
+import persistence
+from aggregates import late_fee, ordinal_date, today_ordinal
+from client import Connection
+
+PASSWORD = "Passw0rd!"
+IMPORT_BATCH = 10000
+
+
+# --- Generated data ---
+# Deterministic for a given seed. Users are user<i>@example.com with
+# PASSWORD; games hold `stock` copies each; about a third of the rentals are
+# still open and a tenth of those are overdue. Ids run from 1, as in a
+# fresh single-process server.
+def rental_rows(users, games, rentals, seed=0):
+    # (user_id, game_id, due_day, return_day or None) for every rental
+    rng = random.Random(seed)
+    today = today_ordinal()
+    for _ in range(rentals):
+        due = today + rng.randint(1, 7) if rng.random() < 0.9 else today - rng.randint(1, 30)
+        # Rented 7 days before due; returned up to 3 days late, never after today
+        returned = min(today, due - 7 + rng.randint(0, 10)) if rng.random() < 0.66 else None
+        yield rng.randint(1, users), rng.randint(1, games), due, returned
+
+def journal_records(users, games, rentals, stock=1000, seed=0):
+    # The dataset as journal records, in the order Store.snapshot_records()
+    # writes them. One PBKDF2 hash is shared by every user.
+    password = auth.hash_password(PASSWORD)
+    rows = list(rental_rows(users, games, rentals, seed))
+    on_hand = [stock] * (games + 1)
+    for _, game_id, _, returned in rows:
+        if returned is None:
+            on_hand[game_id] -= 1
+    short = [game_id for game_id in range(1, games + 1) if on_hand[game_id] < 0]
+    if short:
+        raise ValueError(f"stock {stock} is too low for {len(short)} games; raise it or add games")
+    for user_id in range(1, users + 1):
+        yield ["U", user_id, f"user{user_id}", f"user{user_id}@example.com", password]
+    for game_id in range(1, games + 1):
+        yield ["G", game_id, f"Game {game_id}", on_hand[game_id]]
+    for rental_id, (user_id, game_id, due, returned) in enumerate(rows, 1):
+        yield ["R", rental_id, user_id, game_id, ordinal_date(due), on_hand[game_id]]
+        if returned is not None:
+            yield ["X", rental_id, ordinal_date(returned), late_fee(due, returned), on_hand[game_id]]
+
+
+# --- Loading ---
+def data_dir(users, games, rentals, stock=1000, seed=0, directory=None):
+    # Fastest way to a large dataset: a snapshot file the server recovers
+    # from on start (server.py --data-dir). Returns the directory.
+    directory = directory or tempfile.mkdtemp(prefix="gamehub-fixture-")
+    os.makedirs(directory, exist_ok=True)
+    persistence.write_snapshot(directory, 0, journal_records(users, games, rentals, stock, seed))
+    return directory
+
+def populate(host, port, users, games, rentals, stock=1000, seed=0, username="admin", password="password123"):
+    # Loads the same dataset into a running server through the bulk import
+    # actions; works with any backend and with a sharded server. Imports
+    # cannot return rentals, so here every rental stays open and `stock`
+    # must cover them. Returns the user and game ids the server assigned.
+    conn = Connection(host, port)
+    try:
+        conn.login(username, password)
+        game_ids = _import(conn, "import_games", [{"title": f"Game {i}", "stock": stock}
+                                                  for i in range(1, games + 1)])
+        user_ids = _import(conn, "import_users", [{"name": f"user{i}", "email": f"user{i}@example.com",
+                                                   "password": PASSWORD} for i in range(1, users + 1)])
+        records = [{"user_id": user_ids[u - 1], "game_id": game_ids[g - 1], "due_date": ordinal_date(due)}
+                   for u, g, due, _ in rental_rows(users, games, rentals, seed)]
+        _import(conn, "import_rentals", records)
+    finally:
+        conn.close()
+    return user_ids, game_ids
+
+def _import(conn, action, records):
+    ids = []
+    for start in range(0, len(records), IMPORT_BATCH):
+        reply = conn.request({"action": action, "records": records[start:start + IMPORT_BATCH]})
+        if reply.get("status") != "ok":
+            raise RuntimeError(f"{action} failed: {reply.get('message')}")
+        ids.extend(reply["ids"])
+    return ids
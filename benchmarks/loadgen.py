@@ -0,0 +1,337 @@
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import random
+import secrets
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import fixtures
+from client import Connection
+from protocol import FrameDecoder, decode_payload, encode_message
+
+AUTH = {"type": "auth", "username": "admin", "password": "password123"}
+# Fast password hashing for add_user, no request log, no overdue scans, and
+# a journal that fsyncs in the background (the fixture needs --data-dir)
+BASE_ARGS = ["--hash-iterations", "1000", "--log-level", "off", "--overdue-interval", "0",
+             "--durability", "relaxed"]
+START_TIMEOUT = 300
+
+ACTIONS = ("add_user", "add_game", "create_rental", "return_rental", "list_dashboard")
+MIXES = {
+    "rentals": {"create_rental": 45, "return_rental": 40, "list_dashboard": 5, "add_user": 5, "add_game": 5},
+    "reads": {"list_dashboard": 80, "create_rental": 10, "return_rental": 10},
+    "writes": {"add_user": 20, "add_game": 10, "create_rental": 40, "return_rental": 30},
+}
+# Latency changes smaller than this are noise, whatever the percentage
+MIN_LATENCY_DELTA_MS = 0.2
+
+
+def parse_mix(spec):
+    # A preset name, or action=weight pairs such as "create_rental=3,list_dashboard=1"
+    if spec in MIXES:
+        return dict(MIXES[spec])
+    mix = {}
+    for part in spec.split(","):
+        action, _, weight = part.partition("=")
+        if action not in ACTIONS:
+            raise ValueError(f"unknown action {action!r}; choose from {', '.join(ACTIONS)}")
+        mix[action] = float(weight or 1)
+    if not any(mix.values()):
+        raise ValueError("the mix has no weight")
+    return mix
+
+
+# --- Server process ---
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def start_server(port, data_dir, extra):
+    workdir = tempfile.mkdtemp(prefix="gamehub-load-")
+    cmd = [sys.executable, os.path.join(ROOT, "server.py"), "--host", "127.0.0.1", "--port", str(port),
+           "--data-dir", data_dir, *BASE_ARGS, *extra]
+    proc = subprocess.Popen(cmd, cwd=workdir, stdout=subprocess.DEVNULL)
+    deadline = time.time() + START_TIMEOUT
+    while time.time() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"server exited with {proc.returncode}")
+        try:
+            Connection("127.0.0.1", port).close()
+            return proc
+        except OSError:
+            time.sleep(0.2)
+    proc.kill()
+    raise RuntimeError("server did not start")
+
+def discover(host, port, limit):
+    # Up to `limit` user and game ids to aim requests at
+    conn = Connection(host, port)
+    try:
+        conn.login(AUTH["username"], AUTH["password"])
+        found = {}
+        for action, field in (("list_users", "user_id"), ("list_games", "game_id")):
+            ids, cursor = [], None
+            while len(ids) < limit:
+                reply = conn.request({"action": action, "limit": 500, "cursor": cursor, "fields": [field]})
+                ids.extend(item[field] for item in reply["items"])
+                cursor = reply["next_cursor"]
+                if cursor is None:
+                    break
+            found[action] = ids[:limit]
+    finally:
+        conn.close()
+    return found["list_users"], found["list_games"]
+
+
+# --- Workload ---
+class Workload:
+    # Request stream for one connection. Each connection returns only the
+    # rentals it created itself, so connections never race to return the
+    # same one; a return with nothing to return becomes a rental. `tag`
+    # keeps the users and games it adds distinct from every other run's.
+    def __init__(self, mix, user_ids, game_ids, seed, tag):
+        self.actions = list(mix)
+        self.weights = [mix[a] for a in self.actions]
+        self.user_ids = user_ids
+        self.game_ids = game_ids
+        self.rng = random.Random(seed)
+        self.tag = tag
+        self.open = []
+        self.count = 0
+
+    def next_request(self):
+        rng = self.rng
+        action = rng.choices(self.actions, self.weights)[0]
+        self.count += 1
+        if action == "return_rental" and self.open:
+            return action, {"action": action, "rental_id": self.open.pop(rng.randrange(len(self.open)))}
+        if action in ("return_rental", "create_rental"):
+            return "create_rental", {"action": "create_rental", "user_id": rng.choice(self.user_ids),
+                                     "game_id": rng.choice(self.game_ids)}
+        if action == "add_user":
+            return action, {"action": action, "name": f"load {self.tag}",
+                            "email": f"load-{self.tag}-{self.count}@example.com", "password": fixtures.PASSWORD}
+        if action == "add_game":
+            return action, {"action": action, "title": f"Load game {self.tag}-{self.count}", "stock": 100}
+        return action, {"action": action}
+
+    def seen(self, action, reply):
+        if action == "create_rental" and reply.get("status") == "ok":
+            self.open.append(reply["rental_id"])
+
+
+async def read_message(reader, decoder):
+    while not decoder.pending:
+        data = await reader.read(65536)
+        if not data:
+            raise ConnectionError("server closed connection")
+        decoder.feed(data)
+    return decode_payload(decoder.next_payload())
+
+async def drive(host, port, workload, measure_from, deadline, latencies, errors):
+    # One closed-loop connection: send, wait for the reply, repeat
+    reader, writer = await asyncio.open_connection(host, port)
+    decoder = FrameDecoder()
+    writer.write(encode_message(AUTH))
+    if (await read_message(reader, decoder)).get("status") != "ok":
+        raise ConnectionError("authentication failed")
+    try:
+        while True:
+            started = time.perf_counter()
+            if started >= deadline:
+                break
+            action, request = workload.next_request()
+            writer.write(encode_message(request))
+            reply = await read_message(reader, decoder)
+            elapsed = time.perf_counter() - started
+            workload.seen(action, reply)
+            if started >= measure_from:
+                latencies[action].append(elapsed)
+                if reply.get("status") == "error":
+                    errors[action] += 1
+    finally:
+        writer.close()
+
+def client_process(host, port, connections, first, mix, user_ids, game_ids, warmup, seconds, seed, results):
+    # Runs `connections` connections on one event loop; reports raw latencies
+    latencies = {action: [] for action in ACTIONS}
+    errors = dict.fromkeys(ACTIONS, 0)
+    tag = secrets.token_hex(4)
+
+    async def main():
+        measure_from = time.perf_counter() + warmup
+        deadline = measure_from + seconds
+        await asyncio.gather(*(drive(host, port, Workload(mix, user_ids, game_ids, seed * 100003 + first + i,
+                                                          f"{tag}-{first + i}"),
+                                     measure_from, deadline, latencies, errors)
+                               for i in range(connections)))
+
+    asyncio.run(main())
+    results.put((latencies, errors))
+
+
+# --- Results ---
+def percentile(ordered, fraction):
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+def summarize(latencies, errors, seconds, config):
+    actions = {}
+    for action in ACTIONS:
+        values = sorted(latencies[action])
+        if not values:
+            continue
+        actions[action] = {"requests": len(values), "errors": errors[action],
+                           "per_second": round(len(values) / seconds, 1),
+                           "p50_ms": round(percentile(values, 0.50) * 1000, 3),
+                           "p95_ms": round(percentile(values, 0.95) * 1000, 3),
+                           "p99_ms": round(percentile(values, 0.99) * 1000, 3),
+                           "max_ms": round(values[-1] * 1000, 3)}
+    total = sum(a["requests"] for a in actions.values())
+    return {"config": config, "cpus": os.cpu_count(),
+            "total": {"requests": total, "per_second": round(total / seconds, 1),
+                      "errors": sum(a["errors"] for a in actions.values())},
+            "actions": actions}
+
+def report(result):
+    total = result["total"]
+    print(f"{total['requests']} requests, {total['per_second']:.0f}/s, {total['errors']} errors "
+          f"({result['cpus']} CPUs)")
+    print(f"{'action':<16}{'req/s':>10}{'errors':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+    for action, a in result["actions"].items():
+        print(f"{action:<16}{a['per_second']:>10.1f}{a['errors']:>8}{a['p50_ms']:>10.3f}{a['p95_ms']:>10.3f}"
+              f"{a['p99_ms']:>10.3f}{a['max_ms']:>10.3f}")
+
+def compare(result, baseline, threshold, latency_threshold, tail_threshold):
+    # Returns the regressions: total throughput down by more than
+    # `threshold`, an action's p50 up by more than `latency_threshold` or
+    # its p99 up by more than `tail_threshold`
+    problems = []
+    before, after = baseline["total"]["per_second"], result["total"]["per_second"]
+    if after < before * (1 - threshold):
+        problems.append(f"throughput {after:.0f}/s is {1 - after / before:.0%} below the baseline {before:.0f}/s")
+    for action, old in baseline["actions"].items():
+        new = result["actions"].get(action)
+        if new is None:
+            continue
+        for key, allowed in (("p50_ms", latency_threshold), ("p99_ms", tail_threshold)):
+            if new[key] > old[key] * (1 + allowed) and new[key] - old[key] > MIN_LATENCY_DELTA_MS:
+                problems.append(f"{action} {key[:3]} {new[key]:.3f} ms is {new[key] / old[key] - 1:.0%} above "
+                                f"the baseline {old[key]:.3f} ms")
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Drive a GameHub server with a mix of requests over many "
+                                                 "connections; report throughput and latency percentiles")
+    parser.add_argument("--connect", metavar="HOST:PORT", help="use a running server instead of starting one")
+    parser.add_argument("--server-arg", action="append", default=[], metavar="ARG",
+                        help="extra argument for the started server, e.g. --server-arg=--engine=async")
+    parser.add_argument("--mix", default="rentals",
+                        help=f"preset ({', '.join(MIXES)}) or action=weight,... over {', '.join(ACTIONS)}")
+    parser.add_argument("--connections", type=int, default=50)
+    parser.add_argument("--processes", type=int, default=1, help="client processes sharing the connections")
+    parser.add_argument("--seconds", type=float, default=10.0, help="measured time")
+    parser.add_argument("--warmup", type=float, default=2.0, help="unmeasured time before it")
+    parser.add_argument("--users", type=int, default=1000, help="fixture: users loaded before the run")
+    parser.add_argument("--games", type=int, default=200, help="fixture: games")
+    parser.add_argument("--rentals", type=int, default=10000, help="fixture: rentals")
+    parser.add_argument("--stock", type=int, default=1000, help="fixture: copies per game")
+    parser.add_argument("--populate", action="store_true",
+                        help="with --connect: load the fixture through the import actions first")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write the result as JSON to this file")
+    parser.add_argument("--save-baseline", metavar="FILE", help="store the result as the baseline")
+    parser.add_argument("--baseline", metavar="FILE", help="compare with this baseline; exit 1 on a regression")
+    parser.add_argument("--threshold", type=float, default=0.10, help="allowed throughput drop")
+    parser.add_argument("--latency-threshold", type=float, default=0.25, help="allowed p50 increase")
+    parser.add_argument("--tail-threshold", type=float, default=0.50, help="allowed p99 increase")
+    args = parser.parse_args()
+    try:
+        mix = parse_mix(args.mix)
+    except ValueError as e:
+        parser.error(str(e))
+    if any(arg.startswith("--workers") for arg in args.server_arg):
+        # Each worker recovers its own shard directory, so the snapshot
+        # fixture cannot seed them
+        parser.error("start a sharded server yourself and use --connect with --populate")
+
+    config = {"mix": mix, "connections": args.connections, "processes": args.processes, "seconds": args.seconds,
+              "users": args.users, "games": args.games, "rentals": args.rentals, "server_args": args.server_arg,
+              "target": args.connect or "local"}
+    proc = data_dir = None
+    try:
+        if args.connect:
+            host, _, port = args.connect.rpartition(":")
+            port = int(port)
+            if args.populate:
+                fixtures.populate(host, port, args.users, args.games, args.rentals, args.stock, args.seed)
+        else:
+            host, port = "127.0.0.1", free_port()
+            started = time.perf_counter()
+            data_dir = fixtures.data_dir(args.users, args.games, args.rentals, args.stock, args.seed)
+            proc = start_server(port, data_dir, args.server_arg)
+            print(f"fixture: {args.users} users, {args.games} games, {args.rentals} rentals "
+                  f"loaded in {time.perf_counter() - started:.1f}s")
+        user_ids, game_ids = discover(host, port, 10000)
+        if not user_ids or not game_ids:
+            raise SystemExit("the server has no users or games to rent; load a fixture first")
+
+        results = multiprocessing.Queue()
+        share, extra = divmod(args.connections, args.processes)
+        clients, first = [], 0
+        for i in range(args.processes):
+            count = share + (i < extra)
+            clients.append(multiprocessing.Process(target=client_process, args=(
+                host, port, count, first, mix, user_ids, game_ids, args.warmup, args.seconds, args.seed, results)))
+            first += count
+        for c in clients:
+            c.start()
+        latencies = {action: [] for action in ACTIONS}
+        errors = dict.fromkeys(ACTIONS, 0)
+        for _ in clients:
+            part_latencies, part_errors = results.get()
+            for action in ACTIONS:
+                latencies[action].extend(part_latencies[action])
+                errors[action] += part_errors[action]
+        for c in clients:
+            c.join()
+    finally:
+        if proc is not None:
+            proc.terminate()
+            proc.wait()
+        if data_dir is not None:
+            shutil.rmtree(data_dir, ignore_errors=True)
+
+    result = summarize(latencies, errors, args.seconds, config)
+    report(result)
+    for path in (args.output, args.save_baseline):
+        if path:
+            with open(path, "w") as f:
+                json.dump(result, f, indent=2)
+    if args.save_baseline:
+        print(f"baseline saved to {args.save_baseline}")
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline["config"] != config or baseline.get("cpus") != result["cpus"]:
+            print("warning: the baseline was recorded with a different configuration or machine")
+        problems = compare(result, baseline, args.threshold, args.latency_threshold, args.tail_threshold)
+        for problem in problems:
+            print(f"REGRESSION: {problem}")
+        if problems:
+            sys.exit(1)
+        print(f"no regression against {args.baseline}")
+
+if __name__ == "__main__":
+    main()
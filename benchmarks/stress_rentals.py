@@ -0,0 +1,107 @@
+import argparse
+import json
+import logging
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(tempfile.mkdtemp(prefix="gamehub-stress-"))  # keep server_log.txt out of the repo
+
+import server
+
+# --- Workload ---
+def call(**request):
+    return server.process_request(json.dumps(request))
+
+def worker(seed, iterations, user_ids, game_ids, created, errors):
+    rng = random.Random(seed)
+    mine = []
+    for _ in range(iterations):
+        if mine and rng.random() < 0.4:
+            rental_id = mine.pop(rng.randrange(len(mine)))
+            response = call(action="return_rental", rental_id=rental_id)
+            if response.get("status") != "ok":
+                errors.append(response)
+        else:
+            response = call(action="create_rental", user_id=rng.choice(user_ids),
+                            game_id=rng.choice(game_ids))
+            if response.get("status") == "ok":
+                mine.append(response["rental_id"])
+                created.append(response["rental_id"])
+            elif "out of stock" not in response.get("message", ""):
+                errors.append(response)
+
+# --- Invariants ---
+def check(store, created, initial_stock):
+    problems = []
+    if len(created) != len(set(created)):
+        problems.append("duplicate rental ids handed out")
+    if len(store.rentals) != len(created):
+        problems.append(f"{len(created)} rentals created but {len(store.rentals)} stored")
+    open_count = sum(1 for r in store.rentals.values() if not r.returned)
+    if open_count != len(store.open_rentals):
+        problems.append(f"open index has {len(store.open_rentals)} entries, expected {open_count}")
+    for game_id, game in store.games.items():
+        out = sum(1 for r in store.game_rentals(game_id) if not r.returned)
+        if game.stock < 0 or game.stock + out != initial_stock:
+            problems.append(f"game {game_id}: {game.stock} on hand + {out} rented != {initial_stock}")
+        if game.available != (game.stock > 0):
+            problems.append(f"game {game_id}: available={game.available} with stock {game.stock}")
+    by_game = sum(len(v) for v in store.rentals_by_game.values())
+    by_user = sum(len(v) for v in store.rentals_by_user.values())
+    stats = store.aggregates.snapshot()
+    expected = {"active_rentals": open_count, "total_rentals": len(created),
+                "stock_on_hand": sum(g.stock for g in store.games.values())}
+    for key, value in expected.items():
+        if stats[key] != value:
+            problems.append(f"aggregate {key} is {stats[key]}, expected {value}")
+    if by_game != len(created) or by_user != len(created):
+        problems.append(f"secondary indexes hold {by_game}/{by_user} rentals, expected {len(created)}")
+    return problems
+
+def main():
+    parser = argparse.ArgumentParser(description="Hammer create_rental/return_rental from many threads")
+    parser.add_argument("--threads", type=int, default=32)
+    parser.add_argument("--iterations", type=int, default=2000)
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--games", type=int, default=8)
+    parser.add_argument("--stock", type=int, default=5)
+    parser.add_argument("--spike", action="store_true",
+                        help="every thread rents the same game (release-day pattern)")
+    args = parser.parse_args()
+
+    logging.disable(logging.CRITICAL)
+    sys.setswitchinterval(1e-6)  # force frequent thread switches to surface races
+    user_ids = [server.store.add_user(f"u{i}", f"u{i}@example.com", "Passw0rd!").user_id
+                for i in range(args.users)]
+    game_ids = [server.store.add_game(f"Game {i}", args.stock).game_id for i in range(args.games)]
+    if args.spike:
+        game_ids = game_ids[:1]
+
+    created, errors = [], []
+    threads = [threading.Thread(target=worker, args=(seed, args.iterations, user_ids, game_ids, created, errors))
+               for seed in range(args.threads)]
+    started = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - started
+
+    problems = check(server.store, created, args.stock)
+    problems.extend(f"unexpected reply {e}" for e in errors[:5])
+    ops = args.threads * args.iterations
+    print(f"{ops} operations on {args.threads} threads in {elapsed:.2f}s ({ops / elapsed:.0f} ops/s)")
+    if problems:
+        for problem in problems:
+            print("FAIL:", problem)
+        sys.exit(1)
+    print(f"OK: {len(created)} rentals, ids unique, indexes and stock consistent")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+import datetime
+
+import auth
+from protocol import encode_message
+from store import DATE_FORMAT, BulkError, StoreError, valid_stock
+
+MAX_RECORDS = 10000
+EXPORT_KINDS = ("users", "games", "rentals")
+EXPORT_BATCH = 1000
+
+
+# --- Request validation ---
+def _records(request):
+    records = request.get("records")
+    if records is None:
+        raise KeyError("records missing")
+    if not isinstance(records, list) or not records:
+        raise StoreError("records must be a non-empty list")
+    if len(records) > MAX_RECORDS:
+        raise StoreError(f"At most {MAX_RECORDS} records per batch")
+    return records
+
+def _parse(records, parse_record):
+    # One pass over the batch that collects every bad record instead of
+    # stopping at the first
+    rows, errors = [], []
+    for index, record in enumerate(records):
+        try:
+            if not isinstance(record, dict):
+                raise ValueError("Record must be an object")
+            rows.append(parse_record(record))
+        except ValueError as e:
+            errors.append({"index": index, "message": str(e)})
+    if errors:
+        raise BulkError(errors)
+    return rows
+
+def _user_row(record):
+    name, email, password = record.get("name"), record.get("email"), record.get("password")
+    if not name or not email or not password:
+        raise ValueError("name, email, or password missing")
+    problem = auth.check_new_user(email, password)
+    if problem:
+        raise ValueError(problem)
+    return name, email, password
+
+def _game_row(record):
+    title, stock = record.get("title"), record.get("stock")
+    if title is None or stock is None:
+        raise ValueError("title or stock missing")
+    if not valid_stock(stock):
+        raise ValueError("Stock must be a non-negative integer")
+    return title, stock
+
+def _rental_row(record):
+    user_id, game_id, due_date = record.get("user_id"), record.get("game_id"), record.get("due_date")
+    if user_id is None or game_id is None:
+        raise ValueError("user_id or game_id missing")
+    if due_date is not None:
+        try:
+            due_date = datetime.datetime.strptime(due_date, DATE_FORMAT).toordinal()
+        except (TypeError, ValueError):
+            raise ValueError("due_date must be YYYY-MM-DD")
+    return user_id, game_id, due_date
+
+
+# --- Imports ---
+def import_users(store, request):
+    rows = _parse(_records(request), _user_row)
+    # Reject known emails before paying for key derivation; the store
+    # checks again under its locks
+    errors = [{"index": index, "message": f"Email {email} already registered"}
+              for index, (_, email, _) in enumerate(rows) if store.find_user_by_email(email)]
+    if errors:
+        raise BulkError(errors)
+    hashes = auth.hash_passwords(password for _, _, password in rows)
+    users = store.import_users([(name, email, hashed) for (name, email, _), hashed in zip(rows, hashes)])
+    return {"status": "ok", "message": f"Imported {len(users)} users", "ids": [u.user_id for u in users]}
+
+def import_games(store, request):
+    games = store.import_games(_parse(_records(request), _game_row))
+    return {"status": "ok", "message": f"Imported {len(games)} games", "ids": [g.game_id for g in games]}
+
+def rental_rows(request):
+    # Also used by cluster.py to check a batch before splitting it by shard
+    return _parse(_records(request), _rental_row)
+
+def import_rentals(store, request):
+    rentals = store.import_rentals(rental_rows(request))
+    return {"status": "ok", "message": f"Imported {len(rentals)} rentals", "ids": [r.rental_id for r in rentals]}
+
+
+# --- Export ---
+def export(store, request):
+    # The connection handler takes "export" out of the reply and streams it
+    # with export_chunks() once the reply itself has been sent
+    kind = request.get("kind")
+    if kind not in EXPORT_KINDS:
+        raise StoreError(f"kind must be one of {', '.join(EXPORT_KINDS)}")
+    records = {"users": store.iter_users, "games": store.iter_games, "rentals": store.iter_rentals}[kind]()
+    return {"status": "ok", "message": f"Exporting {kind}", "kind": kind,
+            "export": (record.to_dict() for record in records)}
+
+def export_chunks(records, mode, batch=EXPORT_BATCH):
+    # One message per record, written EXPORT_BATCH at a time, then an
+    # export_end marker with the count. Only one batch is ever held in
+    # memory; the records are read from the store as the stream advances.
+    chunk = []
+    count = 0
+    for record in records:
+        chunk.append(encode_message(record, mode))
+        count += 1
+        if len(chunk) >= batch:
+            yield b"".join(chunk)
+            chunk.clear()
+    chunk.append(encode_message({"type": "export_end", "count": count}, mode))
+    yield b"".join(chunk)
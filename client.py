@@ -0,0 +1,278 @@
+import itertools
+import random
+import socket
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+from protocol import MessageReader, ProtocolError, send_messages
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 5000
+DEFAULT_POOL_SIZE = 4
+DEFAULT_TIMEOUT = 10.0
+# A pooled connection idle for longer than this is pinged before reuse
+HEALTH_CHECK_AFTER = 30.0
+CONNECT_ATTEMPTS = 5
+BACKOFF_INITIAL = 0.1
+BACKOFF_MAX = 5.0
+
+# Requests that are safe to resend on a fresh connection when the old one
+# dies mid-request. Mutations are never retried: the server may have
+# applied them before the connection dropped.
+READ_ACTIONS = frozenset({"ping", "list_dashboard", "stats", "list_users", "list_games", "list_rentals",
+                          "overdue", "search"})
+
+
+class ClientError(Exception):
+    pass
+
+
+class AuthError(ClientError):
+    pass
+
+
+class SessionExpired(AuthError):
+    pass
+
+
+def _batches(records, size):
+    batch = []
+    for record in records:
+        batch.append(record)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+# --- Single connection ---
+class Connection:
+    # One framed, authenticated socket. Requests can be pipelined: all of
+    # them are written at once and the replies read back in order.
+    def __init__(self, host, port, timeout=DEFAULT_TIMEOUT):
+        self.sock = socket.create_connection((host, port), timeout=timeout)
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.reader = MessageReader(self.sock)
+        self.last_used = time.monotonic()
+
+    def login(self, username, password, token=None):
+        # With a session token the password is not sent; returns the token
+        # to reuse on later connections
+        if token is not None:
+            reply = self.request({"type": "auth", "token": token})
+        else:
+            reply = self.request({"type": "auth", "username": username, "password": password})
+        if reply.get("status") != "ok":
+            if reply.get("reauth"):
+                raise SessionExpired(reply.get("message"))
+            raise AuthError(reply.get("message", "Authentication failed"))
+        return reply.get("token")
+
+    def request(self, message):
+        return self.pipeline([message])[0]
+
+    def pipeline(self, messages):
+        self.send(messages)
+        return [self.receive() for _ in messages]
+
+    def send(self, messages):
+        send_messages(self.sock, messages)
+
+    def receive(self):
+        reply = self.reader.read_message()
+        if reply is None:
+            raise ConnectionError("Server closed the connection")
+        self.last_used = time.monotonic()
+        return reply
+
+    def healthy(self):
+        try:
+            return self.request({"action": "ping"}).get("status") == "ok"
+        except (OSError, ProtocolError, ValueError):
+            return False
+
+    def close(self):
+        try:
+            self.sock.close()
+        except OSError:
+            pass
+
+
+# --- Pool ---
+class ConnectionPool:
+    # Thread-safe pool of persistent authenticated connections. At most
+    # `size` are open at once; callers beyond that wait up to `timeout` for
+    # one to be checked back in. The first login's session token is shared,
+    # so later connections skip the password check.
+    #
+    # With `replicas` ((host, port) of read replicas), requests made only of
+    # READ_ACTIONS go round-robin to a pool per replica and fall back to the
+    # primary when a replica cannot be reached.
+    def __init__(self, host=DEFAULT_HOST, port=DEFAULT_PORT, username=None, password=None,
+                 size=DEFAULT_POOL_SIZE, timeout=DEFAULT_TIMEOUT, health_check_after=HEALTH_CHECK_AFTER,
+                 replicas=()):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.size = size
+        self.timeout = timeout
+        self.health_check_after = health_check_after
+        self.token = None
+        self._idle = deque()
+        self._slots = threading.BoundedSemaphore(size)
+        self._lock = threading.Lock()
+        self._closed = False
+        self.replicas = [ConnectionPool(replica_host, replica_port, username, password, size, timeout,
+                                        health_check_after)
+                         for replica_host, replica_port in replicas]
+        self._next_replica = itertools.count()
+
+    # --- Connections ---
+    def _connect(self):
+        # Reconnects with exponential backoff and jitter; bad credentials
+        # fail immediately
+        delay = BACKOFF_INITIAL
+        for attempt in range(CONNECT_ATTEMPTS):
+            try:
+                return self._login(Connection(self.host, self.port, self.timeout))
+            except SessionExpired:
+                # The server closes the connection after a rejected token
+                self.token = None
+                return self._login(Connection(self.host, self.port, self.timeout))
+            except AuthError:
+                raise
+            except (OSError, ProtocolError, ValueError) as e:
+                error = e
+                if attempt + 1 < CONNECT_ATTEMPTS:
+                    time.sleep(delay * random.uniform(0.5, 1.0))
+                    delay = min(delay * 2, BACKOFF_MAX)
+        raise ClientError(f"Could not connect to {self.host}:{self.port}: {error}")
+
+    def _login(self, conn):
+        try:
+            self.token = conn.login(self.username, self.password, self.token)
+        except BaseException:
+            conn.close()
+            raise
+        return conn
+
+    def _checkout(self):
+        if self._closed:
+            raise ClientError("Pool is closed")
+        if not self._slots.acquire(timeout=self.timeout):
+            raise ClientError("Timed out waiting for a pooled connection")
+        try:
+            while True:
+                with self._lock:
+                    conn = self._idle.pop() if self._idle else None
+                if conn is None:
+                    return self._connect()
+                if time.monotonic() - conn.last_used < self.health_check_after or conn.healthy():
+                    return conn
+                conn.close()
+        except BaseException:
+            self._slots.release()
+            raise
+
+    def _checkin(self, conn, broken=False):
+        if broken or self._closed:
+            conn.close()
+        else:
+            with self._lock:
+                self._idle.append(conn)
+        self._slots.release()
+
+    @contextmanager
+    def connection(self):
+        # Exclusive use of one connection, e.g. for a long pipeline
+        conn = self._checkout()
+        try:
+            yield conn
+        except BaseException:
+            self._checkin(conn, broken=True)
+            raise
+        self._checkin(conn)
+
+    def connect(self):
+        # Opens (and authenticates) one connection up front, so bad
+        # credentials or an unreachable server show up immediately
+        with self.connection():
+            pass
+
+    # --- Requests ---
+    def request(self, message):
+        return self.pipeline([message])[0]
+
+    def pipeline(self, messages):
+        messages = list(messages)
+        retry = all(m.get("action") in READ_ACTIONS for m in messages)
+        if retry and self.replicas:
+            replica = self.replicas[next(self._next_replica) % len(self.replicas)]
+            try:
+                return replica.pipeline(messages)
+            except ClientError:
+                pass
+        for attempt in range(2):
+            conn = self._checkout()
+            try:
+                replies = conn.pipeline(messages)
+            except (OSError, ProtocolError, ValueError) as e:
+                self._checkin(conn, broken=True)
+                if attempt or not retry:
+                    raise ClientError(f"Request failed: {e}") from e
+                continue
+            except BaseException:
+                self._checkin(conn, broken=True)
+                raise
+            self._checkin(conn)
+            return replies
+
+    # --- Bulk transfer ---
+    def import_records(self, kind, records, batch_size=1000, window=8):
+        # Streams any iterable of records as import_<kind> batches on one
+        # connection, keeping up to `window` batches in flight; returns one
+        # reply per batch. Each batch is applied or rejected on its own.
+        replies = []
+        in_flight = 0
+        with self.connection() as conn:
+            for batch in _batches(records, batch_size):
+                conn.send([{"action": f"import_{kind}", "records": batch}])
+                in_flight += 1
+                if in_flight >= window:
+                    replies.append(conn.receive())
+                    in_flight -= 1
+            for _ in range(in_flight):
+                replies.append(conn.receive())
+        return replies
+
+    def export(self, kind):
+        # Yields every record of `kind` ("users", "games", "rentals") as the
+        # server streams them; the connection is held until the end marker
+        with self.connection() as conn:
+            reply = conn.request({"action": "export", "kind": kind})
+            if reply.get("status") != "ok":
+                raise ClientError(reply.get("message", "Export failed"))
+            while True:
+                record = conn.receive()
+                if record.get("type") == "export_end":
+                    return
+                yield record
+
+    def close(self):
+        self._closed = True
+        with self._lock:
+            idle, self._idle = self._idle, deque()
+        for conn in idle:
+            conn.close()
+        for replica in self.replicas:
+            replica.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,415 @@
+import hmac
+import itertools
+import os
+import secrets
+import signal
+import socket
+import subprocess
+import sys
+import threading
+import time
+from operator import itemgetter
+
+import bulk
+import queries
+from client import Connection
+from protocol import ProtocolError, RawJSON, decode_payload, encode_frame
+from serializer import dumps
+from store import StoreError
+
+SECRET_ENV = "GAMEHUB_CLUSTER_SECRET"
+SERVER_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "server.py")
+PEER_HOST = "127.0.0.1"
+PEER_TIMEOUT = 60.0
+PEER_CONNECT_ATTEMPTS = 6
+# Users are created on this shard and copied to every other one
+USER_SHARD = 0
+
+# Listings answered by merging one page from every shard, by their id field
+PAGED_ACTIONS = {"list_games": "game_id", "list_rentals": "rental_id", "overdue": "rental_id"}
+
+PEER_OK = {"status": "ok", "message": "Peer authenticated"}
+SUBSCRIBE_UNSUPPORTED = {"status": "error", "message": "subscribe is not available on a sharded server"}
+
+
+class ShardUnavailable(StoreError):
+    pass
+
+
+def shard_path(path, shard):
+    # server_log.txt -> server_log.shard-2.txt
+    root, ext = os.path.splitext(path)
+    return f"{root}.shard-{shard}{ext}"
+
+
+# --- Peer connections ---
+class PeerPool:
+    # Idle authenticated connections to one peer worker. Connections are
+    # opened on demand, so a burst of forwarded requests grows the pool
+    # instead of queueing behind a fixed number of sockets.
+    def __init__(self, shard, port, secret):
+        self.shard = shard
+        self.port = port
+        self.secret = secret
+        self._idle = []
+        self._lock = threading.Lock()
+
+    def checkout(self):
+        with self._lock:
+            if self._idle:
+                return self._idle.pop()
+        # Workers start together, so a peer may still be coming up
+        delay = 0.05
+        for attempt in range(PEER_CONNECT_ATTEMPTS):
+            try:
+                conn = Connection(PEER_HOST, self.port, PEER_TIMEOUT)
+            except OSError as e:
+                if attempt + 1 == PEER_CONNECT_ATTEMPTS:
+                    raise ShardUnavailable(f"Shard {self.shard} unavailable: {e}") from e
+                time.sleep(delay)
+                delay *= 2
+                continue
+            try:
+                reply = conn.request({"type": "auth", "peer": self.secret})
+            except (OSError, ProtocolError, ValueError) as e:
+                conn.close()
+                raise ShardUnavailable(f"Shard {self.shard} unavailable: {e}") from e
+            if reply.get("status") != "ok":
+                conn.close()
+                raise ShardUnavailable(f"Shard {self.shard} rejected this worker")
+            return conn
+
+    def checkin(self, conn, broken=False):
+        if broken:
+            conn.close()
+        else:
+            with self._lock:
+                self._idle.append(conn)
+
+
+# --- Routing ---
+class Cluster:
+    # This worker's view of the cluster: which shard owns a request, and peer
+    # connections to forward it or fan it out. Games and rentals are
+    # partitioned by id (see Store); users and sessions are copied to every
+    # shard, so user reads and the user check in create_rental stay local.
+    # `local` processes a payload on this shard without routing it again.
+    def __init__(self, shard, shards, peer_port, secret, store, sessions, local):
+        self.shard = shard
+        self.shards = shards
+        self.peer_port = peer_port
+        self.secret = secret
+        self.store = store
+        self.sessions = sessions
+        self.local = local
+        self.peers = {k: PeerPool(k, peer_port + k, secret) for k in range(shards) if k != shard}
+        # New games go round-robin over the shards
+        self._placement = itertools.count(shard)
+
+    def listen(self, handler):
+        # Peer requests arrive on their own loopback port and are handled by
+        # handler(sock, address, peer=True), one thread per connection
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        sock.bind((PEER_HOST, self.peer_port + self.shard))
+        sock.listen(128)
+
+        def accept():
+            while True:
+                conn, address = sock.accept()
+                threading.Thread(target=handler, args=(conn, address, True), daemon=True).start()
+
+        threading.Thread(target=accept, name="peer-listener", daemon=True).start()
+
+    def check_peer(self, auth_data):
+        # Same (ok, reply, first request, username) shape as server.authenticate
+        secret = decode_payload(auth_data).get("peer")
+        ok = isinstance(secret, str) and hmac.compare_digest(secret, self.secret)
+        return ok, PEER_OK if ok else {"status": "error", "message": "Authentication failed"}, None, None
+
+    def shard_of(self, record_id):
+        if not isinstance(record_id, int) or isinstance(record_id, bool) or record_id < 1:
+            return None
+        return (record_id - 1) % self.shards
+
+    # --- Transport ---
+    def _send(self, shard, payload):
+        pool = self.peers[shard]
+        conn = pool.checkout()
+        try:
+            conn.sock.sendall(encode_frame(payload))
+        except OSError as e:
+            pool.checkin(conn, broken=True)
+            raise ShardUnavailable(f"Shard {shard} unavailable: {e}") from e
+        return conn
+
+    def _receive(self, shard, conn):
+        pool = self.peers[shard]
+        try:
+            payload = conn.reader.read_payload()
+        except (OSError, ProtocolError):
+            payload = None
+        if payload is None:
+            pool.checkin(conn, broken=True)
+            raise ShardUnavailable(f"Shard {shard} unavailable")
+        pool.checkin(conn)
+        return payload
+
+    def forward(self, shard, payload):
+        # The owner's reply is relayed without being decoded here
+        return RawJSON(self._receive(shard, self._send(shard, payload)))
+
+    def _to(self, shard, payload):
+        if shard is None or shard == self.shard:
+            return None
+        return self.forward(shard, payload)
+
+    def _gather(self, payloads):
+        # payloads: {shard: payload}. Every peer request is written before
+        # the local part runs, so all shards work on their part at once.
+        sent = {}
+        replies = {}
+        try:
+            for shard, payload in payloads.items():
+                if shard != self.shard:
+                    sent[shard] = self._send(shard, payload)
+            if self.shard in payloads:
+                reply = self.local(payloads[self.shard])
+                # orjson only decodes exact bytes, not the RawJSON subclass
+                replies[self.shard] = decode_payload(bytes(reply)) if isinstance(reply, RawJSON) else reply
+            for shard in list(sent):
+                replies[shard] = decode_payload(self._receive(shard, sent.pop(shard)))
+        finally:
+            for shard, conn in sent.items():
+                self.peers[shard].checkin(conn, broken=True)
+        return replies
+
+    def _everywhere(self, payload):
+        return self._gather({k: payload for k in range(self.shards)})
+
+    def _broadcast(self, message):
+        payload = dumps(message) if isinstance(message, dict) else message
+        for shard, reply in self._gather({k: payload for k in self.peers}).items():
+            if reply.get("status") != "ok":
+                raise ShardUnavailable(f"Shard {shard}: {reply.get('message')}")
+
+    # --- Replication ---
+    def replicate_users(self, users):
+        if users and self.peers:
+            self._broadcast({"action": "replicate", "users": [
+                {"user_id": u.user_id, "name": u.name, "email": u.email, "password": u.password}
+                for u in users]})
+
+    def share_session(self, token, username):
+        if self.peers:
+            self._broadcast({"action": "replicate", "sessions": [
+                {"token": token, "username": username, "ttl": self.sessions.ttl}]})
+
+    def apply(self, request):
+        # The receiving side of replicate_users/share_session
+        self.store.replicate_users([(u["user_id"], u["name"], u["email"], u["password"])
+                                    for u in request.get("users", ())])
+        for session in request.get("sessions", ()):
+            self.sessions.add(session["token"], session["username"], session["ttl"])
+        return {"status": "ok"}
+
+    # --- Requests ---
+    def route(self, action, request, payload):
+        # Returns the reply when other shards answered the request (forwarded
+        # or merged), or None when it is processed on this shard as usual
+        if action in ("add_user", "import_users"):
+            return self._to(USER_SHARD, payload)
+        if action in ("add_game", "import_games"):
+            return self._to(next(self._placement) % self.shards, payload)
+        if action == "create_rental":
+            return self._to(self.shard_of(request.get("game_id")), payload)
+        if action == "return_rental":
+            return self._to(self.shard_of(request.get("rental_id")), payload)
+        if action == "reserve_games":
+            return self._reserve(request, payload)
+        if action == "import_rentals":
+            return self._import_rentals(request, payload)
+        if action == "list_dashboard":
+            return self._dashboard(payload)
+        if action == "stats":
+            return self._stats(payload)
+        if action == "search":
+            # Every shard holds every user, so only games are merged
+            return None if request.get("kind") == "users" else self._search(request, payload)
+        if action in PAGED_ACTIONS:
+            if request.get("game_id") is not None:
+                return self._to(self.shard_of(request["game_id"]), payload)
+            return self._page(request, PAGED_ACTIONS[action])
+        if action == "export":
+            return self._export(request)
+        if action == "logout":
+            self._broadcast(payload)
+            return None
+        if action == "subscribe":
+            return SUBSCRIBE_UNSUPPORTED
+        return None
+
+    def _reserve(self, request, payload):
+        # All-or-nothing across processes would take a two-phase commit, so
+        # one reservation has to stay within one shard
+        game_ids = request.get("game_ids")
+        if not isinstance(game_ids, list):
+            return None
+        shards = {self.shard_of(game_id) for game_id in game_ids} - {None}
+        if len(shards) > 1:
+            raise StoreError(f"Games {game_ids} are on different shards; reserve them separately")
+        return self._to(shards.pop() if shards else None, payload)
+
+    def _import_rentals(self, request, payload):
+        # Records are checked here, then split by the shard of their game.
+        # Each shard applies its part atomically; if one part is rejected
+        # the others may already be committed, so the reply says, per
+        # shard, which records were committed and which failed.
+        rows = bulk.rental_rows(request)
+        parts = {}
+        for index, (_, game_id, _) in enumerate(rows):
+            shard = self.shard_of(game_id)
+            parts.setdefault(self.shard if shard is None else shard, []).append(index)
+        if len(parts) == 1:
+            return self._to(next(iter(parts)), payload)
+        records = request["records"]
+        replies = self._gather({shard: dumps({"action": "import_rentals",
+                                              "records": [records[i] for i in indexes]})
+                                for shard, indexes in parts.items()})
+        ids, errors, shards = [None] * len(rows), [], {}
+        for shard, indexes in sorted(parts.items()):
+            reply = replies[shard]
+            committed = reply.get("status") == "ok"
+            if committed:
+                for index, rental_id in zip(indexes, reply["ids"]):
+                    ids[index] = rental_id
+            elif "errors" in reply:
+                errors.extend({"index": indexes[e["index"]], "message": e["message"]} for e in reply["errors"])
+            else:
+                errors.extend({"index": index, "message": reply.get("message")} for index in indexes)
+            shards[str(shard)] = {"committed": len(indexes) if committed else 0,
+                                  "failed": 0 if committed else len(indexes), "indexes": indexes}
+        if not errors:
+            return {"status": "ok", "message": f"Imported {len(rows)} rentals", "ids": ids, "shards": shards}
+        imported = sum(1 for rental_id in ids if rental_id is not None)
+        return {"status": "error", "message": f"{len(errors)} records rejected; {imported} were committed "
+                                              f"on other shards (see shards)",
+                "errors": sorted(errors, key=itemgetter("index")), "ids": ids, "shards": shards}
+
+    def _dashboard(self, payload):
+        replies = self._everywhere(payload)
+        merged = {"users": replies[self.shard]["users"]}
+        for key, id_field in (("games", "game_id"), ("rentals", "rental_id")):
+            merged[key] = sorted(itertools.chain.from_iterable(r[key] for r in replies.values()),
+                                 key=itemgetter(id_field))
+        return merged
+
+    def _stats(self, payload):
+        replies = self._everywhere(payload)
+        stats, stock = {}, {}
+        version = 0
+        epochs = []
+        for _, reply in sorted(replies.items()):
+            if reply.get("status") != "ok":
+                return reply
+            for key, value in reply["stats"].items():
+                stats[key] = stats.get(key, 0) + value
+            stock.update(reply.get("stock_by_game", ()))
+            # Each shard's version only grows, so their sum moves whenever any does
+            version += reply["version"]
+            epochs.append(reply["epoch"])
+        response = {"status": "ok", "stats": stats, "version": version, "epoch": "-".join(epochs)}
+        if "stock_by_game" in replies[self.shard]:
+            response["stock_by_game"] = stock
+        return response
+
+    def _search(self, request, payload):
+        # Each shard returns its best `limit` games; the best of their union
+        # are the answer
+        replies = self._everywhere(payload)
+        for reply in replies.values():
+            if reply.get("status") != "ok":
+                return reply
+        limit = min(request.get("limit", queries.SEARCH_LIMIT), queries.MAX_SEARCH_LIMIT)
+        response = replies[self.shard]
+        response["games"] = sorted(itertools.chain.from_iterable(r["games"] for r in replies.values()),
+                                   key=queries.search_order("title", "game_id"))[:limit]
+        return response
+
+    def _page(self, request, id_field):
+        # Every shard returns its first `limit` items past the cursor; the
+        # smallest `limit` ids of their union are exactly the next page
+        fields = request.get("fields")
+        strip = isinstance(fields, list) and id_field not in fields
+        if strip:
+            request = dict(request, fields=[*fields, id_field])
+        replies = self._everywhere(dumps(request))
+        for reply in replies.values():
+            if reply.get("status") != "ok":
+                return reply
+        limit = min(request.get("limit", queries.DEFAULT_LIMIT), queries.MAX_LIMIT)
+        items = sorted(itertools.chain.from_iterable(r["items"] for r in replies.values()),
+                       key=itemgetter(id_field))
+        more = len(items) > limit or any(r["next_cursor"] is not None for r in replies.values())
+        items = items[:limit]
+        next_cursor = items[-1][id_field] if more and items else None
+        if strip:
+            for item in items:
+                del item[id_field]
+        totals = [r["total"] for r in replies.values()]
+        response = {"status": "ok", "items": items, "next_cursor": next_cursor,
+                    "total": None if None in totals else sum(totals)}
+        if "as_of" in replies[self.shard]:
+            response["as_of"] = replies[self.shard]["as_of"]
+        return response
+
+    def _export(self, request):
+        # Users are on every shard; games and rentals are this shard's export
+        # followed by each peer's, relayed as they arrive
+        if request.get("kind") == "users":
+            return None
+        response = bulk.export(self.store, request)
+        payload = dumps(request)
+        response["export"] = itertools.chain(response["export"], *(self._relay(k, payload) for k in self.peers))
+        return response
+
+    def _relay(self, shard, payload):
+        pool = self.peers[shard]
+        conn = pool.checkout()
+        try:
+            conn.sock.sendall(encode_frame(payload))
+            reply = conn.receive()
+            if reply.get("status") != "ok":
+                raise ShardUnavailable(f"Shard {shard}: {reply.get('message')}")
+            while True:
+                record = conn.receive()
+                if record.get("type") == "export_end":
+                    break
+                yield record
+        except BaseException:
+            pool.checkin(conn, broken=True)
+            raise
+        pool.checkin(conn)
+
+
+# --- Supervisor ---
+def supervise(argv, workers):
+    # Runs one server.py per shard with the same options; they share the
+    # client port through SO_REUSEPORT. All workers are stopped as soon as
+    # one exits or the supervisor is interrupted.
+    env = dict(os.environ)
+    env[SECRET_ENV] = secrets.token_hex(16)
+    procs = [subprocess.Popen([sys.executable, SERVER_SCRIPT, *argv, "--shard", str(k)], env=env)
+             for k in range(workers)]
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    try:
+        while all(p.poll() is None for p in procs):
+            time.sleep(0.5)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for p in procs:
+            if p.poll() is None:
+                p.terminate()
+        for p in procs:
+            p.wait()
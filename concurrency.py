@@ -0,0 +1,110 @@
+import threading
+import time
+
+DEFAULT_STRIPES = 64
+
+
+class IdAllocator:
+    # Hands out increasing ids; the read and the increment happen under one
+    # lock so concurrent callers can never receive the same id. A sharded
+    # store allocates every `step`-th id from `start`, so the shard that owns
+    # an id can be computed from the id alone.
+    def __init__(self, start=1, step=1):
+        self._lock = threading.Lock()
+        self._start = start
+        self._step = step
+        self._next = start
+
+    def allocate(self):
+        with self._lock:
+            value = self._next
+            self._next += self._step
+            return value
+
+    def peek(self):
+        return self._next
+
+    def after(self, after=None):
+        # Every id this allocator could have handed out past `after`, in order
+        first = self._start
+        if after is not None and after >= first:
+            first += ((after - first) // self._step + 1) * self._step
+        return range(first, self._next, self._step)
+
+    def advance_past(self, value):
+        # Used when records are loaded with existing ids
+        with self._lock:
+            if value >= self._next:
+                self._next = value + self._step
+
+
+class TimedLock:
+    # A Lock that counts how often callers had to wait for it and for how
+    # long. The uncontended path is a single non-blocking acquire; the
+    # counters are only updated by the thread that then holds the lock, so
+    # they need no lock of their own.
+    __slots__ = ("_lock", "contended", "wait_seconds")
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.contended = 0
+        self.wait_seconds = 0.0
+
+    def acquire(self, blocking=True, timeout=-1):
+        if self._lock.acquire(False):
+            return True
+        if not blocking:
+            return False
+        started = time.perf_counter()
+        acquired = self._lock.acquire(True, timeout)
+        if acquired:
+            self.contended += 1
+            self.wait_seconds += time.perf_counter() - started
+        return acquired
+
+    def release(self):
+        self._lock.release()
+
+    def __enter__(self):
+        return self.acquire()
+
+    def __exit__(self, *exc):
+        self._lock.release()
+        return False
+
+
+class LockStripes:
+    # A fixed pool of locks shared by key hash. Operations on different keys
+    # usually take different locks, so they do not serialize each other,
+    # while memory stays bounded no matter how many keys exist.
+    def __init__(self, count=DEFAULT_STRIPES):
+        self._locks = [TimedLock() for _ in range(count)]
+
+    def wait_stats(self):
+        # Summed over the stripes
+        return {"contended": sum(lock.contended for lock in self._locks),
+                "wait_seconds": sum(lock.wait_seconds for lock in self._locks)}
+
+    def lock_for(self, key):
+        return self._locks[hash(key) % len(self._locks)]
+
+    def locks_for(self, keys):
+        # Distinct stripes in a fixed global order, so callers that lock
+        # several keys at once cannot deadlock each other.
+        indexes = sorted({hash(key) % len(self._locks) for key in keys})
+        return [self._locks[i] for i in indexes]
+
+
+class MultiLock:
+    def __init__(self, locks):
+        self.locks = locks
+
+    def __enter__(self):
+        for lock in self.locks:
+            lock.acquire()
+        return self
+
+    def __exit__(self, *exc):
+        for lock in reversed(self.locks):
+            lock.release()
+        return False
@@ -0,0 +1,182 @@
+import secrets
+import threading
+from collections import deque
+from itertools import islice
+
+from protocol import MODE_LEGACY, encode_frame
+from serializer import dumps
+
+DEFAULT_HISTORY = 100000
+DEFAULT_MAX_PENDING = 10000
+HEARTBEAT_INTERVAL = 15.0
+
+USER_ADDED = "user_added"
+GAME_ADDED = "game_added"
+RENTAL_CREATED = "rental_created"
+RENTAL_RETURNED = "rental_returned"
+RENTALS_OVERDUE = "rentals_overdue"
+
+
+class ResumeExpired(Exception):
+    pass
+
+
+class Event:
+    # The JSON body is encoded once, by the first subscriber that sends the
+    # event, and shared by every other, so fan-out costs a buffer copy per
+    # subscriber, not an encode. publish() never encodes: it runs under the
+    # feed lock with a game's lock held, and with nobody subscribed most
+    # events are never sent at all. Two subscribers racing to encode it
+    # just produce the same bytes twice.
+    __slots__ = ("seq", "kind", "data", "_body")
+
+    def __init__(self, seq, kind, data):
+        self.seq = seq
+        self.kind = kind
+        self.data = data
+        self._body = None
+
+    @property
+    def body(self):
+        if self._body is None:
+            self._body = dumps({"type": "event", "seq": self.seq, "event": self.kind, "data": self.data})
+        return self._body
+
+    def encode(self, mode):
+        return self.body if mode == MODE_LEGACY else encode_frame(self.body)
+
+
+class Subscriber:
+    # Events wait in a bounded queue. A subscriber that falls more than
+    # max_pending events behind is marked overflowed and dropped instead of
+    # stalling publishers; it can reconnect and resume from its last seq.
+    # A closed subscriber's feed is gone (a replica swapped stores): its
+    # stream ends once the queued events are sent.
+    def __init__(self, max_pending=DEFAULT_MAX_PENDING, wakeup=None):
+        self.max_pending = max_pending
+        self.pending = deque()
+        self.overflowed = False
+        self.closed = False
+        self.last_seq = 0
+        self._ready = threading.Event()
+        self._wakeup = wakeup
+
+    def push(self, event):
+        # Called with the feed lock held
+        if self.overflowed:
+            return
+        if len(self.pending) >= self.max_pending:
+            self.overflowed = True
+        else:
+            self.pending.append(event)
+        self._ready.set()
+        if self._wakeup is not None:
+            self._wakeup()
+
+    def close(self):
+        # Called with the feed lock held
+        self.closed = True
+        self._ready.set()
+        if self._wakeup is not None:
+            self._wakeup()
+
+    def attach(self, wakeup):
+        self._wakeup = wakeup
+        self.push_ready()
+
+    def push_ready(self):
+        if self.pending:
+            self._ready.set()
+            if self._wakeup is not None:
+                self._wakeup()
+
+    def take(self, max_batch=1000):
+        batch = []
+        while self.pending and len(batch) < max_batch:
+            batch.append(self.pending.popleft())
+        if not self.pending:
+            self._ready.clear()
+            # Re-check: a push may have landed between popleft and clear
+            if self.pending:
+                self._ready.set()
+        if batch:
+            self.last_seq = batch[-1].seq
+        return batch
+
+    def wait(self, timeout=None):
+        return self._ready.wait(timeout)
+
+
+def heartbeat(seq):
+    return {"type": "heartbeat", "seq": seq}
+
+
+def overflow_notice(subscriber):
+    return {"type": "overflow", "status": "error",
+            "message": "Subscriber fell behind; resubscribe with since=resume_from",
+            "resume_from": subscriber.last_seq}
+
+
+def end_notice(subscriber):
+    # The last message to an overflowed or closed subscriber
+    if subscriber.closed:
+        return {"type": "closed", "status": "error", "resync": True,
+                "message": "The server reloaded its data; reload and subscribe again"}
+    return overflow_notice(subscriber)
+
+
+class ChangeFeed:
+    # seq restarts at 0 with the process; `epoch` is new on every start (and
+    # differs between a primary and its replicas), so the pair names one
+    # point in one run's history
+    def __init__(self, history=DEFAULT_HISTORY):
+        self._lock = threading.Lock()
+        self._history = deque(maxlen=history)
+        self._subscribers = set()
+        self.seq = 0
+        self.epoch = secrets.token_hex(8)
+
+    def publish(self, kind, data):
+        with self._lock:
+            self.seq += 1
+            event = Event(self.seq, kind, data)
+            self._history.append(event)
+            for subscriber in self._subscribers:
+                subscriber.push(event)
+        return event
+
+    def subscribe(self, since=None, max_pending=DEFAULT_MAX_PENDING, wakeup=None, epoch=None):
+        # since=None starts at the current position; otherwise events after
+        # `since` are replayed from history before live events follow. A
+        # position past the end, or from another epoch, was reached in an
+        # earlier run of the server and means nothing in this one.
+        subscriber = Subscriber(max_pending, wakeup)
+        with self._lock:
+            if since is not None and (since > self.seq or (epoch is not None and epoch != self.epoch)):
+                raise ResumeExpired(f"Position {since} is not from this run of the server")
+            if since is not None and since < self.seq:
+                oldest = self._history[0].seq if self._history else self.seq + 1
+                if since + 1 < oldest:
+                    raise ResumeExpired(f"Events after {since} are no longer available")
+                # Replayed events do not count against max_pending; only
+                # live lag does
+                subscriber.pending.extend(islice(self._history, since + 1 - oldest, None))
+                subscriber.max_pending += len(subscriber.pending)
+                subscriber.push_ready()
+            subscriber.last_seq = self.seq if since is None else since
+            self._subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        with self._lock:
+            self._subscribers.discard(subscriber)
+
+    def close(self):
+        # Ends every subscription; the feed is being replaced
+        with self._lock:
+            for subscriber in self._subscribers:
+                subscriber.close()
+            self._subscribers.clear()
+
+    def subscriber_count(self):
+        return len(self._subscribers)
@@ -1,71 +1,242 @@
+import queue
+import threading
 import tkinter as tk
-from tkinter import messagebox
-import socket
-import json
+from tkinter import messagebox, simpledialog, ttk
+
+from client import ClientError, ConnectionPool
 
 SERVER_HOST = "127.0.0.1"
 SERVER_PORT = 5000
+# Rows fetched per page; the next page is requested once the view is
+# scrolled past PREFETCH_AT of the rows loaded so far
+PAGE_SIZE = 100
+PREFETCH_AT = 0.8
+# How often the Tk loop picks up replies from the network worker
+POLL_MS = 20
+
+# --- Background networking ---
+# One persistent authenticated connection, created after login
+client = None
+# Requests go through one worker thread so the Tk main loop never waits on
+# the socket. Tk is not thread-safe: the worker only puts replies on a
+# queue, and the main loop drains it and runs the callbacks.
+jobs = queue.Queue()
+results = queue.Queue()
+
+def network_worker():
+    while True:
+        job = jobs.get()
+        if job is None:
+            return
+        messages, callback = job
+        try:
+            replies = client.pipeline(messages)
+        except Exception as e:
+            # Every callback still runs, so state such as a table's loading
+            # flag is reset; it sees one error reply per message
+            replies = [{"status": "error", "message": str(e)}] * len(messages)
+        results.put((callback, replies))
 
-# --- Helper function to send JSON requests to server ---
-def send_request(request_dict):
+def submit(messages, callback):
+    # callback(replies) runs on the Tk thread, one reply per message
+    jobs.put((messages, callback))
+    status_var.set("Loading...")
+
+def show_failure(replies):
+    # Shows the first error reply, if any; True when there was one
+    for reply in replies:
+        if reply.get("status") != "ok":
+            messagebox.showerror("Error", reply.get("message", "Request failed"))
+            return True
+    return False
+
+def drain_results():
+    # Rescheduled first, so a failing callback does not stop the polling
+    root.after(POLL_MS, drain_results)
     try:
-        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
-            s.connect((SERVER_HOST, SERVER_PORT))
-            s.sendall(json.dumps(request_dict).encode())
-            data = s.recv(8192)
-            if not data:
-                messagebox.showerror("Error", "No response from server")
-                return None
-            return json.loads(data.decode())
-    except Exception as e:
-        messagebox.showerror("Error", str(e))
-        return None
+        while True:
+            callback, replies = results.get_nowait()
+            callback(replies)
+    except queue.Empty:
+        pass
+    if jobs.empty() and results.empty():
+        status_var.set("")
+
+def login():
+    global client
+    username = simpledialog.askstring("Login", "Username:", parent=root)
+    password = simpledialog.askstring("Login", "Password:", show="*", parent=root)
+    client = ConnectionPool(SERVER_HOST, SERVER_PORT, username, password, size=1)
+    try:
+        client.connect()
+    except ClientError as e:
+        messagebox.showerror("Authentication failed", str(e))
+        return False
+    threading.Thread(target=network_worker, name="network", daemon=True).start()
+    return True
+
+# --- Paged tables ---
+class LazyTable:
+    # A ttk.Treeview holding only the pages scrolled to so far. Rows are
+    # keyed by record id, so a changed record is updated in place rather
+    # than the table being rebuilt.
+    def __init__(self, notebook, title, action, id_field, columns):
+        self.notebook = notebook
+        self.title = title
+        self.action = action
+        self.id_field = id_field
+        self.columns = columns
+        self.frame = ttk.Frame(notebook)
+        self.tree = ttk.Treeview(self.frame, columns=columns, show="headings")
+        for column in columns:
+            self.tree.heading(column, text=column.replace("_", " ").title())
+            self.tree.column(column, width=80, stretch=True)
+        self.scrollbar = ttk.Scrollbar(self.frame, orient="vertical", command=self.tree.yview)
+        self.tree.configure(yscrollcommand=self.scrolled)
+        self.scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        notebook.add(self.frame, text=title)
+        self.next_cursor = None
+        self.complete = False
+        self.loading = False
+        # Bumped by reload() so pages requested before it are dropped
+        self.generation = 0
+
+    def reload(self):
+        self.generation += 1
+        self.tree.delete(*self.tree.get_children())
+        self.next_cursor = None
+        self.complete = False
+        self.loading = False
+        self.load_more()
+
+    def load_more(self):
+        if self.loading or self.complete:
+            return
+        self.loading = True
+        message = {"action": self.action, "limit": PAGE_SIZE}
+        if self.next_cursor is not None:
+            message["cursor"] = self.next_cursor
+        generation = self.generation
+        submit([message], lambda replies: self.loaded(generation, replies[0]))
+
+    def loaded(self, generation, reply):
+        if generation != self.generation:
+            return
+        self.loading = False
+        if show_failure([reply]):
+            return
+        for item in reply["items"]:
+            self.tree.insert("", tk.END, iid=str(item[self.id_field]), values=self.values(item))
+        self.next_cursor = reply["next_cursor"]
+        self.complete = self.next_cursor is None
+        self.notebook.tab(self.frame, text=f"{self.title} ({reply['total']})")
+
+    def scrolled(self, first, last):
+        # Tk calls this after every layout change too, so a page too short
+        # to fill the view also leads to the next one
+        self.scrollbar.set(first, last)
+        if float(last) >= PREFETCH_AT:
+            self.load_more()
+
+    def values(self, item):
+        return tuple(str(item[column]) for column in self.columns)
+
+    def update_row(self, item):
+        # A record that changed: updated if loaded, appended if it is new
+        # and every page is already loaded; otherwise a later page brings it
+        iid = str(item[self.id_field])
+        if self.tree.exists(iid):
+            self.tree.item(iid, values=self.values(item))
+        elif self.complete:
+            self.tree.insert("", tk.END, iid=iid, values=self.values(item))
+
+    def row(self, record_id):
+        # The loaded row for an id as {column: value}, or None
+        iid = str(record_id)
+        if not self.tree.exists(iid):
+            return None
+        return dict(zip(self.columns, self.tree.item(iid, "values")))
+
+def one_record(action, record_id):
+    # The first record past id - 1 is the record itself, if it exists
+    return {"action": action, "cursor": record_id - 1, "limit": 1}
+
+def refresh_rental(rental_id, game_id=None):
+    # Re-reads just the rental and its game; only their rows are redrawn
+    messages = [one_record("list_rentals", rental_id)]
+    if game_id is not None:
+        messages.append(one_record("list_games", game_id))
+
+    def refreshed(replies):
+        if show_failure(replies):
+            return
+        rentals = [r for r in replies[0]["items"] if r["rental_id"] == rental_id]
+        for rental in rentals:
+            rentals_table.update_row(rental)
+        if game_id is None:
+            if rentals:
+                refresh_game(rentals[0]["game_id"])
+        else:
+            for game in replies[1]["items"]:
+                if game["game_id"] == game_id:
+                    games_table.update_row(game)
+    submit(messages, refreshed)
+
+def refresh_game(game_id):
+    def refreshed(replies):
+        if show_failure(replies):
+            return
+        for game in replies[0]["items"]:
+            if game["game_id"] == game_id:
+                games_table.update_row(game)
+    submit([one_record("list_games", game_id)], refreshed)
 
 # --- GUI actions ---
 def show_dashboard():
-    response = send_request({"action": "list_dashboard"})
-    if response:
-        dashboard_text.delete("1.0", tk.END)
-        dashboard_text.insert(tk.END, "=== USERS ===\n")
-        for user in response.get("users", []):
-            dashboard_text.insert(tk.END, f"ID: {user['user_id']}, Name: {user['name']}\n")
-
-        dashboard_text.insert(tk.END, "\n=== GAMES ===\n")
-        for game in response.get("games", []):
-            dashboard_text.insert(tk.END, f"ID: {game['game_id']}, Title: {game['title']}, "
-                                         f"Stock: {game['stock']}, Available: {game['available']}\n")
-
-        dashboard_text.insert(tk.END, "\n=== RENTALS ===\n")
-        for rental in response.get("rentals", []):
-            dashboard_text.insert(tk.END, f"Rental ID: {rental['rental_id']}, User ID: {rental['user_id']}, "
-                                         f"Game ID: {rental['game_id']}, Returned: {rental['returned']}, "
-                                         f"Late Fee: ${rental['late_fee']}, Due: {rental['due_date']}\n")
+    for table in tables:
+        table.reload()
 
 def create_rental():
     try:
         user_id = int(user_id_entry.get())
         game_id = int(game_id_entry.get())
-        response = send_request({"action": "create_rental", "user_id": user_id, "game_id": game_id})
-        if response:
-            messagebox.showinfo("Rental", response.get("message"))
-            show_dashboard()
     except ValueError:
         messagebox.showerror("Error", "User ID and Game ID must be numbers")
+        return
+
+    def created(replies):
+        response = replies[0]
+        if response.get("status") != "ok":
+            messagebox.showerror("Rental", response.get("message"))
+            return
+        messagebox.showinfo("Rental", response.get("message"))
+        refresh_rental(response["rental_id"], game_id)
+    submit([{"action": "create_rental", "user_id": user_id, "game_id": game_id}], created)
 
 def return_rental():
     try:
         rental_id = int(rental_id_entry.get())
-        response = send_request({"action": "return_rental", "rental_id": rental_id})
-        if response:
-            messagebox.showinfo("Return Rental", response.get("message"))
-            show_dashboard()
     except ValueError:
         messagebox.showerror("Error", "Rental ID must be a number")
+        return
+    # The game is known without a round trip when the rental's row is loaded
+    loaded = rentals_table.row(rental_id)
+    game_id = int(loaded["game_id"]) if loaded is not None else None
+
+    def returned(replies):
+        response = replies[0]
+        if response.get("status") != "ok":
+            messagebox.showerror("Return Rental", response.get("message"))
+            return
+        messagebox.showinfo("Return Rental", response.get("message"))
+        refresh_rental(rental_id, game_id)
+    submit([{"action": "return_rental", "rental_id": rental_id}], returned)
 
 # --- Main window ---
 root = tk.Tk()
 root.title("GameHub GUI Client")
-root.geometry("500x600")
+root.geometry("700x600")
 
 # --- Inputs ---
 tk.Label(root, text="User ID:").pack()
@@ -83,11 +254,24 @@ rental_id_entry.pack()
 # --- Buttons ---
 tk.Button(root, text="Create Rental", command=create_rental).pack(pady=5)
 tk.Button(root, text="Return Rental", command=return_rental).pack(pady=5)
-tk.Button(root, text="Show Dashboard", command=show_dashboard).pack(pady=5)
+tk.Button(root, text="Refresh Dashboard", command=show_dashboard).pack(pady=5)
 
 # --- Dashboard display ---
-dashboard_text = tk.Text(root, height=20, width=60)
-dashboard_text.pack(pady=10)
+notebook = ttk.Notebook(root)
+notebook.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
+rentals_table = LazyTable(notebook, "Rentals", "list_rentals", "rental_id",
+                          ("rental_id", "user_id", "game_id", "due_date", "returned", "late_fee"))
+games_table = LazyTable(notebook, "Games", "list_games", "game_id", ("game_id", "title", "stock", "available"))
+users_table = LazyTable(notebook, "Users", "list_users", "user_id", ("user_id", "name", "email"))
+tables = (rentals_table, games_table, users_table)
+
+status_var = tk.StringVar()
+tk.Label(root, textvariable=status_var, anchor="w").pack(fill=tk.X)
 
 # --- Start GUI ---
-root.mainloop()
+if login():
+    show_dashboard()
+    root.after(POLL_MS, drain_results)
+    root.mainloop()
+    jobs.put(None)
+client.close()
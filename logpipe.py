@@ -0,0 +1,224 @@
+import atexit
+import json
+import logging
+import os
+import queue
+import random
+import threading
+import time
+
+DEFAULT_LOG_FILE = "server_log.txt"
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+DEFAULT_ROTATE_SECONDS = 24 * 3600
+DEFAULT_BACKUPS = 5
+QUEUE_SIZE = 100000
+BATCH_SIZE = 2000
+
+# --- Redaction ---
+# Values under these keys never reach the log file. Long strings and lists
+# are cut down so one list_dashboard reply costs a line, not megabytes.
+REDACTED_FIELDS = frozenset({"password", "token", "session"})
+MAX_STRING = 256
+MAX_ITEMS = 20
+MAX_DEPTH = 4
+
+
+def scrub(value, depth=0):
+    if isinstance(value, dict):
+        if depth >= MAX_DEPTH:
+            return "{...}"
+        return {key: "[redacted]" if key in REDACTED_FIELDS else scrub(item, depth + 1)
+                for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        if len(value) > MAX_ITEMS:
+            return f"[{len(value)} items]"
+        if depth >= MAX_DEPTH:
+            return "[...]"
+        return [scrub(item, depth + 1) for item in value]
+    if isinstance(value, str):
+        if len(value) > MAX_STRING:
+            return f"{value[:MAX_STRING]}...({len(value)} chars)"
+        return value
+    if isinstance(value, (bytes, bytearray)):
+        # Pre-encoded replies (protocol.RawJSON)
+        return f"<{len(value)} bytes>"
+    if value is None or isinstance(value, (bool, int, float)):
+        return value
+    return f"<{type(value).__name__}>"
+
+
+# --- Formatting ---
+class JsonLinesFormatter(logging.Formatter):
+    # One JSON object per line. Structured fields travel on the record
+    # (extra={"fields": {...}}) and are scrubbed here, on the writer thread.
+    def format(self, record):
+        entry = {"ts": round(record.created, 6), "level": record.levelname,
+                 "logger": record.name, "msg": record.getMessage()}
+        fields = getattr(record, "fields", None)
+        if fields:
+            entry.update(scrub(fields))
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+# --- Output file ---
+class RotatingWriter:
+    # Appends to `path` and rolls it to path.1 .. path.<backups> once it
+    # exceeds max_bytes or has been open for rotate_seconds.
+    def __init__(self, path, max_bytes=DEFAULT_MAX_BYTES, rotate_seconds=DEFAULT_ROTATE_SECONDS,
+                 backups=DEFAULT_BACKUPS):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.rotate_seconds = rotate_seconds
+        self.backups = backups
+        self._open()
+
+    def _open(self):
+        self._file = open(self.path, "ab")
+        self._size = self._file.tell()
+        self._rotate_at = time.time() + self.rotate_seconds if self.rotate_seconds else None
+
+    def write(self, data):
+        if self._size and ((self.max_bytes and self._size + len(data) > self.max_bytes)
+                           or (self._rotate_at is not None and time.time() >= self._rotate_at)):
+            self.rotate()
+        self._file.write(data)
+        self._file.flush()
+        self._size += len(data)
+
+    def rotate(self):
+        self._file.close()
+        if self.backups:
+            for index in range(self.backups - 1, 0, -1):
+                older = f"{self.path}.{index}"
+                if os.path.exists(older):
+                    os.replace(older, f"{self.path}.{index + 1}")
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            os.remove(self.path)
+        self._open()
+
+    def close(self):
+        self._file.close()
+
+
+# --- Queue-backed handler ---
+_STOP = object()
+
+
+class QueueLogHandler(logging.Handler):
+    # emit() only enqueues the record, so request threads and the event loop
+    # never format or touch the file. A writer thread drains whatever has
+    # accumulated, formats it and writes it with one call. When the queue is
+    # full records are dropped and counted rather than blocking the caller.
+    def __init__(self, writer, queue_size=QUEUE_SIZE, batch_size=BATCH_SIZE):
+        super().__init__()
+        self.writer = writer
+        self.batch_size = batch_size
+        self.dropped = 0
+        self._queue = queue.Queue(queue_size)
+        self._thread = threading.Thread(target=self._run, name="log-writer", daemon=True)
+        self._thread.start()
+
+    def handle(self, record):
+        # The queue is thread-safe; skip the per-handler lock
+        if self.filter(record):
+            self.emit(record)
+        return record
+
+    def emit(self, record):
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            stop = False
+            lines = []
+            for record in batch:
+                if record is _STOP:
+                    stop = True
+                    continue
+                try:
+                    lines.append(self.format(record))
+                except Exception:
+                    self.handleError(record)
+            if self.dropped:
+                dropped, self.dropped = self.dropped, 0
+                lines.append(json.dumps({"ts": round(time.time(), 6), "level": "WARNING",
+                                         "logger": "logpipe", "msg": f"Dropped {dropped} log records"}))
+            if lines:
+                self.writer.write(("\n".join(lines) + "\n").encode())
+            if stop:
+                return
+
+    def close(self):
+        if self._thread.is_alive():
+            self._queue.put(_STOP)
+            self._thread.join()
+            self.writer.close()
+        super().close()
+
+
+# --- Request log ---
+class Sampler:
+    # Per-action sampling rates between 0 and 1; unlisted actions use default
+    def __init__(self, rates=None, default=1.0):
+        self.rates = dict(rates or {})
+        self.default = default
+
+    def keep(self, action):
+        rate = self.rates.get(action, self.default)
+        return rate >= 1.0 or (rate > 0 and random.random() < rate)
+
+
+def parse_sample_rates(specs):
+    # ["list_dashboard=0.01", "stats=0"] -> {"list_dashboard": 0.01, "stats": 0.0}
+    rates = {}
+    for spec in specs or ():
+        action, _, rate = spec.partition("=")
+        rates[action] = float(rate)
+    return rates
+
+
+request_log = logging.getLogger("gamehub.requests")
+sampler = Sampler()
+
+
+def log_exchange(action, request, response, elapsed):
+    # Cheap when skipped; otherwise builds one record whose fields are only
+    # scrubbed and encoded on the writer thread. The reply is copied because
+    # connection handlers pop keys (subscriber) from it afterwards.
+    if not request_log.isEnabledFor(logging.INFO) or not sampler.keep(action):
+        return
+    if type(response) is dict:
+        response = dict(response)
+    request_log.info(action or "request", extra={"fields": {
+        "action": action, "ms": round(elapsed * 1000, 3), "request": request, "response": response}})
+
+
+# --- Setup ---
+def setup(path=DEFAULT_LOG_FILE, level=logging.INFO, max_bytes=DEFAULT_MAX_BYTES,
+          rotate_seconds=DEFAULT_ROTATE_SECONDS, backups=DEFAULT_BACKUPS, sample_rates=None):
+    # path=None turns logging off entirely
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+    sampler.rates = dict(sample_rates or {})
+    if path is None:
+        root.setLevel(logging.CRITICAL + 1)
+        return None
+    handler = QueueLogHandler(RotatingWriter(path, max_bytes, rotate_seconds, backups))
+    handler.setFormatter(JsonLinesFormatter())
+    root.addHandler(handler)
+    root.setLevel(level)
+    atexit.register(handler.close)
+    return handler
@@ -0,0 +1,263 @@
+import bisect
+import cProfile
+import logging
+import pstats
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Latency bucket upper bounds in seconds: 25 us to about 26 s, each a factor
+# of sqrt(2) apart, so a percentile read from the buckets is within ~20%
+LATENCY_BUCKETS = tuple(25e-6 * 2 ** (i / 2) for i in range(41))
+# Distinct action labels tracked; anything past this is counted as "other",
+# so clients sending made-up actions cannot grow the registry
+MAX_ACTIONS = 64
+PROFILE_TOP = 25
+
+
+def _label(value):
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+# --- Instruments ---
+class Histogram:
+    # Fixed buckets: recording is a bisect and an increment, memory does not
+    # grow with traffic, and the buckets map directly onto Prometheus'.
+    __slots__ = ("counts", "count", "sum", "max")
+
+    def __init__(self):
+        self.counts = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(LATENCY_BUCKETS, value)] += 1
+        self.count += 1
+        self.sum += value
+        if value > self.max:
+            self.max = value
+
+    def percentile(self, fraction):
+        # Interpolated within the bucket holding the rank; the overflow
+        # bucket reports the largest value seen
+        if not self.count:
+            return 0.0
+        rank = fraction * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            if seen + n >= rank and n:
+                if i == len(LATENCY_BUCKETS):
+                    return self.max
+                low = LATENCY_BUCKETS[i - 1] if i else 0.0
+                return min(low + (LATENCY_BUCKETS[i] - low) * (rank - seen) / n, self.max)
+            seen += n
+        return self.max
+
+
+class ActionStats:
+    __slots__ = ("requests", "errors", "latency")
+
+    def __init__(self):
+        self.requests = 0
+        self.errors = 0
+        self.latency = Histogram()
+
+
+class Metrics:
+    # Process-wide counters, updated once per request under one short lock.
+    # Lock waits and the response cache keep their own counters and are
+    # read when a snapshot is taken.
+    def __init__(self):
+        self.started = time.time()
+        self.actions = {}
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.connections_active = 0
+        self.connections_total = 0
+        self._lock = threading.Lock()
+
+    def record(self, action, elapsed, error, size):
+        with self._lock:
+            if not isinstance(action, str):
+                action = "other"
+            stats = self.actions.get(action)
+            if stats is None:
+                if len(self.actions) >= MAX_ACTIONS:
+                    action = "other"
+                stats = self.actions.setdefault(action, ActionStats())
+            stats.requests += 1
+            if error:
+                stats.errors += 1
+            # Histogram.observe() inlined; this runs on every request
+            latency = stats.latency
+            latency.counts[bisect.bisect_left(LATENCY_BUCKETS, elapsed)] += 1
+            latency.count += 1
+            latency.sum += elapsed
+            if elapsed > latency.max:
+                latency.max = elapsed
+            self.bytes_in += size
+
+    def sent(self, size):
+        with self._lock:
+            self.bytes_out += size
+
+    def connection_opened(self):
+        with self._lock:
+            self.connections_active += 1
+            self.connections_total += 1
+
+    def connection_closed(self):
+        with self._lock:
+            self.connections_active -= 1
+
+    def snapshot(self, lock_waits=None):
+        with self._lock:
+            actions = {
+                action: {"requests": s.requests, "errors": s.errors,
+                         "mean_ms": round(s.latency.sum / s.requests * 1000, 3),
+                         "p50_ms": round(s.latency.percentile(0.50) * 1000, 3),
+                         "p95_ms": round(s.latency.percentile(0.95) * 1000, 3),
+                         "p99_ms": round(s.latency.percentile(0.99) * 1000, 3),
+                         "max_ms": round(s.latency.max * 1000, 3)}
+                for action, s in sorted(self.actions.items())}
+            snapshot = {"uptime_seconds": round(time.time() - self.started, 3),
+                        "connections": {"active": self.connections_active, "total": self.connections_total},
+                        "bytes": {"in": self.bytes_in, "out": self.bytes_out},
+                        "actions": actions}
+        snapshot["locks"] = {name: {"contended": w["contended"], "wait_ms": round(w["wait_seconds"] * 1000, 3)}
+                             for name, w in (lock_waits or {}).items()}
+        return snapshot
+
+    def prometheus(self, lock_waits=None, cache=None, labels="", admission=None):
+        # Text exposition format; `labels` (e.g. 'shard="1"') is added to
+        # every sample
+        extra = "," + labels if labels else ""
+        plain = "{" + labels + "}" if labels else ""
+        lines = []
+
+        def family(name, kind, help_text):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+
+        with self._lock:
+            actions = [(_label(action), s.requests, s.errors, list(s.latency.counts), s.latency.sum)
+                       for action, s in sorted(self.actions.items())]
+            bytes_in, bytes_out = self.bytes_in, self.bytes_out
+            active, total = self.connections_active, self.connections_total
+
+        family("gamehub_requests_total", "counter", "Requests processed, by action")
+        for action, requests, _, _, _ in actions:
+            lines.append(f'gamehub_requests_total{{action="{action}"{extra}}} {requests}')
+        family("gamehub_request_errors_total", "counter", "Requests answered with an error, by action")
+        for action, _, errors, _, _ in actions:
+            lines.append(f'gamehub_request_errors_total{{action="{action}"{extra}}} {errors}')
+        family("gamehub_request_duration_seconds", "histogram", "Time to process a request, by action")
+        for action, requests, _, counts, seconds in actions:
+            cumulative = 0
+            for bound, n in zip(LATENCY_BUCKETS, counts):
+                cumulative += n
+                lines.append(f'gamehub_request_duration_seconds_bucket{{action="{action}",le="{bound:.6g}"{extra}}} '
+                             f'{cumulative}')
+            lines.append(f'gamehub_request_duration_seconds_bucket{{action="{action}",le="+Inf"{extra}}} {requests}')
+            lines.append(f'gamehub_request_duration_seconds_sum{{action="{action}"{extra}}} {seconds:.6f}')
+            lines.append(f'gamehub_request_duration_seconds_count{{action="{action}"{extra}}} {requests}')
+        family("gamehub_received_bytes_total", "counter", "Request bytes received")
+        lines.append(f"gamehub_received_bytes_total{plain} {bytes_in}")
+        family("gamehub_sent_bytes_total", "counter", "Reply and stream bytes sent")
+        lines.append(f"gamehub_sent_bytes_total{plain} {bytes_out}")
+        family("gamehub_connections_active", "gauge", "Open client connections")
+        lines.append(f"gamehub_connections_active{plain} {active}")
+        family("gamehub_connections_total", "counter", "Client connections accepted")
+        lines.append(f"gamehub_connections_total{plain} {total}")
+        waits = lock_waits or {}
+        family("gamehub_lock_contended_total", "counter", "Lock acquisitions that had to wait, by lock")
+        for name, w in waits.items():
+            lines.append(f'gamehub_lock_contended_total{{lock="{name}"{extra}}} {w["contended"]}')
+        family("gamehub_lock_wait_seconds_total", "counter", "Time spent waiting for locks, by lock")
+        for name, w in waits.items():
+            lines.append(f'gamehub_lock_wait_seconds_total{{lock="{name}"{extra}}} {w["wait_seconds"]:.6f}')
+        if cache is not None:
+            family("gamehub_response_cache_hits_total", "counter", "Read-only replies served from the cache")
+            lines.append(f"gamehub_response_cache_hits_total{plain} {cache['hits']}")
+            family("gamehub_response_cache_misses_total", "counter", "Read-only replies encoded afresh")
+            lines.append(f"gamehub_response_cache_misses_total{plain} {cache['misses']}")
+        if admission is not None:
+            family("gamehub_throttled_total", "counter", "Requests refused by a rate limit")
+            lines.append(f"gamehub_throttled_total{plain} {admission['throttled']}")
+            family("gamehub_shed_total", "counter", "Requests refused by the admission queue")
+            lines.append(f"gamehub_shed_total{plain} {admission['shed']}")
+            family("gamehub_admission_waiting", "gauge", "Requests waiting for an admission slot")
+            lines.append(f"gamehub_admission_waiting{plain} {admission['waiting']}")
+        return "\n".join(lines) + "\n"
+
+
+# --- Profiling ---
+class Profiler:
+    # Runs a sampled fraction of requests under cProfile and merges their
+    # stats. An unsampled request costs one random() call; a sampled one
+    # pays cProfile's overhead plus a merge of the functions it touched.
+    def __init__(self, rate=0.0):
+        self.rate = rate
+        self.samples = 0
+        self._stats = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        if not self.rate or random.random() >= self.rate:
+            return None
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            # This thread is already being profiled
+            return None
+        return profile
+
+    def stop(self, profile):
+        profile.disable()
+        profile.create_stats()
+        if not profile.stats:
+            return
+        with self._lock:
+            self.samples += 1
+            if self._stats is None:
+                self._stats = pstats.Stats(profile)
+            else:
+                self._stats.add(profile)
+
+    def top(self, limit=PROFILE_TOP):
+        # Functions by cumulative time over every sampled request
+        with self._lock:
+            rows = list(self._stats.stats.items()) if self._stats is not None else []
+            samples = self.samples
+        rows.sort(key=lambda row: row[1][3], reverse=True)
+        return {"rate": self.rate, "samples": samples, "functions": [
+            {"function": f"{file}:{line}({name})", "calls": calls, "own_ms": round(own * 1000, 3),
+             "cumulative_ms": round(cumulative * 1000, 3)}
+            for (file, line, name), (_, calls, own, cumulative, _) in rows[:limit]]}
+
+
+# --- Prometheus endpoint ---
+def serve_prometheus(host, port, render):
+    # GET /metrics on a background thread; render() returns the text
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = render().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            logging.debug(f"Metrics scrape from {self.client_address[0]}: {format % args}")
+
+    httpd = ThreadingHTTPServer((host, port), Handler)
+    httpd.daemon_threads = True
+    threading.Thread(target=httpd.serve_forever, name="metrics-http", daemon=True).start()
+    return httpd
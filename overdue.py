@@ -0,0 +1,143 @@
+import heapq
+import logging
+import threading
+
+from aggregates import late_fee, ordinal_date, today_ordinal
+from feed import RENTALS_OVERDUE
+
+DEFAULT_INTERVAL = 60.0
+EVENT_BATCH = 1000
+
+
+class OverdueIndex:
+    # Open rentals bucketed by due day, with a heap of the bucket days. When
+    # the calendar passes a day its whole bucket moves into `overdue`, so
+    # advancing costs O(rentals that just became overdue), however many
+    # rentals are open. `_order` keeps the overdue ids sorted for cursor
+    # pages and is compacted lazily, like Store._open_order.
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._buckets = {}
+        self._heap = []
+        self.overdue = {}
+        self._order = []
+        # Became overdue but not yet handed to take_newly(); only kept once
+        # a scheduler has asked for them (track_newly), or nothing would
+        # ever empty it
+        self._newly = []
+        self.track_newly = False
+        # Rentals already overdue when the index is built were reported by
+        # an earlier run; they go straight to `overdue`
+        self.today = today_ordinal()
+
+    def add(self, rental):
+        with self._lock:
+            if rental.due_day < self.today:
+                self._add_overdue([rental])
+            elif rental.due_day in self._buckets:
+                self._buckets[rental.due_day][rental.rental_id] = rental
+            else:
+                self._buckets[rental.due_day] = {rental.rental_id: rental}
+                heapq.heappush(self._heap, rental.due_day)
+
+    def remove(self, rental):
+        with self._lock:
+            if self.overdue.pop(rental.rental_id, None) is None:
+                bucket = self._buckets.get(rental.due_day)
+                if bucket is not None:
+                    bucket.pop(rental.rental_id, None)
+            elif len(self._order) > 2 * len(self.overdue) + 1024:
+                self._order = sorted(self.overdue)
+
+    def advance(self, today=None):
+        # Moves the rentals whose due day has passed into `overdue`. Queries
+        # call this too, so the rentals are also queued for take_newly()
+        # rather than returned, or the scheduler would never see them.
+        today = today or today_ordinal()
+        newly = []
+        with self._lock:
+            heap = self._heap
+            while heap and heap[0] < today:
+                newly.extend(self._buckets.pop(heapq.heappop(heap)).values())
+            self.today = max(self.today, today)
+            if newly:
+                self._add_overdue(newly)
+                if self.track_newly:
+                    self._newly.extend(newly)
+
+    def take_newly(self):
+        # The rentals that became overdue since the last call, less those
+        # returned meanwhile
+        with self._lock:
+            newly, self._newly = self._newly, []
+            overdue = self.overdue
+            return [rental for rental in newly if rental.rental_id in overdue]
+
+    def _add_overdue(self, rentals):
+        # Caller holds the lock. Rental ids mostly grow with due days, so
+        # new ids usually just extend the order; otherwise merge once.
+        ids = sorted(r.rental_id for r in rentals)
+        for rental in rentals:
+            self.overdue[rental.rental_id] = rental
+        if not self._order or ids[0] > self._order[-1]:
+            self._order.extend(ids)
+        else:
+            self._order = list(heapq.merge(self._order, ids))
+
+    def ids(self):
+        # Sorted overdue ids; may include ids that are no longer overdue,
+        # so callers check membership in `overdue`
+        return self._order
+
+    def __len__(self):
+        return len(self.overdue)
+
+
+def accrued(rental, today):
+    return late_fee(rental.due_day, today)
+
+
+class OverdueScheduler:
+    # Background thread that advances the store's overdue index every
+    # `interval` seconds. Each pass only touches rentals whose due day just
+    # passed: their fees so far are computed in one batch and published as
+    # rentals_overdue change events, EVENT_BATCH rentals per event.
+    def __init__(self, store, interval=DEFAULT_INTERVAL):
+        self.store = store
+        self.interval = interval
+        store.track_overdue()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="overdue-scheduler", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self):
+        while True:
+            try:
+                self.run_once()
+            except Exception as e:
+                logging.error(f"Overdue scan failed: {e}")
+            if self._stop.wait(self.interval):
+                return
+
+    def run_once(self, today=None):
+        today = today or today_ordinal()
+        newly = self.store.advance_overdue(today)
+        if not newly:
+            return 0
+        as_of = ordinal_date(today)
+        for start in range(0, len(newly), EVENT_BATCH):
+            self.store.feed.publish(RENTALS_OVERDUE, {"as_of": as_of, "rentals": [
+                {"rental_id": r.rental_id, "user_id": r.user_id, "game_id": r.game_id,
+                 "due_date": r.due_date, "late_fee": accrued(r, today)}
+                for r in newly[start:start + EVENT_BATCH]]})
+        logging.info(f"{len(newly)} rentals became overdue")
+        return len(newly)
@@ -0,0 +1,257 @@
+import glob
+import json
+import logging
+import os
+import threading
+import time
+import zlib
+
+SYNC = "sync"
+RELAXED = "relaxed"
+DURABILITY_MODES = (SYNC, RELAXED)
+
+DEFAULT_SNAPSHOT_EVERY = 1000000
+RELAXED_FLUSH_INTERVAL = 0.05
+
+# Skips json.loads' per-call encoding detection, which dominates replay of
+# millions of short records
+_decode_json = json.JSONDecoder().decode
+
+
+class JournalCorrupt(Exception):
+    pass
+
+
+# --- File layout ---
+# <dir>/wal-<first lsn>.log       one "<crc32 hex> [lsn, op, ...]" line per record
+# <dir>/snapshot-<lsn>.jsonl      header line, then one record per line
+def _segment_path(directory, first_lsn):
+    return os.path.join(directory, f"wal-{first_lsn:020d}.log")
+
+def _snapshot_path(directory, lsn):
+    return os.path.join(directory, f"snapshot-{lsn:020d}.jsonl")
+
+def _lsn_from_path(path):
+    return int(os.path.basename(path).split("-")[1].split(".")[0])
+
+def _fsync_dir(directory):
+    fd = os.open(directory, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+def encode_record(lsn, record):
+    body = json.dumps([lsn, *record], separators=(",", ":")).encode()
+    return b"%08x %s\n" % (zlib.crc32(body), body)
+
+def decode_line(line):
+    # Returns the [lsn, op, ...] list, or None for a torn/corrupt line
+    if not line.endswith(b"\n") or len(line) < 10:
+        return None
+    body = line[9:-1]
+    try:
+        if int(line[:8], 16) != zlib.crc32(body):
+            return None
+        return _decode_json(body.decode())
+    except ValueError:
+        return None
+
+
+def write_snapshot(directory, lsn, records):
+    # Writes snapshot-<lsn>.jsonl atomically (temp file, fsync, rename);
+    # returns the number of records. Also used to build benchmark fixtures.
+    path = _snapshot_path(directory, lsn)
+    tmp = path + ".tmp"
+    count = 0
+    with open(tmp, "wb") as f:
+        f.write(json.dumps({"lsn": lsn}).encode() + b"\n")
+        for record in records:
+            f.write(json.dumps(record, separators=(",", ":")).encode() + b"\n")
+            count += 1
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+    _fsync_dir(directory)
+    return count
+
+
+# --- Recovery ---
+def recover(store, directory):
+    # Load the newest snapshot, then replay every journal record after it.
+    # A torn line is only tolerated at the very end of the last segment,
+    # where a crash mid-write can leave one.
+    lsn = 0
+    snapshots = sorted(glob.glob(os.path.join(directory, "snapshot-*.jsonl")))
+    if snapshots:
+        with open(snapshots[-1], "rb") as f:
+            header = json.loads(f.readline())
+            lsn = header["lsn"]
+            for line in f:
+                store.apply_record(_decode_json(line.decode()))
+    snapshot_lsn = lsn
+
+    segments = sorted(glob.glob(os.path.join(directory, "wal-*.log")))
+    replayed = 0
+    for index, path in enumerate(segments):
+        with open(path, "rb") as f:
+            for line in f:
+                entry = decode_line(line)
+                if entry is None:
+                    if index != len(segments) - 1 or f.read(1):
+                        raise JournalCorrupt(f"Corrupt record in {path}")
+                    logging.warning(f"Ignoring torn record at end of {path}")
+                    break
+                if entry[0] <= lsn:
+                    continue
+                store.apply_record(entry[1:])
+                lsn = entry[0]
+                replayed += 1
+    store.rebuild_aggregates()
+    logging.info(f"Recovered snapshot at lsn {snapshot_lsn} and {replayed} journal records")
+    return lsn
+
+
+# --- Journal ---
+class Journal:
+    # Append-only write-ahead log with group commit. append() only queues an
+    # encoded line; a flusher thread writes and fsyncs whatever accumulated
+    # while the previous fsync was running, so one fsync covers many
+    # mutations. In "sync" mode request handlers wait for their records to
+    # become durable before replying; in "relaxed" mode they do not and the
+    # flusher runs every RELAXED_FLUSH_INTERVAL.
+    def __init__(self, store, directory, durability=SYNC, snapshot_every=DEFAULT_SNAPSHOT_EVERY):
+        if durability not in DURABILITY_MODES:
+            raise ValueError(f"durability must be one of {DURABILITY_MODES}")
+        self.store = store
+        self.directory = directory
+        self.durability = durability
+        self.snapshot_every = snapshot_every
+        self.lsn = 0
+        self.durable_lsn = 0
+        self._buffer = []
+        self._lock = threading.Lock()
+        self._io_lock = threading.Lock()
+        self._work = threading.Condition(self._lock)
+        self._durable = threading.Condition(self._lock)
+        self._file = None
+        self._closing = False
+        self._since_snapshot = 0
+        self._snapshotting = False
+        self._flusher = None
+        self._local = threading.local()
+
+    # --- Lifecycle ---
+    def open(self):
+        os.makedirs(self.directory, exist_ok=True)
+        self.lsn = self.durable_lsn = recover(self.store, self.directory)
+        self._file = open(_segment_path(self.directory, self.lsn + 1), "wb")
+        _fsync_dir(self.directory)
+        self.store.journal = self
+        self._flusher = threading.Thread(target=self._run, name="journal-flusher", daemon=True)
+        self._flusher.start()
+        return self
+
+    def close(self):
+        with self._lock:
+            self._closing = True
+            self._work.notify()
+        if self._flusher is not None:
+            self._flusher.join()
+        self.store.journal = None
+        if self._file is not None:
+            self._file.close()
+
+    # --- Writes ---
+    def append(self, record):
+        with self._lock:
+            self.lsn += 1
+            self._buffer.append(encode_record(self.lsn, record))
+            if len(self._buffer) == 1:
+                self._work.notify()
+            self._local.lsn = self.lsn
+            return self.lsn
+
+    def thread_lsn(self):
+        # Last lsn appended by the calling thread
+        return getattr(self._local, "lsn", 0)
+
+    def wait_durable(self, lsn=None):
+        # Blocks until the caller's records (or everything up to lsn) are
+        # on disk. Only sync mode waits.
+        if self.durability != SYNC:
+            return
+        target = self.thread_lsn() if lsn is None else lsn
+        with self._lock:
+            while self.durable_lsn < target:
+                self._durable.wait()
+
+    def _take_buffer(self):
+        # Caller holds _lock
+        batch, self._buffer = self._buffer, []
+        return batch, self.lsn
+
+    def _write(self, batch):
+        self._file.write(b"".join(batch))
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def _run(self):
+        while True:
+            with self._lock:
+                while not self._buffer and not self._closing:
+                    self._work.wait()
+                if self._closing and not self._buffer:
+                    return
+            if self.durability == RELAXED and not self._closing:
+                time.sleep(RELAXED_FLUSH_INTERVAL)
+            with self._io_lock:
+                with self._lock:
+                    batch, upto = self._take_buffer()
+                if batch:
+                    self._write(batch)
+                with self._lock:
+                    self.durable_lsn = upto
+                    self._durable.notify_all()
+            self._since_snapshot += len(batch)
+            if self._since_snapshot >= self.snapshot_every and not self._snapshotting:
+                self._since_snapshot = 0
+                self._snapshotting = True
+                threading.Thread(target=self.snapshot, name="journal-snapshot", daemon=True).start()
+
+    # --- Snapshots ---
+    def _rotate(self):
+        # Flush everything up to the current lsn into the old segment and
+        # start a new one, so the old segments hold exactly the records a
+        # snapshot taken from this point makes redundant.
+        with self._io_lock:
+            with self._lock:
+                batch, upto = self._take_buffer()
+            if batch:
+                self._write(batch)
+            self._file.close()
+            self._file = open(_segment_path(self.directory, upto + 1), "wb")
+            _fsync_dir(self.directory)
+            with self._lock:
+                self.durable_lsn = upto
+                self._durable.notify_all()
+        return upto
+
+    def snapshot(self):
+        # Fuzzy snapshot: the store keeps serving writes while it is copied.
+        # Anything that changes after the rotation point is in the new
+        # segment, and replaying it over the snapshot is idempotent.
+        try:
+            started = time.perf_counter()
+            lsn = self._rotate()
+            count = write_snapshot(self.directory, lsn, self.store.snapshot_records())
+            for old in glob.glob(os.path.join(self.directory, "snapshot-*.jsonl")):
+                if _lsn_from_path(old) < lsn:
+                    os.remove(old)
+            for old in glob.glob(os.path.join(self.directory, "wal-*.log")):
+                if _lsn_from_path(old) <= lsn:
+                    os.remove(old)
+            logging.info(f"Snapshot at lsn {lsn}: {count} records in {time.perf_counter() - started:.2f}s")
+            return lsn
+        finally:
+            self._snapshotting = False
@@ -0,0 +1,184 @@
+import struct
+from collections import deque
+
+from serializer import RawJSON, dumps, loads
+
+# --- Wire format ---
+# Framed messages are a 4-byte big-endian body length followed by the UTF-8
+# JSON body. Legacy (unframed) clients send bare JSON objects back to back;
+# the first byte of a connection tells the two apart, because a framed
+# header starts with 0x00 for any body under 16 MB while JSON starts with "{".
+HEADER = struct.Struct("!I")
+MAX_FRAME_SIZE = 64 * 1024 * 1024
+RECV_SIZE = 65536
+
+MODE_FRAMED = "framed"
+MODE_LEGACY = "legacy"
+
+_WHITESPACE = b" \t\r\n"
+_OPEN_BRACE = ord("{")
+_CLOSE_BRACE = ord("}")
+_QUOTE = ord('"')
+_BACKSLASH = ord("\\")
+
+
+class ProtocolError(Exception):
+    pass
+
+
+# --- Encoding ---
+# Bodies are encoded by serializer.py; RawJSON bodies are already encoded.
+def encode_frame(body):
+    if len(body) > MAX_FRAME_SIZE:
+        raise ProtocolError(f"Frame of {len(body)} bytes exceeds limit")
+    return HEADER.pack(len(body)) + body
+
+
+def encode_message(message, mode=MODE_FRAMED):
+    body = message if isinstance(message, RawJSON) else dumps(message)
+    if mode == MODE_LEGACY:
+        return body
+    return encode_frame(body)
+
+
+def decode_payload(payload):
+    return loads(payload)
+
+
+# --- Incremental decoder ---
+class FrameDecoder:
+    # Splits a byte stream into JSON payloads. The receive buffer is a single
+    # bytearray that is trimmed in place once complete payloads are consumed,
+    # so a pipelined burst of requests costs one buffer, not one per message.
+    def __init__(self, mode=None, max_frame_size=MAX_FRAME_SIZE):
+        self.mode = mode
+        self.max_frame_size = max_frame_size
+        self.buffer = bytearray()
+        self.pending = deque()
+        # Legacy scanner state, kept across feeds so each byte is visited once
+        self._scan_pos = 0
+        self._depth = 0
+        self._in_string = False
+        self._escaped = False
+
+    def feed(self, data):
+        self.buffer += data
+        if self.mode is None:
+            self._detect_mode()
+            if self.mode is None:
+                return 0
+        if self.mode == MODE_FRAMED:
+            found = self._split_framed()
+        else:
+            found = self._split_legacy()
+        self.pending.extend(found)
+        return len(found)
+
+    def next_payload(self):
+        if self.pending:
+            return self.pending.popleft()
+        return None
+
+    def _detect_mode(self):
+        stripped = self.buffer.lstrip(_WHITESPACE)
+        if not stripped:
+            return
+        self.mode = MODE_LEGACY if stripped[0] == _OPEN_BRACE else MODE_FRAMED
+
+    def _split_framed(self):
+        found = []
+        buf = self.buffer
+        offset = 0
+        while len(buf) - offset >= HEADER.size:
+            (length,) = HEADER.unpack_from(buf, offset)
+            if length > self.max_frame_size:
+                raise ProtocolError(f"Frame of {length} bytes exceeds limit")
+            end = offset + HEADER.size + length
+            if len(buf) < end:
+                break
+            found.append(bytes(buf[offset + HEADER.size:end]))
+            offset = end
+        if offset:
+            del buf[:offset]
+        return found
+
+    def _split_legacy(self):
+        # Bare JSON objects have no length, so track brace depth outside of
+        # string literals. UTF-8 continuation bytes never collide with the
+        # ASCII delimiters, so scanning raw bytes is safe.
+        found = []
+        buf = self.buffer
+        start = 0
+        i = self._scan_pos
+        depth = self._depth
+        in_string = self._in_string
+        escaped = self._escaped
+        length = len(buf)
+        while i < length:
+            byte = buf[i]
+            if in_string:
+                if escaped:
+                    escaped = False
+                elif byte == _BACKSLASH:
+                    escaped = True
+                elif byte == _QUOTE:
+                    in_string = False
+            elif byte == _QUOTE:
+                in_string = True
+            elif byte == _OPEN_BRACE:
+                depth += 1
+            elif byte == _CLOSE_BRACE:
+                depth -= 1
+                if depth == 0:
+                    found.append(bytes(buf[start:i + 1]).strip(_WHITESPACE))
+                    start = i + 1
+            elif depth == 0 and byte not in _WHITESPACE:
+                raise ProtocolError("Expected a JSON object")
+            i += 1
+        if start:
+            del buf[:start]
+        if len(buf) > self.max_frame_size:
+            raise ProtocolError("Unterminated message exceeds limit")
+        self._scan_pos = i - start
+        self._depth = depth
+        self._in_string = in_string
+        self._escaped = escaped
+        return found
+
+
+# --- Socket helpers ---
+class MessageReader:
+    def __init__(self, sock, mode=None, recv_size=RECV_SIZE):
+        self.sock = sock
+        self.recv_size = recv_size
+        self.decoder = FrameDecoder(mode)
+
+    @property
+    def mode(self):
+        return self.decoder.mode
+
+    def has_pending(self):
+        return bool(self.decoder.pending)
+
+    def read_payload(self):
+        while not self.decoder.pending:
+            data = self.sock.recv(self.recv_size)
+            if not data:
+                return None
+            self.decoder.feed(data)
+        return self.decoder.next_payload()
+
+    def read_message(self):
+        payload = self.read_payload()
+        if payload is None:
+            return None
+        return decode_payload(payload)
+
+
+def send_message(sock, message, mode=MODE_FRAMED):
+    sock.sendall(encode_message(message, mode))
+
+
+def send_messages(sock, messages, mode=MODE_FRAMED):
+    # Pipelining: one write for a whole batch of requests
+    sock.sendall(b"".join(encode_message(m, mode) for m in messages))
@@ -0,0 +1,129 @@
+from itertools import islice
+
+from aggregates import late_fee, ordinal_date, today_ordinal
+from search import DEFAULT_LIMIT as SEARCH_LIMIT, MATCH_NAMES, MAX_LIMIT as MAX_SEARCH_LIMIT
+from store import GAME_FIELDS, RENTAL_FIELDS, USER_FIELDS, StoreError
+
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 500
+RENTAL_STATUSES = ("all", "open", "returned", "overdue")
+SEARCH_KINDS = ("games", "users")
+
+
+# --- Request parsing ---
+def _limit(request, default=DEFAULT_LIMIT, maximum=MAX_LIMIT):
+    limit = request.get("limit", default)
+    if not isinstance(limit, int) or limit < 1:
+        raise StoreError("limit must be a positive integer")
+    return min(limit, maximum)
+
+def _cursor(request):
+    after = request.get("cursor")
+    if after is not None and not isinstance(after, int):
+        raise StoreError("cursor must be an integer")
+    return after
+
+def resume_position(request):
+    # (since, epoch) of subscribe and follow: where a stream picks up again
+    since, epoch = request.get("since"), request.get("epoch")
+    if since is not None and (not isinstance(since, int) or isinstance(since, bool) or since < 0):
+        raise StoreError("since must be a non-negative integer")
+    if epoch is not None and not isinstance(epoch, str):
+        raise StoreError("epoch must be a string")
+    return since, epoch
+
+def _match(request, records, attributes):
+    # Case-insensitive substring filter. Matching records are found by
+    # scanning, so the unfiltered total is not recounted: total is null.
+    text = request.get("match")
+    if text is None:
+        return records, False
+    if not isinstance(text, str):
+        raise StoreError("match must be a string")
+    text = text.casefold()
+    return (r for r in records if any(text in getattr(r, a).casefold() for a in attributes)), True
+
+def _fields(request, allowed):
+    fields = request.get("fields")
+    if fields is None:
+        return allowed
+    if not isinstance(fields, list):
+        raise StoreError("fields must be a list")
+    unknown = [f for f in fields if f not in allowed]
+    if unknown:
+        raise StoreError(f"Unknown fields {unknown}")
+    return tuple(fields)
+
+def _page(records, request, allowed, id_field, total, extra=None):
+    # Pull one record past the page to know whether another page exists;
+    # the generators behind records stop there, so cost tracks the limit.
+    limit = _limit(request)
+    fields = _fields(request, allowed)
+    rows = list(islice(records, limit + 1))
+    more = len(rows) > limit
+    rows = rows[:limit]
+    items = [{f: getattr(r, f) for f in fields} for r in rows]
+    if extra is not None:
+        for item, row in zip(items, rows):
+            item.update(extra(row))
+    next_cursor = getattr(rows[-1], id_field) if more else None
+    return {"status": "ok", "items": items, "next_cursor": next_cursor, "total": total}
+
+
+# --- Query actions ---
+def list_users(store, request):
+    records, filtered = _match(request, store.iter_users(_cursor(request)), ("name", "email"))
+    return _page(records, request, USER_FIELDS, "user_id", None if filtered else store.count_users())
+
+def list_games(store, request):
+    records, filtered = _match(request, store.iter_games(_cursor(request)), ("title",))
+    return _page(records, request, GAME_FIELDS, "game_id", None if filtered else store.count_games())
+
+def list_rentals(store, request):
+    status = request.get("status", "all")
+    if status not in RENTAL_STATUSES:
+        raise StoreError(f"status must be one of {list(RENTAL_STATUSES)}")
+    user_id = request.get("user_id")
+    game_id = request.get("game_id")
+    records = store.iter_rentals(_cursor(request), user_id, game_id, status)
+    return _page(records, request, RENTAL_FIELDS, "rental_id", store.count_rentals(status, user_id, game_id))
+
+def search_order(name_field, id_field):
+    # Sort key for search results: by how they matched, then by name. A
+    # sharded server merges the shards' results with the same key.
+    return lambda item: (MATCH_NAMES.index(item["match"]), item[name_field].casefold(), item[id_field])
+
+def _ranked(found, name_field, id_field):
+    items = [dict(record.to_dict(), match=MATCH_NAMES[match]) for record, match in found]
+    items.sort(key=search_order(name_field, id_field))
+    return items
+
+def search(store, request):
+    # Games by title and users by name or email, from the stores' word
+    # indexes (search.py); "kind" narrows it to one of them
+    text = request.get("query")
+    if not isinstance(text, str):
+        raise StoreError("query must be a string")
+    kind = request.get("kind")
+    if kind is not None and kind not in SEARCH_KINDS:
+        raise StoreError(f"kind must be one of {list(SEARCH_KINDS)}")
+    limit = _limit(request, SEARCH_LIMIT, MAX_SEARCH_LIMIT)
+    fuzzy = request.get("fuzzy") is True
+    response = {"status": "ok"}
+    if kind != "users":
+        response["games"] = _ranked(store.search_games(text, limit, fuzzy), "title", "game_id")
+    if kind != "games":
+        response["users"] = _ranked(store.search_users(text, limit, fuzzy), "name", "user_id")
+    return response
+
+def overdue(store, request):
+    # Open rentals past their due date, with the fee accrued so far computed
+    # per item from day ordinals
+    user_id = request.get("user_id")
+    game_id = request.get("game_id")
+    today = today_ordinal()
+    records = store.iter_rentals(_cursor(request), user_id, game_id, "overdue")
+    page = _page(records, request, RENTAL_FIELDS, "rental_id", store.count_rentals("overdue", user_id, game_id),
+                 lambda r: {"days_overdue": today - r.due_day, "accrued_late_fee": late_fee(r.due_day, today)})
+    page["as_of"] = ordinal_date(today)
+    return page
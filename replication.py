@@ -0,0 +1,251 @@
+import logging
+import random
+import threading
+import time
+
+from client import AuthError, Connection
+from feed import DEFAULT_HISTORY, ChangeFeed, ResumeExpired, overflow_notice
+from protocol import ProtocolError
+from queries import resume_position
+from store import Store, StoreError
+
+HEARTBEAT_INTERVAL = 1.0
+SNAPSHOT_BATCH = 1000
+RECORD_BATCH = 1000
+# Live records that may queue up for one follower before it is dropped.
+# Generous, because they pile up while the snapshot is being sent.
+FOLLOWER_MAX_PENDING = 1000000
+RECONNECT_INITIAL = 0.1
+RECONNECT_MAX = 5.0
+# A stream that lasted this long resets the reconnect delay
+RECONNECT_STABLE = 30.0
+
+# Refused by a replica; everything else is answered from its local copy
+WRITE_ACTIONS = frozenset({"add_user", "add_game", "create_rental", "reserve_games", "return_rental",
+                           "import_users", "import_games", "import_rentals"})
+
+
+class Entry:
+    __slots__ = ("seq", "record")
+
+    def __init__(self, seq, record):
+        self.seq = seq
+        self.record = record
+
+
+# --- Primary ---
+class ReplicationLog(ChangeFeed):
+    # The primary's mutation stream: every journal record, numbered, with
+    # the change feed's bounded history and per-follower queues. Records are
+    # kept as lists rather than encoded like change events, since they are
+    # sent in batches. Followers check the feed's epoch before resuming.
+    def append(self, record):
+        with self._lock:
+            self.seq += 1
+            entry = Entry(self.seq, record)
+            self._history.append(entry)
+            for subscriber in self._subscribers:
+                subscriber.push(entry)
+
+    def status(self):
+        return {"role": "primary", "epoch": self.epoch, "seq": self.seq,
+                "followers": self.subscriber_count()}
+
+
+class FollowStream:
+    # The messages for one follower: the snapshot if it needs one, then
+    # batches of live records, and a heartbeat with the primary's position
+    # whenever there is nothing to send. Iterating blocks; the async engine
+    # pulls messages from an executor thread.
+    def __init__(self, log, subscriber, snapshot=None):
+        self.log = log
+        self.subscriber = subscriber
+        self.closed = False
+        self._messages = self._generate(subscriber.last_seq, snapshot)
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self.closed:
+            raise StopIteration
+        return next(self._messages)
+
+    def close(self):
+        self.closed = True
+        self.log.unsubscribe(self.subscriber)
+
+    def _generate(self, start, snapshot):
+        if snapshot is not None:
+            batch = []
+            for record in snapshot:
+                batch.append(record)
+                if len(batch) >= SNAPSHOT_BATCH:
+                    yield {"type": "snapshot", "records": batch}
+                    batch = []
+            if batch:
+                yield {"type": "snapshot", "records": batch}
+            yield {"type": "snapshot_end", "seq": start}
+        subscriber = self.subscriber
+        while not self.closed:
+            subscriber.wait(HEARTBEAT_INTERVAL)
+            batch = subscriber.take(RECORD_BATCH)
+            if batch:
+                yield {"type": "records", "seq": batch[-1].seq, "head": self.log.seq,
+                       "records": [entry.record for entry in batch]}
+            elif subscriber.overflowed:
+                yield overflow_notice(subscriber)
+                return
+            else:
+                yield {"type": "heartbeat", "seq": self.log.seq}
+
+
+def follow(store, request):
+    # The "follow" action. A follower that passes the epoch and last seq it
+    # applied resumes from there while the log still holds them; otherwise
+    # it gets a snapshot first. The subscription starts before the snapshot
+    # is read, so records written meanwhile are queued and replayed after
+    # it; replaying a record the snapshot already covers changes nothing.
+    log = store.replication
+    if log is None:
+        if not store.supports_replication:
+            raise StoreError("Replication is not supported on this backend")
+        raise StoreError("This server keeps no replication log; start it with --replicas")
+    since, epoch = resume_position(request)
+    snapshot = None
+    try:
+        if since is None or epoch != log.epoch:
+            raise ResumeExpired("No position in this run")
+        subscriber = log.subscribe(since, FOLLOWER_MAX_PENDING)
+    except ResumeExpired:
+        subscriber = log.subscribe(None, FOLLOWER_MAX_PENDING)
+        snapshot = store.snapshot_records()
+    return {"status": "ok", "epoch": log.epoch, "seq": subscriber.last_seq, "snapshot": snapshot is not None,
+            "stream": FollowStream(log, subscriber, snapshot)}
+
+
+# --- Replica ---
+class Follower:
+    # Keeps a replica's store in step with its primary: follows the
+    # primary's replication log from the last applied position, applies
+    # records as they arrive and reconnects with backoff when the stream
+    # breaks. Lag is measured from the primary's position, which every
+    # record batch and heartbeat carries.
+    #
+    # A snapshot is loaded into a new Store while reads are still served
+    # from the old one; `swap(store)` is then called to switch over, so
+    # state the primary no longer has (after a restart) is dropped.
+    def __init__(self, store, host, port, username, password, swap=None):
+        self.store = store
+        self.swap = swap
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.epoch = None
+        self.applied_seq = 0
+        self.primary_seq = 0
+        self.connected = False
+        self._behind_since = None
+        self._last_contact = time.monotonic()
+        self._stop = threading.Event()
+
+    @property
+    def primary(self):
+        return f"{self.host}:{self.port}"
+
+    def start(self):
+        threading.Thread(target=self._run, name="replica-follower", daemon=True).start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def route(self, action):
+        # Same contract as Cluster.route: a reply, or None to answer locally
+        if action in WRITE_ACTIONS:
+            return {"status": "error", "message": "Read-only replica; send writes to the primary",
+                    "primary": self.primary}
+        return None
+
+    def status(self):
+        now = time.monotonic()
+        lag = 0.0 if self._behind_since is None else now - self._behind_since
+        if not self.connected:
+            lag = max(lag, now - self._last_contact)
+        return {"role": "replica", "primary": self.primary, "connected": self.connected,
+                "applied_seq": self.applied_seq, "primary_seq": self.primary_seq,
+                "lag_records": max(self.primary_seq - self.applied_seq, 0), "lag_seconds": round(lag, 3)}
+
+    def _run(self):
+        delay = RECONNECT_INITIAL
+        while not self._stop.is_set():
+            started = time.monotonic()
+            try:
+                self._follow()
+            except AuthError as e:
+                logging.error(f"Replica login to {self.primary} failed: {e}")
+            except (OSError, ProtocolError, ValueError, KeyError, StoreError) as e:
+                logging.warning(f"Replication from {self.primary} interrupted: {e}")
+            if self.connected:
+                self.connected = False
+                # A primary that accepts and then drops the stream straight
+                # away keeps the delay growing
+                if time.monotonic() - started >= RECONNECT_STABLE:
+                    delay = RECONNECT_INITIAL
+            # Jittered, so replicas cut off together do not reconnect together
+            self._stop.wait(delay * random.uniform(0.5, 1.0))
+            delay = min(delay * 2, RECONNECT_MAX)
+
+    def _follow(self):
+        conn = Connection(self.host, self.port, HEARTBEAT_INTERVAL * 10)
+        try:
+            conn.login(self.username, self.password)
+            reply = conn.request({"action": "follow", "epoch": self.epoch,
+                                  "since": self.applied_seq if self.epoch else None})
+            if reply.get("status") != "ok":
+                raise ConnectionError(reply.get("message"))
+            self.connected = True
+            loading = None
+            if reply["snapshot"]:
+                logging.info(f"Loading snapshot from {self.primary} at seq {reply['seq']}")
+                loading = Store()
+            else:
+                self.epoch = reply["epoch"]
+            self._seen(reply["seq"])
+            while not self._stop.is_set():
+                message = conn.receive()
+                kind = message.get("type")
+                if kind == "records":
+                    for record in message["records"]:
+                        self.store.replay(record)
+                    self.applied_seq = message["seq"]
+                    self._seen(message["head"])
+                elif kind == "heartbeat":
+                    self._seen(message["seq"])
+                elif kind == "snapshot":
+                    for record in message["records"]:
+                        loading.apply_record(record)
+                elif kind == "snapshot_end":
+                    # Only now is the position usable for resuming
+                    loading.rebuild_aggregates()
+                    self.store = loading
+                    if self.swap is not None:
+                        self.swap(loading)
+                    self.applied_seq = message["seq"]
+                    self.epoch = reply["epoch"]
+                    self._seen(message["seq"])
+                    logging.info(f"Snapshot loaded; following {self.primary}")
+                elif kind == "overflow":
+                    raise ConnectionError(message["message"])
+        finally:
+            conn.close()
+
+    def _seen(self, head):
+        now = time.monotonic()
+        self._last_contact = now
+        self.primary_seq = head
+        if self.applied_seq >= head:
+            self._behind_since = None
+        elif self._behind_since is None:
+            self._behind_since = now
@@ -0,0 +1,211 @@
+import bisect
+import itertools
+import re
+import string
+import threading
+
+# Words are runs of letters, digits and underscores, compared casefolded;
+# an email splits into its local part and domain labels
+WORD = re.compile(r"\w+")
+DEFAULT_LIMIT = 10
+MAX_LIMIT = 100
+# Words new to the index wait in a short sorted list of their own and are
+# merged into the main one once this many have accumulated
+MERGE_AT = 4096
+# Candidates checked against a query's other words before giving up, so a
+# common first word paired with a rare second one stays bounded
+MAX_SCAN = 5000
+# Fuzzy matching needs this many characters; shorter words are all prefixes
+FUZZY_MIN = 3
+# Past the point where this few words share the query's first letters, they
+# are checked one by one rather than by looking up every edit
+FUZZY_SCAN = 64
+# Sorts after every character, so [prefix, prefix + LAST) spans the words
+# starting with prefix
+LAST = "\U0010ffff"
+FUZZY_ALPHABET = string.ascii_lowercase + string.digits
+# How a result matched the query word driving the lookup, best first
+EXACT, PREFIX, FUZZY = 0, 1, 2
+MATCH_NAMES = ("exact", "prefix", "fuzzy")
+
+
+def words(text):
+    return WORD.findall(text.casefold())
+
+def _within_one(a, b):
+    # Edit distance of at most one, counting a swap of neighbours as one
+    if a == b:
+        return True
+    if abs(len(a) - len(b)) > 1:
+        return False
+    i = 0
+    while i < len(a) and i < len(b) and a[i] == b[i]:
+        i += 1
+    if len(a) == len(b):
+        return a[i + 1:] == b[i + 1:] or (a[i + 1:i + 2] == b[i:i + 1] and a[i:i + 1] == b[i + 1:i + 2]
+                                          and a[i + 2:] == b[i + 2:])
+    if len(a) > len(b):
+        return a[i + 1:] == b[i:]
+    return a[i:] == b[i + 1:]
+
+def _near_prefix(term, word):
+    # Some prefix of word is within one edit of term
+    n = len(term)
+    return any(_within_one(term, word[:k]) for k in (n - 1, n, n + 1) if k <= len(word))
+
+def _edits(term, stop=None):
+    # Strings one edit away from term, with the edit before position stop.
+    # Appending a character is left out: as a prefix it only narrows what
+    # term itself matches.
+    seen = {term}
+    for i in range(len(term) + 1 if stop is None else stop):
+        head, tail = term[:i], term[i:]
+        variants = []
+        if tail:
+            variants.append(head + tail[1:])
+            variants.extend(head + c + tail[1:] for c in FUZZY_ALPHABET if c != tail[0])
+            variants.extend(head + c + tail for c in FUZZY_ALPHABET)
+        if len(tail) > 1:
+            variants.append(head + tail[1] + tail[0] + tail[2:])
+        for variant in variants:
+            if variant and variant not in seen:
+                seen.add(variant)
+                yield variant
+
+
+class SearchIndex:
+    # Inverted index from words to record ids. Distinct words are kept
+    # sorted, so the words starting with a prefix are one bisect away; a
+    # posting is a bare id until a second record shares the word, since in
+    # a large catalog most words (serial numbers, surnames) belong to one.
+    #
+    # add() is O(words in the text): a new word is only appended to a list,
+    # which the next query sorts into the short list of recent words. A
+    # bulk load leaves everything to one sort, done by settle().
+    #
+    # text_of(record_id) returns the indexed text again; it is used to
+    # check a candidate against the query's other words.
+    def __init__(self, text_of):
+        self.text_of = text_of
+        self._postings = {}
+        self._words = []
+        self._recent = []
+        self._new = []
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._postings)
+
+    def add(self, record_id, text):
+        with self._lock:
+            for word in set(words(text)):
+                ids = self._postings.get(word)
+                if ids is None:
+                    self._postings[word] = record_id
+                    self._new.append(word)
+                elif type(ids) is int:
+                    self._postings[word] = [ids, record_id]
+                else:
+                    ids.append(record_id)
+
+    def settle(self):
+        # Sorts the words added since the last call in with the others. The
+        # main list is replaced before the recent one, so a query running
+        # meanwhile sees a word twice at worst, never not at all.
+        if not self._new:
+            return
+        with self._lock:
+            recent = sorted(self._recent + self._new)
+            self._new = []
+            if len(recent) >= MERGE_AT:
+                self._words = sorted(self._words + recent)
+                recent = []
+            self._recent = recent
+
+    # --- Queries ---
+    def search(self, query, limit=DEFAULT_LIMIT, fuzzy=False):
+        # [(record_id, match)] for records that have a word starting with
+        # each word of the query (or, with fuzzy, within one edit of it).
+        # The most selective query word drives the lookup: records with it
+        # as a whole word come first, then those with a longer word
+        # starting with it, then fuzzy matches.
+        terms = words(query)
+        if not terms:
+            return []
+        self.settle()
+        driver = min(terms, key=lambda term: (self._selectivity(term), -len(term)))
+        others = list(terms)
+        others.remove(driver)
+        fuzzy = fuzzy and len(driver) >= FUZZY_MIN
+        results, seen = [], set()
+        for match, record_id in self._candidates(driver, fuzzy):
+            if record_id in seen:
+                continue
+            seen.add(record_id)
+            if not others or self._matches_all(record_id, others, fuzzy):
+                results.append((record_id, match))
+                if len(results) >= limit:
+                    break
+            if len(seen) >= MAX_SCAN:
+                break
+        return results
+
+    def _ids(self, word):
+        ids = self._postings.get(word)
+        if ids is None:
+            return ()
+        return (ids,) if type(ids) is int else ids
+
+    def _selectivity(self, term):
+        # Estimated candidates: the records with term as a word, plus one
+        # per longer word starting with it
+        return len(self._ids(term)) + self._count_prefixed(term)
+
+    def _count_prefixed(self, prefix):
+        return sum(bisect.bisect_left(sorted_words, prefix + LAST) - bisect.bisect_left(sorted_words, prefix)
+                   for sorted_words in (self._words, self._recent))
+
+    def _prefixed(self, prefix):
+        for sorted_words in (self._words, self._recent):
+            i = bisect.bisect_left(sorted_words, prefix)
+            while i < len(sorted_words) and sorted_words[i].startswith(prefix):
+                yield sorted_words[i]
+                i += 1
+
+    def _candidates(self, driver, fuzzy):
+        # (match, record_id) in rank order; lazy, so a query stops paying
+        # once it has its limit
+        for record_id in self._ids(driver):
+            yield EXACT, record_id
+        for word in self._prefixed(driver):
+            if word != driver:
+                for record_id in self._ids(word):
+                    yield PREFIX, record_id
+        if not fuzzy:
+            return
+        # Words one edit from the driver, whole words before ones that only
+        # start with an edit. Looking up an edit costs a bisect when it is a
+        # prefix, so edits are only made up to the point where few words
+        # share the driver's head; those few are compared directly.
+        stop = 0
+        while stop < len(driver) and self._count_prefixed(driver[:stop]) > FUZZY_SCAN:
+            stop += 1
+        variants = list(_edits(driver, stop))
+        nearby = [word for word in self._prefixed(driver[:stop]) if _near_prefix(driver, word)]
+        fuzzy_words = itertools.chain(
+            (variant for variant in variants if variant in self._postings),
+            (word for word in nearby if _within_one(driver, word)),
+            itertools.chain.from_iterable(map(self._prefixed, variants)),
+            nearby)
+        seen = set()
+        for word in fuzzy_words:
+            if word not in seen and not word.startswith(driver):
+                seen.add(word)
+                for record_id in self._ids(word):
+                    yield FUZZY, record_id
+
+    def _matches_all(self, record_id, terms, fuzzy):
+        record_words = words(self.text_of(record_id))
+        return all(any(word.startswith(term) or (fuzzy and len(term) >= FUZZY_MIN and _near_prefix(term, word))
+                       for word in record_words)
+                   for term in terms)
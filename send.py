@@ -1,14 +1,15 @@
-import socket
-import json
 import re
 
+from client import ClientError, ConnectionPool
+
 HOST = "127.0.0.1"
 PORT = 5000
 
 def send_request(client, request):
-    client.send(json.dumps(request).encode())
-    response = json.loads(client.recv(8192).decode())
-    return response
+    try:
+        return client.request(request)
+    except ClientError as e:
+        return {"status": "error", "message": str(e)}
 
 def is_valid_email(email):
     pattern = r"^[\w\.-]+@[\w\.-]+\.\w+$"
@@ -88,25 +89,23 @@ def show_dashboard(client):
         print(f"Rental ID: {r.get('rental_id')}, User ID: {r.get('user_id')}, Game ID: {r.get('game_id')}, Returned: {returned}, Late Fee: ${late_fee}, Due: {due_date}")
     print("")
 
-def authenticate(client):
+def authenticate():
     print("Please log in to GameHub server:")
     username = input("Username: ")
     password = input("Password: ")
-    auth_request = {"type": "auth", "username": username, "password": password}
-    client.send(json.dumps(auth_request).encode())
-    auth_response = json.loads(client.recv(1024).decode())
-    if auth_response.get("status") != "ok":
-        print("Authentication failed:", auth_response.get("message"))
-        return False
-    print(auth_response.get("message"))
-    return True
+    # One persistent connection, re-established (with the session token) if it drops
+    client = ConnectionPool(HOST, PORT, username, password, size=1)
+    try:
+        client.connect()
+    except ClientError as e:
+        print("Authentication failed:", e)
+        return None
+    print("Authenticated")
+    return client
 
 def main():
-    client = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-    client.connect((HOST, PORT))
-
-    if not authenticate(client):
-        client.close()
+    client = authenticate()
+    if client is None:
         return
 
     while True:
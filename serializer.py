@@ -0,0 +1,123 @@
+import json
+import threading
+from collections import OrderedDict
+
+
+class RawJSON(bytes):
+    # A reply body that is already encoded JSON; sent as-is
+    pass
+
+
+# --- Backend ---
+# orjson, when installed, encodes straight to UTF-8 bytes and is several
+# times faster than the stdlib on record lists. It rejects a few things the
+# stdlib accepts (non-string dict keys such as stock_by_game's, integers
+# beyond 64 bits), so those values fall back to the stdlib encoder. Both
+# produce compact JSON, so replies look the same whichever backend is used.
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+BACKEND = "orjson" if orjson is not None else "json"
+
+_encode = json.JSONEncoder(separators=(",", ":")).encode
+# Skips json.loads' per-call encoding detection (see persistence.py)
+_decode = json.JSONDecoder().decode
+
+
+def _stdlib_dumps(obj):
+    return _encode(obj).encode()
+
+
+def _stdlib_loads(data):
+    if not isinstance(data, str):
+        data = bytes(data).decode()
+    return _decode(data)
+
+
+if orjson is not None:
+    def dumps(obj):
+        try:
+            return orjson.dumps(obj)
+        except TypeError:
+            return _stdlib_dumps(obj)
+
+    loads = orjson.loads
+else:
+    dumps = _stdlib_dumps
+    loads = _stdlib_loads
+
+
+# --- Cached replies ---
+class ResponseCache:
+    # Encoded replies to read-only requests, keyed by request and tagged with
+    # the store version they were built at (Store.version, bumped by every
+    # mutation once it is visible). A cached reply is reused while the
+    # version has not moved past it, so a dashboard polled between writes is
+    # encoded once rather than on every call.
+    #
+    # Misses on the same key build one at a time: under a steady write load
+    # concurrent readers share the one rebuild instead of each encoding the
+    # whole store. The version is read before building, so a write that
+    # lands mid-build leaves the entry already stale rather than wrong.
+    # clear() (a replica swapping stores) bumps `generation`; a caller that
+    # reads it before picking the store passes it in, so a build started
+    # against the old store is not cached.
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._building = {}
+        self._lock = threading.Lock()
+        self.generation = 0
+
+    def get(self, key, version, build, generation=None):
+        # build() returns the reply, as a dict or already encoded
+        if generation is None:
+            generation = self.generation
+        with self._lock:
+            body = self._fresh(key, version)
+            if body is not None:
+                return body
+            builder = self._building.get(key)
+            if builder is None:
+                builder = self._building[key] = threading.Lock()
+        with builder:
+            with self._lock:
+                body = self._fresh(key, version)
+                if body is not None:
+                    return body
+                self.misses += 1
+            try:
+                reply = build()
+                body = reply if isinstance(reply, RawJSON) else RawJSON(dumps(reply))
+            finally:
+                with self._lock:
+                    self._building.pop(key, None)
+            with self._lock:
+                cached = self._entries.get(key)
+                if generation == self.generation and (cached is None or cached[0] <= version):
+                    self._entries[key] = (version, body)
+                    self._entries.move_to_end(key)
+                    while len(self._entries) > self.max_entries:
+                        self._entries.popitem(last=False)
+            return body
+
+    def _fresh(self, key, version):
+        # Caller holds _lock
+        cached = self._entries.get(key)
+        if cached is None or cached[0] < version:
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return cached[1]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.generation += 1
+
+    def stats(self):
+        return {"backend": BACKEND, "entries": len(self._entries), "hits": self.hits, "misses": self.misses}
@@ -1,160 +1,589 @@
+import argparse
+import getpass
 import socket
-import json
-import datetime
 import logging
+import os
 import threading
-import re
+import sys
+import time
 
-# --- Logging setup ---
-logging.basicConfig(filename="server_log.txt", level=logging.INFO,
-                    format="%(asctime)s - %(message)s")
+from feed import HEARTBEAT_INTERVAL, ResumeExpired, end_notice, heartbeat
+from aggregates import today_ordinal
+from protocol import MessageReader, ProtocolError, decode_payload, encode_message
+from store import BulkError, Store, StoreError
+from cluster import SECRET_ENV, Cluster, shard_path, supervise
+import admission
+import auth
+import bulk
+import logpipe
+import metrics
+import overdue
+import persistence
+import queries
+import replication
+import serializer
 
-# --- Server data ---
-users = []
-games = []
-rentals = []
+# listen() accept queue, the same for both engines
+DEFAULT_BACKLOG = 1024
 
-next_user_id = 1
-next_game_id = 1
-next_rental_id = 1
+# --- Server data ---
+store = Store()
+# Set when this process is one worker of a sharded server (--workers)
+cluster = None
+# Set when this process is a read replica (--replica-of)
+follower = None
+PRIMARY_PASSWORD_ENV = "GAMEHUB_PRIMARY_PASSWORD"
+# Encoded replies to read-only requests, reused until the next mutation
+responses = serializer.ResponseCache()
+# Per-action counters and latency histograms, and sampled profiling
+counters = metrics.Metrics()
+profiler = metrics.Profiler()
+# Token buckets per connection and per user, and the bound on requests in
+# progress; both off unless configured
+limiter = admission.RateLimiter()
+admission_queue = admission.AdmissionQueue()
 
 # --- Basic authentication for admin clients ---
+# Salted PBKDF2 hashes (see auth.py) of the default passwords
+# admin/password123 and tester/gamehub
 VALID_USERS = {
-    "admin": "password123",
-    "tester": "gamehub"
+    "admin": "pbkdf2_sha256$100000$13decd60cb98d056eca0cf70e4655bcf$c8f7bc7b6a7759872f4f61364beabb93e42c2651ff602c6fd0e39af035b812e4",
+    "tester": "pbkdf2_sha256$100000$c26d2d7cf0354c087c30f3c6f37f304e$382a686434e5083c150f3fb0bf5fcb0a976ac4de23a20f44c59e64ed5ec250d8"
 }
+sessions = auth.SessionManager()
+
+AUTH_FAILED = {"status": "error", "message": "Authentication failed"}
+SESSION_INVALID = {"status": "error", "message": "Session expired or invalid", "reauth": True}
+UNKNOWN_ACTION = {"status": "error", "message": "Unknown action"}
 
 # --- Helper functions ---
-def calculate_late_fee(rental):
-    if rental.get("returned") and rental.get("due_date"):
-        due = datetime.datetime.strptime(rental["due_date"], "%Y-%m-%d")
-        returned = datetime.datetime.strptime(rental["return_date"], "%Y-%m-%d")
-        days_late = (returned - due).days
-        return max(0, days_late * 2)  # $2 per day late
-    return 0
-
-def handle_client(client_socket, address):
-    global next_user_id, next_game_id, next_rental_id
+def authenticate(auth_data):
+    # Returns (ok, reply, request, username). A connection opens with an
+    # auth message (username/password, or the token from an earlier login),
+    # or directly with a request carrying a valid "token". In the last case
+    # there is no auth reply and the request is handed back to be processed
+    # as the connection's first message, so stateless clients skip a round
+    # trip.
+    message = decode_payload(auth_data)
+    token = message.get("token")
+    if message.get("type") != "auth":
+        username = sessions.check(token)
+        logging.info("Session request", extra={"fields": {"username": username, "ok": username is not None}})
+        if username is None:
+            return False, SESSION_INVALID if token is not None else AUTH_FAILED, None, None
+        return True, None, auth_data, username
+    if token is not None:
+        username = sessions.check(token)
+        ok = username is not None
+        reply = {"status": "ok", "message": "Authenticated", "token": token} if ok else SESSION_INVALID
+    else:
+        username = message.get("username")
+        ok = username in VALID_USERS and auth.verify_password(message.get("password"), VALID_USERS[username])
+        reply = {"status": "ok", "message": "Authenticated", "token": sessions.issue(username)} if ok else AUTH_FAILED
+        if ok and cluster is not None:
+            cluster.share_session(reply["token"], username)
+    logging.info("Authentication", extra={"fields": {"username": username, "ok": ok}})
+    return ok, reply, None, username
+
+def cached_reply(request, build):
+    # build(store) makes the reply; its encoding is reused until the store
+    # version moves. Keyed by the request without its token, and by day,
+    # since overdue listings and stats change with the date alone.
+    # The generation is read before the store; see replace_store().
+    generation = responses.generation
+    current = store
+    key = (today_ordinal(), tuple(sorted((k, repr(v)) for k, v in request.items() if k != "token")))
+    return responses.get(key, current.version, lambda: build(current), generation)
+
+def stats(current, request):
+    # version changes with every mutation; clients use it to tell whether
+    # anything they cached is stale. It restarts with the server, and each
+    # replica counts its own, so it only means something with the epoch.
+    response = {"status": "ok", "stats": current.aggregates.snapshot(), "version": current.version,
+                "epoch": current.epoch}
+    if request.get("per_title"):
+        # Proportional to the number of titles, never to rentals
+        response["stock_by_game"] = current.stock_by_game()
+    return response
+
+def admit(client, action):
+    # None once the request may run, holding an admission slot; otherwise
+    # the reply refusing it. Rentals skip the line ahead of other requests.
+    retry_after = client.check(action)
+    if retry_after is not None:
+        return admission.retry_reply(admission.THROTTLED_MESSAGE, retry_after)
+    retry_after = admission_queue.enter(action in admission.PRIORITY_ACTIONS)
+    if retry_after is not None:
+        return admission.retry_reply(admission.BUSY_MESSAGE, retry_after)
+    return None
+
+def admission_stats():
+    stats = admission_queue.stats()
+    stats["throttled"] = limiter.throttled
+    return stats
+
+def metrics_snapshot():
+    snapshot = counters.snapshot(store.lock_waits())
+    snapshot["response_cache"] = responses.stats()
+    snapshot["admission"] = admission_stats()
+    if cluster is not None:
+        snapshot["shard"] = cluster.shard
+    return snapshot
+
+def prometheus_metrics():
+    labels = f'shard="{cluster.shard}"' if cluster is not None else ""
+    return counters.prometheus(store.lock_waits(), responses.stats(), labels, admission_stats())
+
+def process_request(data, route=True, client=None):
+    # route=False: a request another cluster worker has already routed here.
+    # client: the connection's admission.ClientLimit; requests from peers
+    # were admitted by the worker that routed them and pass None.
+    started = time.perf_counter()
+    profile = profiler.start()
+    request = action = None
+    admitted = None
+    try:
+        request = decode_payload(data)
+        action = request.get("action")
+        refused = None
+        if client is not None and action not in admission.EXEMPT_ACTIONS:
+            refused = admit(client, action)
+            if refused is None:
+                admitted = time.perf_counter()
+        forwarded = None
+        if refused is None:
+            if cluster is not None and route:
+                forwarded = cluster.route(action, request, data)
+            elif follower is not None:
+                forwarded = follower.route(action)
+
+        # --- Commands ---
+        if refused is not None:
+            response = refused
+
+        elif forwarded is not None:
+            response = forwarded
+
+        elif action == "add_user":
+            name = request.get("name")
+            email = request.get("email")
+            password = request.get("password")
+            if not name or not email or not password:
+                raise KeyError("name, email, or password missing")
+            # Email format and password complexity
+            problem = auth.check_new_user(email, password)
+            if problem:
+                response = {"status": "error", "message": problem}
+            else:
+                user = store.add_user(name, email, auth.hash_password(password))
+                if cluster is not None:
+                    cluster.replicate_users([user])
+                response = {"status": "ok", "message": f"User {name} added"}
+
+        elif action == "add_game":
+            title = request.get("title")
+            stock = request.get("stock")
+            if title is None or stock is None:
+                raise KeyError("title or stock missing")
+            store.add_game(title, stock)
+            response = {"status": "ok", "message": f"Game {title} added"}
+
+        elif action == "create_rental":
+            user_id = request.get("user_id")
+            game_id = request.get("game_id")
+            if user_id is None or game_id is None:
+                raise KeyError("user_id or game_id missing")
+            rental = store.create_rental(user_id, game_id)
+            response = {"status": "ok", "message": f"Rental {rental.rental_id} created", "rental_id": rental.rental_id}
+
+        elif action == "reserve_games":
+            user_id = request.get("user_id")
+            game_ids = request.get("game_ids")
+            if user_id is None or game_ids is None:
+                raise KeyError("user_id or game_ids missing")
+            reserved = store.reserve_games(user_id, game_ids)
+            rental_ids = [r.rental_id for r in reserved]
+            response = {"status": "ok", "message": f"Reserved {len(rental_ids)} games", "rental_ids": rental_ids}
+
+        elif action == "return_rental":
+            rental_id = request.get("rental_id")
+            if rental_id is None:
+                raise KeyError("rental_id missing")
+            store.return_rental(rental_id)
+            response = {"status": "ok", "message": f"Rental {rental_id} returned"}
+
+        elif action == "list_dashboard":
+            response = cached_reply(request, lambda current: current.dashboard())
+
+        elif action == "stats":
+            response = cached_reply(request, lambda current: stats(current, request))
+
+        elif action == "subscribe":
+            # The connection handler takes the subscriber out of the reply
+            # and switches the connection to streaming change events.
+            since, epoch = queries.resume_position(request)
+            subscriber = store.feed.subscribe(since, epoch=epoch)
+            response = {"status": "ok", "message": "Subscribed", "seq": subscriber.last_seq,
+                        "epoch": store.feed.epoch, "subscriber": subscriber}
+
+        elif action == "ping":
+            response = {"status": "ok"}
+
+        elif action == "logout":
+            sessions.revoke(request.get("token"))
+            response = {"status": "ok", "message": "Logged out"}
+
+        elif action == "import_users":
+            response = bulk.import_users(store, request)
+            if cluster is not None:
+                cluster.replicate_users([store.get_user(user_id) for user_id in response["ids"]])
+
+        elif action == "import_games":
+            response = bulk.import_games(store, request)
+
+        elif action == "import_rentals":
+            response = bulk.import_rentals(store, request)
+
+        elif action == "export":
+            # The reply carries a record generator under "export"; the
+            # connection handler streams it after the reply
+            response = bulk.export(store, request)
+
+        elif action == "list_users":
+            response = cached_reply(request, lambda current: queries.list_users(current, request))
+
+        elif action == "list_games":
+            response = cached_reply(request, lambda current: queries.list_games(current, request))
+
+        elif action == "list_rentals":
+            response = cached_reply(request, lambda current: queries.list_rentals(current, request))
+
+        elif action == "overdue":
+            response = cached_reply(request, lambda current: queries.overdue(current, request))
+
+        elif action == "search":
+            response = queries.search(store, request)
+
+        elif action == "follow":
+            # Like subscribe and export: the connection handler takes the
+            # stream out of the reply and sends it after the reply
+            response = replication.follow(store, request)
+
+        elif action == "replication":
+            if follower is not None:
+                status = follower.status()
+            elif store.replication is not None:
+                status = store.replication.status()
+            else:
+                status = {"role": "standalone"}
+            response = {"status": "ok", "replication": status}
+
+        elif action == "metrics":
+            response = {"status": "ok", "metrics": metrics_snapshot()}
+            if request.get("profile"):
+                response["profile"] = profiler.top()
+
+        elif action == "replicate" and not route:
+            # Users and sessions created on another worker of the cluster
+            response = cluster.apply(request)
+
+        else:
+            response = UNKNOWN_ACTION
+
+    except ResumeExpired as expired:
+        response = {"status": "error", "message": str(expired), "resync": True}
+    except BulkError as be:
+        response = {"status": "error", "message": str(be), "errors": be.errors}
+    except StoreError as se:
+        response = {"status": "error", "message": str(se)}
+    except KeyError as ke:
+        logging.error(f"Missing key: {ke}")
+        response = {"status": "error", "message": f"Missing key: {ke}"}
+    except Exception as e:
+        logging.error(f"Unhandled error: {e}")
+        response = {"status": "error", "message": "Server error"}
+    elapsed = time.perf_counter() - started
+    if admitted is not None:
+        admission_queue.leave(started + elapsed - admitted)
+    if profile is not None:
+        profiler.stop(profile)
+    # Unknown actions share one label, so made-up names cannot add series
+    counters.record("unknown" if response is UNKNOWN_ACTION else action, elapsed,
+                    type(response) is dict and response.get("status") == "error", len(data))
+    # Queued for the log writer thread; sampled, redacted and truncated there
+    logpipe.log_exchange(action, request, response, elapsed)
+    return response
+
+def send(client_socket, data):
+    client_socket.sendall(data)
+    counters.sent(len(data))
+
+def stream_events(client_socket, subscriber, mode):
+    try:
+        while True:
+            subscriber.wait(HEARTBEAT_INTERVAL)
+            batch = subscriber.take()
+            if batch:
+                send(client_socket, b"".join(event.encode(mode) for event in batch))
+            elif subscriber.overflowed or subscriber.closed:
+                send(client_socket, encode_message(end_notice(subscriber), mode))
+                logging.info(f"Dropped subscriber at seq {subscriber.last_seq}")
+                return
+            else:
+                send(client_socket, encode_message(heartbeat(store.feed.seq), mode))
+    finally:
+        store.feed.unsubscribe(subscriber)
+
+def handle_client(client_socket, address, peer=False):
+    # peer=True: a connection from another cluster worker (Cluster.listen)
+    reader = MessageReader(client_socket)
+    if not peer:
+        counters.connection_opened()
     try:
         # --- Authentication ---
-        auth_data = client_socket.recv(1024).decode()
-        auth_json = json.loads(auth_data)
-        logging.info(f"Received (auth): {auth_json}")
-
-        if auth_json.get("type") != "auth" or \
-           auth_json.get("username") not in VALID_USERS or \
-           auth_json.get("password") != VALID_USERS[auth_json["username"]]:
-            response = {"status": "error", "message": "Authentication failed"}
-            client_socket.send(json.dumps(response).encode())
-            client_socket.close()
+        auth_data = reader.read_payload()
+        if auth_data is None:
             return
+        mode = reader.mode
+        if peer:
+            authenticated, response, first, username = cluster.check_peer(auth_data)
         else:
-            client_socket.send(json.dumps({"status": "ok", "message": "Authenticated"}).encode())
+            authenticated, response, first, username = authenticate(auth_data)
+        if response is not None:
+            send(client_socket, encode_message(response, mode))
+        if not authenticated:
+            return
 
         # --- Handle requests ---
+        # Pipelined requests are answered in order; replies are batched into
+        # one write whenever the decoder has drained what was received.
+        client = None if peer else limiter.client(username)
+        replies = []
         while True:
-            data = client_socket.recv(8192)
-            if not data:
+            data = first if first is not None else reader.read_payload()
+            first = None
+            if data is None:
                 break
 
-            try:
-                request = json.loads(data.decode())
-                logging.info(f"Received: {request}")
-
-                action = request.get("action")
-
-                # --- Commands ---
-                if action == "add_user":
-                    name = request.get("name")
-                    email = request.get("email")
-                    password = request.get("password")
-                    if not name or not email or not password:
-                        raise KeyError("name, email, or password missing")
-                    # Email validation
-                    pattern_email = r"^[\w\.-]+@[\w\.-]+\.\w+$"
-                    if not re.match(pattern_email, email):
-                        response = {"status": "error", "message": "Invalid email format"}
-                    else:
-                        # Password complexity check
-                        pattern_pw = r"^(?=.*[a-z])(?=.*[A-Z])(?=.*\d)(?=.*[@$!%*?&])[A-Za-z\d@$!%*?&]{8,}$"
-                        if not re.match(pattern_pw, password):
-                            response = {"status": "error", "message": "Password must be at least 8 characters, include upper/lowercase, number, and special char"}
-                        else:
-                            user = {"user_id": next_user_id, "name": name, "email": email, "password": password}
-                            users.append(user)
-                            next_user_id += 1
-                            response = {"status": "ok", "message": f"User {name} added"}
-
-                elif action == "add_game":
-                    title = request.get("title")
-                    stock = request.get("stock")
-                    if title is None or stock is None:
-                        raise KeyError("title or stock missing")
-                    game = {"game_id": next_game_id, "title": title, "stock": stock, "available": True}
-                    games.append(game)
-                    next_game_id += 1
-                    response = {"status": "ok", "message": f"Game {title} added"}
-
-                elif action == "create_rental":
-                    user_id = request.get("user_id")
-                    game_id = request.get("game_id")
-                    if user_id is None or game_id is None:
-                        raise KeyError("user_id or game_id missing")
-                    rental = {
-                        "rental_id": next_rental_id,
-                        "user_id": user_id,
-                        "game_id": game_id,
-                        "returned": False,
-                        "late_fee": 0,
-                        "due_date": (datetime.datetime.now() + datetime.timedelta(days=7)).strftime("%Y-%m-%d")
-                    }
-                    rentals.append(rental)
-                    next_rental_id += 1
-                    response = {"status": "ok", "message": f"Rental {rental['rental_id']} created"}
-
-                elif action == "return_rental":
-                    rental_id = request.get("rental_id")
-                    if rental_id is None:
-                        raise KeyError("rental_id missing")
-                    rental = next((r for r in rentals if r["rental_id"] == rental_id), None)
-                    if rental:
-                        rental["returned"] = True
-                        rental["return_date"] = datetime.datetime.now().strftime("%Y-%m-%d")
-                        rental["late_fee"] = calculate_late_fee(rental)
-                        response = {"status": "ok", "message": f"Rental {rental_id} returned"}
-                    else:
-                        response = {"status": "error", "message": "Rental not found"}
-
-                elif action == "list_dashboard":
-                    response = {"users": users, "games": games, "rentals": rentals}
-
-                else:
-                    response = {"status": "error", "message": "Unknown action"}
-
-                logging.info(f"Responded: {response}")
-                client_socket.send(json.dumps(response).encode())
-
-            except KeyError as ke:
-                logging.error(f"Missing key: {ke}")
-                client_socket.send(json.dumps({"status": "error", "message": f"Missing key: {ke}"}).encode())
-            except Exception as e:
-                logging.error(f"Unhandled error: {e}")
-                client_socket.send(json.dumps({"status": "error", "message": "Server error"}).encode())
+            response = process_request(data, route=not peer, client=client)
+            subscriber = response.pop("subscriber", None) if isinstance(response, dict) else None
+            export = response.pop("export", None) if isinstance(response, dict) else None
+            stream = response.pop("stream", None) if isinstance(response, dict) else None
+            replies.append(encode_message(response, mode))
+            if subscriber is not None:
+                send(client_socket, b"".join(replies))
+                stream_events(client_socket, subscriber, mode)
+                break
+            if stream is not None:
+                # A read replica following this server
+                send(client_socket, b"".join(replies))
+                try:
+                    for message in stream:
+                        send(client_socket, encode_message(message, mode))
+                finally:
+                    stream.close()
+                break
+            if export is not None:
+                if store.journal is not None:
+                    store.journal.wait_durable()
+                send(client_socket, b"".join(replies))
+                replies.clear()
+                for chunk in bulk.export_chunks(export, mode):
+                    send(client_socket, chunk)
+                continue
+            if not reader.has_pending():
+                # Group commit: one durability wait per batch of replies
+                if store.journal is not None:
+                    store.journal.wait_durable()
+                send(client_socket, b"".join(replies))
+                replies.clear()
 
+    except ProtocolError as pe:
+        logging.error(f"Protocol error from {address}: {pe}")
     except Exception as e:
         logging.error(f"Error handling client {address}: {e}")
     finally:
         client_socket.close()
+        if not peer:
+            counters.connection_closed()
         logging.info(f"Closed connection: {address}")
 
+def replace_store(new_store):
+    # A replica switching to the copy it loaded from a fresh snapshot
+    global store
+    old, store = store, new_store
+    # After the swap: a reply being built from the old store started with
+    # the old generation and is not cached
+    responses.clear()
+    # The old feed gets no more events; its subscribers are told to resync
+    old.feed.close()
+
 # --- Main server ---
-def main():
-    host = "0.0.0.0"
-    port = 5000
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="GameHub server")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=5000)
+    parser.add_argument("--engine", choices=["threaded", "async"], default="threaded",
+                        help="thread-per-connection or asyncio event loop")
+    parser.add_argument("--backlog", type=int, default=DEFAULT_BACKLOG,
+                        help="listen() accept backlog")
+    parser.add_argument("--max-connections", type=int, default=10000,
+                        help="async engine: concurrent connection limit")
+    parser.add_argument("--idle-timeout", type=float, default=300.0,
+                        help="async engine: seconds before an idle connection is closed")
+    parser.add_argument("--drain-timeout", type=float, default=10.0,
+                        help="async engine: seconds to finish in-flight requests on shutdown")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="worker processes, each owning a shard of games and rentals")
+    parser.add_argument("--peer-port", type=int,
+                        help="with --workers: worker k takes this port + k on loopback (default: --port + 1)")
+    parser.add_argument("--shard", type=int, help=argparse.SUPPRESS)
+    parser.add_argument("--replicas", type=int, default=0, metavar="HISTORY",
+                        help="keep a replication log of this many records for read replicas (0: off)")
+    parser.add_argument("--replica-of", metavar="HOST:PORT",
+                        help="run as a read replica of this primary; the password is read from "
+                             f"${PRIMARY_PASSWORD_ENV} or prompted for")
+    parser.add_argument("--primary-user", default="admin", help="with --replica-of: login on the primary")
+    parser.add_argument("--backend", choices=["memory", "sqlite"], default="memory",
+                        help="where state lives")
+    parser.add_argument("--db", default="gamehub.db", help="sqlite backend: database file")
+    parser.add_argument("--data-dir",
+                        help="persist state in this directory (write-ahead log + snapshots)")
+    parser.add_argument("--durability", choices=persistence.DURABILITY_MODES, default=persistence.SYNC,
+                        help="sync: reply after fsync; relaxed: fsync in the background")
+    parser.add_argument("--snapshot-every", type=int, default=persistence.DEFAULT_SNAPSHOT_EVERY,
+                        help="journal records between snapshots")
+    parser.add_argument("--overdue-interval", type=float, default=overdue.DEFAULT_INTERVAL,
+                        help="seconds between overdue scans (0: off)")
+    parser.add_argument("--hash-iterations", type=int, default=auth.DEFAULT_ITERATIONS,
+                        help="PBKDF2 iterations for newly stored passwords")
+    parser.add_argument("--session-ttl", type=float, default=auth.DEFAULT_SESSION_TTL,
+                        help="seconds a session token stays valid")
+    parser.add_argument("--log-file", default=logpipe.DEFAULT_LOG_FILE,
+                        help="JSON-lines request log, written by a background thread")
+    parser.add_argument("--log-level", choices=["debug", "info", "warning", "error", "off"], default="info",
+                        help="info logs every request; warning and above only problems")
+    parser.add_argument("--log-sample", action="append", metavar="ACTION=RATE",
+                        help="log only this fraction of an action's requests, e.g. list_dashboard=0.01")
+    parser.add_argument("--log-max-bytes", type=int, default=logpipe.DEFAULT_MAX_BYTES,
+                        help="rotate the log once it reaches this size (0: never)")
+    parser.add_argument("--log-rotate-seconds", type=float, default=logpipe.DEFAULT_ROTATE_SECONDS,
+                        help="rotate the log at least this often (0: never)")
+    parser.add_argument("--log-backups", type=int, default=logpipe.DEFAULT_BACKUPS,
+                        help="rotated log files to keep")
+    parser.add_argument("--metrics-port", type=int,
+                        help="serve Prometheus text metrics over HTTP at /metrics on this port "
+                             "(with --workers: worker k uses this port + k)")
+    parser.add_argument("--profile-rate", type=float, default=0.0, metavar="FRACTION",
+                        help="run this fraction of requests under cProfile; see the metrics action")
+    parser.add_argument("--rate-limit", type=float, default=0.0, metavar="TOKENS",
+                        help="tokens per second per connection (0: off); see admission.ACTION_COSTS")
+    parser.add_argument("--rate-burst", type=float, default=0.0, metavar="TOKENS",
+                        help="tokens a connection can save up (default: one second's worth)")
+    parser.add_argument("--user-rate-limit", type=float, default=0.0, metavar="TOKENS",
+                        help="tokens per second shared by all connections of one user (0: off)")
+    parser.add_argument("--user-rate-burst", type=float, default=0.0, metavar="TOKENS",
+                        help="tokens a user can save up (default: one second's worth)")
+    parser.add_argument("--max-inflight", type=int, default=0,
+                        help="requests processed at once; others queue, rentals first (0: no limit)")
+    parser.add_argument("--admission-queue", type=int, default=admission.DEFAULT_QUEUE,
+                        help="with --max-inflight: requests of each priority that may wait")
+    parser.add_argument("--admission-wait", type=float, default=admission.DEFAULT_MAX_WAIT, metavar="SECONDS",
+                        help="with --max-inflight: longest wait before a request is shed")
+    args = parser.parse_args(argv)
+    if min(args.rate_limit, args.rate_burst, args.user_rate_limit, args.user_rate_burst, args.max_inflight) < 0:
+        parser.error("rate limits and --max-inflight cannot be negative")
+    if not 0 <= args.profile_rate <= 1:
+        parser.error("--profile-rate must be between 0 and 1")
+    if args.workers > 1 and args.backend != "memory":
+        parser.error("--workers needs the memory backend")
+    if (args.replicas or args.replica_of) and (args.workers > 1 or args.backend != "memory"):
+        parser.error("--replicas and --replica-of need a single-process memory backend")
+    if args.replica_of and args.data_dir:
+        parser.error("a replica keeps no data directory; it copies the primary on start")
+    return args
+
+def main(argv=None):
+    global store, cluster, follower, limiter, admission_queue
+    args = parse_args(argv)
+    host = args.host
+    port = args.port
+
+    if args.workers > 1 and args.shard is None:
+        print(f"GameHub server running {args.workers} workers on {host}:{port}")
+        supervise(sys.argv[1:] if argv is None else argv, args.workers)
+        return
+
+    auth.iterations = args.hash_iterations
+    sessions.ttl = args.session_ttl
+
+    log_file = args.log_file
+    if args.shard is not None:
+        # One worker of a sharded server: own store, log file and data
+        # directory, and a loopback port for requests from the other workers
+        store = Store(shard=args.shard, shards=args.workers)
+        log_file = shard_path(log_file, args.shard)
+        if args.data_dir:
+            args.data_dir = os.path.join(args.data_dir, f"shard-{args.shard}")
+        cluster = Cluster(args.shard, args.workers, args.peer_port or port + 1, os.environ[SECRET_ENV],
+                          store, sessions, lambda payload: process_request(payload, route=False))
+        cluster.listen(handle_client)
+
+    # --- Logging setup ---
+    logpipe.setup(None if args.log_level == "off" else log_file,
+                  level=getattr(logging, args.log_level.upper(), logging.INFO),
+                  max_bytes=args.log_max_bytes, rotate_seconds=args.log_rotate_seconds,
+                  backups=args.log_backups, sample_rates=logpipe.parse_sample_rates(args.log_sample))
+
+    if args.backend == "sqlite":
+        # SQLite is durable on its own; the journal only backs the memory store
+        from sqlite_store import SqliteStore
+        store = SqliteStore(args.db)
+        print(f"Using SQLite backend at {args.db}")
+    elif args.data_dir:
+        persistence.Journal(store, args.data_dir, args.durability, args.snapshot_every).open()
+        print(f"Recovered {len(store.users)} users, {len(store.games)} games, "
+              f"{len(store.rentals)} rentals from {args.data_dir}")
+
+    if args.replicas:
+        store.replication = replication.ReplicationLog(args.replicas)
+    if args.replica_of:
+        primary_host, _, primary_port = args.replica_of.rpartition(":")
+        password = os.environ.get(PRIMARY_PASSWORD_ENV) or getpass.getpass(f"Password for {args.primary_user}: ")
+        follower = replication.Follower(store, primary_host, int(primary_port), args.primary_user, password,
+                                        swap=replace_store).start()
+        print(f"Replicating from {args.replica_of}")
+
+    profiler.rate = args.profile_rate
+    limiter = admission.RateLimiter(args.rate_limit, args.rate_burst, args.user_rate_limit, args.user_rate_burst)
+    admission_queue = admission.AdmissionQueue(args.max_inflight, args.admission_queue, args.admission_wait)
+    if args.metrics_port:
+        metrics_port = args.metrics_port + (args.shard or 0)
+        metrics.serve_prometheus(host, metrics_port, prometheus_metrics)
+        print(f"Metrics on http://{host}:{metrics_port}/metrics")
+
+    # A replica's overdue index still advances lazily on every query; only
+    # the primary publishes rentals_overdue events
+    if args.overdue_interval > 0 and follower is None:
+        overdue.OverdueScheduler(store, args.overdue_interval).start()
+
+    if args.engine == "async":
+        import async_server
+        async_server.run(host, port, backlog=args.backlog,
+                         max_connections=args.max_connections,
+                         idle_timeout=args.idle_timeout,
+                         drain_timeout=args.drain_timeout,
+                         reuse_port=cluster is not None)
+        return
 
     server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    if cluster is not None:
+        # Every worker listens on the same port; the kernel spreads the
+        # incoming connections over them
+        server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
     server.bind((host, port))
-    server.listen(5)
+    server.listen(args.backlog)
     print(f"GameHub server running on {host}:{port}")
 
     while True:
@@ -162,4 +591,7 @@ def main():
         threading.Thread(target=handle_client, args=(client_socket, address)).start()
 
 if __name__ == "__main__":
+    # Let `import server` elsewhere (async_server) see this module's state
+    # instead of loading a second copy
+    sys.modules.setdefault("server", sys.modules["__main__"])
     main()
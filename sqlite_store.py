@@ -0,0 +1,504 @@
+import sqlite3
+import threading
+
+from aggregates import DashboardAggregates, date_ordinal, late_fee, ordinal_date, today_ordinal
+from feed import GAME_ADDED, RENTAL_CREATED, RENTAL_RETURNED, USER_ADDED, ChangeFeed
+from search import SearchIndex
+from serializer import RawJSON, dumps
+from store import RENTAL_DAYS, BulkError, Game, Rental, StoreError, User, user_text, valid_stock
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    user_id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    email TEXT NOT NULL UNIQUE COLLATE NOCASE,
+    password TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS games (
+    game_id INTEGER PRIMARY KEY,
+    title TEXT NOT NULL,
+    stock INTEGER NOT NULL CHECK (stock >= 0)
+);
+CREATE TABLE IF NOT EXISTS rentals (
+    rental_id INTEGER PRIMARY KEY,
+    user_id INTEGER NOT NULL REFERENCES users (user_id),
+    game_id INTEGER NOT NULL REFERENCES games (game_id),
+    due_date TEXT NOT NULL,
+    returned INTEGER NOT NULL DEFAULT 0,
+    late_fee INTEGER NOT NULL DEFAULT 0,
+    return_date TEXT
+);
+CREATE INDEX IF NOT EXISTS rentals_by_user ON rentals (user_id, rental_id);
+CREATE INDEX IF NOT EXISTS rentals_by_game ON rentals (game_id, rental_id);
+CREATE INDEX IF NOT EXISTS rentals_by_returned ON rentals (returned, rental_id);
+CREATE INDEX IF NOT EXISTS rentals_by_due ON rentals (returned, due_date);
+"""
+
+# --- Statements ---
+# Fixed SQL text with ? parameters: sqlite3 keeps a per-connection cache of
+# compiled statements keyed by the text, so each one is prepared once per
+# connection and reused afterwards.
+STATEMENT_CACHE = 128
+
+USER_COLUMNS = "user_id, name, email, password"
+GAME_COLUMNS = "game_id, title, stock"
+RENTAL_COLUMNS = "rental_id, user_id, game_id, due_date, returned, late_fee, return_date"
+
+SQL_GET_USER = f"SELECT {USER_COLUMNS} FROM users WHERE user_id = ?"
+SQL_GET_GAME = f"SELECT {GAME_COLUMNS} FROM games WHERE game_id = ?"
+SQL_GET_RENTAL = f"SELECT {RENTAL_COLUMNS} FROM rentals WHERE rental_id = ?"
+SQL_USER_BY_EMAIL = f"SELECT {USER_COLUMNS} FROM users WHERE email = ?"
+SQL_INSERT_USER = "INSERT INTO users (name, email, password) VALUES (?, ?, ?)"
+SQL_INSERT_GAME = "INSERT INTO games (title, stock) VALUES (?, ?)"
+SQL_TAKE_COPIES = "UPDATE games SET stock = stock - ? WHERE game_id = ? AND stock >= ?"
+SQL_PUT_COPY = "UPDATE games SET stock = stock + 1 WHERE game_id = ?"
+SQL_INSERT_RENTAL = "INSERT INTO rentals (user_id, game_id, due_date) VALUES (?, ?, ?)"
+SQL_CLOSE_RENTAL = ("UPDATE rentals SET returned = 1, return_date = ?, late_fee = ? "
+                    "WHERE rental_id = ? AND returned = 0")
+SQL_USERS_AFTER = f"SELECT {USER_COLUMNS} FROM users WHERE user_id > ? ORDER BY user_id"
+SQL_GAMES_AFTER = f"SELECT {GAME_COLUMNS} FROM games WHERE game_id > ? ORDER BY game_id"
+SQL_STOCK_BY_GAME = "SELECT game_id, stock FROM games"
+SQL_NEWLY_OVERDUE = (f"SELECT {RENTAL_COLUMNS} FROM rentals INDEXED BY rentals_by_due "
+                     "WHERE returned = 0 AND due_date >= ? AND due_date < ?")
+# Bulk lookups bind at most this many values per IN (...) list
+IN_CHUNK = 500
+
+
+def _user(row):
+    return User(*row)
+
+def _game(row):
+    return Game(row[0], row[1], row[2], row[2] > 0)
+
+def _rental(row):
+    # Dates stay ISO text in the database, where they sort and index as-is
+    return Rental(row[0], row[1], row[2], date_ordinal(row[3]), bool(row[4]), row[5],
+                  None if row[6] is None else date_ordinal(row[6]))
+
+def _lookup(conn, sql, values):
+    # Runs `sql` (ending in "IN") over values in chunks; returns all rows
+    values = list(values)
+    rows = []
+    for start in range(0, len(values), IN_CHUNK):
+        chunk = values[start:start + IN_CHUNK]
+        rows.extend(conn.execute(f"{sql} ({', '.join('?' * len(chunk))})", chunk))
+    return rows
+
+def _rental_filter(status, user_id, game_id, today):
+    # Builds the WHERE clause for a rental scan and pins the index it should
+    # use. Without ANALYZE statistics the planner tends to pick the
+    # low-selectivity returned index even when a user or game is given.
+    clauses, params = [], []
+    if user_id is not None:
+        index = "INDEXED BY rentals_by_user"
+    elif game_id is not None:
+        index = "INDEXED BY rentals_by_game"
+    elif status != "all":
+        index = "INDEXED BY rentals_by_returned"
+    else:
+        index = ""
+    if user_id is not None:
+        clauses.append("user_id = ?")
+        params.append(user_id)
+    if game_id is not None:
+        clauses.append("game_id = ?")
+        params.append(game_id)
+    if status in ("open", "overdue"):
+        clauses.append("returned = 0")
+    elif status == "returned":
+        clauses.append("returned = 1")
+    if status == "overdue":
+        clauses.append("due_date < ?")
+        params.append(today)
+    return index, clauses, params
+
+
+class SqliteStore:
+    # Same interface as store.Store, backed by a SQLite database in WAL mode
+    # so data can outgrow RAM. Each thread gets its own connection; readers
+    # never block the writer and vice versa. Write transactions use
+    # BEGIN IMMEDIATE, so stock checks and updates happen under SQLite's
+    # write lock and cannot oversell.
+    #
+    # Read replicas replay the in-memory store's journal records, so this
+    # backend never has a replication log.
+    supports_replication = False
+
+    def __init__(self, path, busy_timeout=5.0):
+        self.path = path
+        self.busy_timeout = busy_timeout
+        self._local = threading.local()
+        self._connections = set()
+        self._connections_lock = threading.Lock()
+        self.feed = ChangeFeed()
+        self.journal = None
+        self.replication = None
+        # Rentals already overdue at startup were reported by an earlier run
+        self._overdue_day = today_ordinal()
+        self._overdue_lock = threading.Lock()
+        conn = self._connection()
+        conn.executescript(SCHEMA)
+        self.aggregates = DashboardAggregates()
+        self.rebuild_aggregates()
+        # The search indexes stay in memory: titles, names and emails are
+        # small next to the rental history, and loading them is one scan
+        self.user_search = SearchIndex(lambda user_id: user_text(self.get_user(user_id)))
+        self.game_search = SearchIndex(lambda game_id: self.get_game(game_id).title)
+        for user_id, name, email in conn.execute("SELECT user_id, name, email FROM users"):
+            self.user_search.add(user_id, f"{name} {email}")
+        for game_id, title in conn.execute("SELECT game_id, title FROM games"):
+            self.game_search.add(game_id, title)
+        self.user_search.settle()
+        self.game_search.settle()
+
+    # --- Connections ---
+    def _connection(self):
+        held = getattr(self._local, "held", None)
+        if held is None:
+            conn = sqlite3.connect(self.path, timeout=self.busy_timeout, isolation_level=None,
+                                   check_same_thread=False, cached_statements=STATEMENT_CACHE)
+            conn.execute("PRAGMA journal_mode = WAL")
+            conn.execute("PRAGMA synchronous = NORMAL")
+            conn.execute("PRAGMA foreign_keys = ON")
+            held = self._local.held = _ThreadConnection(self, conn)
+            with self._connections_lock:
+                self._connections.add(conn)
+        return held.conn
+
+    def _release(self, conn):
+        # A thread that had a connection exited (see _ThreadConnection)
+        with self._connections_lock:
+            self._connections.discard(conn)
+        conn.close()
+
+    def close(self):
+        with self._connections_lock:
+            for conn in self._connections:
+                conn.close()
+            self._connections.clear()
+
+    def _write(self):
+        return _Transaction(self._connection())
+
+    # --- Lookups ---
+    def get_user(self, user_id):
+        row = self._connection().execute(SQL_GET_USER, (user_id,)).fetchone()
+        if row is None:
+            raise StoreError(f"User {user_id} not found")
+        return _user(row)
+
+    def get_game(self, game_id):
+        row = self._connection().execute(SQL_GET_GAME, (game_id,)).fetchone()
+        if row is None:
+            raise StoreError(f"Game {game_id} not found")
+        return _game(row)
+
+    def get_rental(self, rental_id):
+        row = self._connection().execute(SQL_GET_RENTAL, (rental_id,)).fetchone()
+        if row is None:
+            raise StoreError("Rental not found")
+        return _rental(row)
+
+    def find_user_by_email(self, email):
+        row = self._connection().execute(SQL_USER_BY_EMAIL, (email,)).fetchone()
+        return _user(row) if row else None
+
+    def search_users(self, query, limit, fuzzy=False):
+        return [(self.get_user(user_id), match) for user_id, match in self.user_search.search(query, limit, fuzzy)]
+
+    def search_games(self, query, limit, fuzzy=False):
+        return [(self.get_game(game_id), match) for game_id, match in self.game_search.search(query, limit, fuzzy)]
+
+    # --- Ordered scans (rows are stepped lazily from the cursor) ---
+    def iter_users(self, after=None):
+        for row in self._connection().execute(SQL_USERS_AFTER, (after or 0,)):
+            yield _user(row)
+
+    def iter_games(self, after=None):
+        for row in self._connection().execute(SQL_GAMES_AFTER, (after or 0,)):
+            yield _game(row)
+
+    def iter_rentals(self, after=None, user_id=None, game_id=None, status="all"):
+        today = ordinal_date(today_ordinal())
+        index, clauses, params = _rental_filter(status, user_id, game_id, today)
+        clauses.append("rental_id > ?")
+        params.append(after or 0)
+        sql = f"SELECT {RENTAL_COLUMNS} FROM rentals {index} WHERE {' AND '.join(clauses)} ORDER BY rental_id"
+        for row in self._connection().execute(sql, params):
+            yield _rental(row)
+
+    # --- Counts ---
+    def count_users(self):
+        return self._connection().execute("SELECT COUNT(*) FROM users").fetchone()[0]
+
+    def count_games(self):
+        return self._connection().execute("SELECT COUNT(*) FROM games").fetchone()[0]
+
+    def count_rentals(self, status="all", user_id=None, game_id=None):
+        if user_id is None and game_id is None:
+            # Unfiltered totals are kept by the in-memory aggregates
+            stats = self.aggregates.snapshot()
+            if status == "all":
+                return stats["total_rentals"]
+            if status == "open":
+                return stats["active_rentals"]
+            if status == "returned":
+                return stats["total_rentals"] - stats["active_rentals"]
+            return stats["overdue_rentals"]
+        today = ordinal_date(today_ordinal())
+        index, clauses, params = _rental_filter(status, user_id, game_id, today)
+        sql = f"SELECT COUNT(*) FROM rentals {index} WHERE {' AND '.join(clauses)}"
+        return self._connection().execute(sql, params).fetchone()[0]
+
+    @property
+    def version(self):
+        # As in Store: every write publishes its change event after commit
+        return self.feed.seq
+
+    @property
+    def epoch(self):
+        return self.feed.epoch
+
+    def stock_by_game(self):
+        return dict(self._connection().execute(SQL_STOCK_BY_GAME))
+
+    def lock_waits(self):
+        # SQLite's write lock is taken inside the library (busy_timeout);
+        # waiting for it shows up as write latency instead
+        return {}
+
+    def track_overdue(self):
+        # advance_overdue() queries by due day; there is nothing to queue
+        pass
+
+    def advance_overdue(self, today=None):
+        # Open rentals whose due day fell in [last call, today): a range
+        # scan on rentals_by_due, so cost follows the rentals that changed
+        today = today or today_ordinal()
+        with self._overdue_lock:
+            since, self._overdue_day = self._overdue_day, max(self._overdue_day, today)
+        if today <= since:
+            return []
+        cursor = self._connection().execute(SQL_NEWLY_OVERDUE, (ordinal_date(since), ordinal_date(today)))
+        return [_rental(row) for row in cursor]
+
+    # --- Mutations ---
+    def add_user(self, name, email, password):
+        try:
+            with self._write() as conn:
+                user_id = conn.execute(SQL_INSERT_USER, (name, email, password)).lastrowid
+        except sqlite3.IntegrityError:
+            raise StoreError(f"Email {email} already registered")
+        user = User(user_id, name, email, password)
+        self.user_search.add(user_id, user_text(user))
+        self.feed.publish(USER_ADDED, user.to_dict())
+        return user
+
+    def add_game(self, title, stock):
+        if not isinstance(stock, int) or isinstance(stock, bool) or stock < 0:
+            raise StoreError("Stock must be a non-negative integer")
+        with self._write() as conn:
+            game_id = conn.execute(SQL_INSERT_GAME, (title, stock)).lastrowid
+        game = Game(game_id, title, stock, stock > 0)
+        self.game_search.add(game_id, title)
+        self.aggregates.game_added(stock)
+        self.feed.publish(GAME_ADDED, game.to_dict())
+        return game
+
+    def _due_day(self, today):
+        return (today or today_ordinal()) + RENTAL_DAYS
+
+    def create_rental(self, user_id, game_id, today=None):
+        return self._reserve(user_id, [game_id], today, single=True)[0]
+
+    def reserve_games(self, user_id, game_ids, today=None):
+        return self._reserve(user_id, game_ids, today, single=False)
+
+    def _reserve(self, user_id, game_ids, today, single):
+        if not game_ids:
+            raise StoreError("No games requested")
+        wanted = {}
+        for game_id in game_ids:
+            wanted[game_id] = wanted.get(game_id, 0) + 1
+        due_day = self._due_day(today)
+        due_date = ordinal_date(due_day)
+        created = []
+        with self._write() as conn:
+            if conn.execute(SQL_GET_USER, (user_id,)).fetchone() is None:
+                raise StoreError(f"User {user_id} not found")
+            short = []
+            for game_id, count in wanted.items():
+                if conn.execute(SQL_TAKE_COPIES, (count, game_id, count)).rowcount == 1:
+                    continue
+                if conn.execute(SQL_GET_GAME, (game_id,)).fetchone() is None:
+                    raise StoreError(f"Game {game_id} not found")
+                short.append(game_id)
+            # Raising rolls back any copies already taken above
+            if short and single:
+                raise StoreError(f"Game {short[0]} is out of stock")
+            if short:
+                raise StoreError(f"Not enough stock for games {short}")
+            for game_id in game_ids:
+                rental_id = conn.execute(SQL_INSERT_RENTAL, (user_id, game_id, due_date)).lastrowid
+                created.append(Rental(rental_id, user_id, game_id, due_day))
+            games = {game_id: _game(conn.execute(SQL_GET_GAME, (game_id,)).fetchone()) for game_id in wanted}
+        for rental in created:
+            self.aggregates.rental_opened(due_day)
+            self.feed.publish(RENTAL_CREATED, {"rental": rental.to_dict(),
+                                               "game": games[rental.game_id].to_dict()})
+        return created
+
+    def return_rental(self, rental_id, today=None):
+        today = today or today_ordinal()
+        return_date = ordinal_date(today)
+        with self._write() as conn:
+            row = conn.execute(SQL_GET_RENTAL, (rental_id,)).fetchone()
+            if row is None:
+                raise StoreError("Rental not found")
+            rental = _rental(row)
+            if rental.returned:
+                raise StoreError(f"Rental {rental_id} already returned")
+            fee = late_fee(rental.due_day, today)
+            conn.execute(SQL_CLOSE_RENTAL, (return_date, fee, rental_id))
+            conn.execute(SQL_PUT_COPY, (rental.game_id,))
+            game = _game(conn.execute(SQL_GET_GAME, (rental.game_id,)).fetchone())
+        rental.returned = True
+        rental.return_day = today
+        rental.late_fee = fee
+        self.aggregates.rental_closed(rental.due_day, fee)
+        self.feed.publish(RENTAL_RETURNED, {"rental": rental.to_dict(), "game": game.to_dict()})
+        return rental
+
+    # --- Bulk imports ---
+    # Same contract as Store: a batch is validated against the database and
+    # inserted inside one write transaction, or rejected with BulkError.
+    def import_users(self, rows):
+        errors, seen = [], set()
+        with self._write() as conn:
+            taken = {email.lower() for (email,) in _lookup(
+                conn, "SELECT email FROM users WHERE email IN", {email for _, email, _ in rows})}
+            for index, (_, email, _) in enumerate(rows):
+                key = email.lower()
+                if key in taken or key in seen:
+                    errors.append({"index": index, "message": f"Email {email} already registered"})
+                seen.add(key)
+            if errors:
+                raise BulkError(errors)
+            users = [User(conn.execute(SQL_INSERT_USER, row).lastrowid, *row) for row in rows]
+        for user in users:
+            self.user_search.add(user.user_id, user_text(user))
+            self.feed.publish(USER_ADDED, user.to_dict())
+        return users
+
+    def import_games(self, rows):
+        errors = [{"index": index, "message": "Stock must be a non-negative integer"}
+                  for index, (_, stock) in enumerate(rows) if not valid_stock(stock)]
+        if errors:
+            raise BulkError(errors)
+        with self._write() as conn:
+            games = [Game(conn.execute(SQL_INSERT_GAME, row).lastrowid, row[0], row[1], row[1] > 0)
+                     for row in rows]
+        for game in games:
+            self.game_search.add(game.game_id, game.title)
+            self.aggregates.game_added(game.stock)
+            self.feed.publish(GAME_ADDED, game.to_dict())
+        return games
+
+    def import_rentals(self, rows, today=None):
+        default_due = self._due_day(today)
+        errors, wanted = [], {}
+        with self._write() as conn:
+            users = {user_id for (user_id,) in _lookup(
+                conn, "SELECT user_id FROM users WHERE user_id IN", {row[0] for row in rows})}
+            stock = dict(_lookup(conn, "SELECT game_id, stock FROM games WHERE game_id IN",
+                                 {row[1] for row in rows}))
+            for index, (user_id, game_id, _) in enumerate(rows):
+                if user_id not in users:
+                    errors.append({"index": index, "message": f"User {user_id} not found"})
+                elif game_id not in stock:
+                    errors.append({"index": index, "message": f"Game {game_id} not found"})
+                else:
+                    wanted.setdefault(game_id, []).append(index)
+            for game_id, indexes in wanted.items():
+                for index in indexes[stock[game_id]:]:
+                    errors.append({"index": index, "message": f"Game {game_id} is out of stock"})
+            if errors:
+                raise BulkError(sorted(errors, key=lambda e: e["index"]))
+            rentals = []
+            for user_id, game_id, due_day in rows:
+                due_day = due_day or default_due
+                rental_id = conn.execute(SQL_INSERT_RENTAL, (user_id, game_id, ordinal_date(due_day))).lastrowid
+                rentals.append(Rental(rental_id, user_id, game_id, due_day))
+            for game_id, indexes in wanted.items():
+                conn.execute(SQL_TAKE_COPIES, (len(indexes), game_id, len(indexes)))
+            games = {row[0]: _game(row) for row in _lookup(
+                conn, f"SELECT {GAME_COLUMNS} FROM games WHERE game_id IN", wanted)}
+        for rental in rentals:
+            self.aggregates.rental_opened(rental.due_day)
+            self.feed.publish(RENTAL_CREATED, {"rental": rental.to_dict(),
+                                               "game": games[rental.game_id].to_dict()})
+        return rentals
+
+    def rebuild_aggregates(self):
+        conn = self._connection()
+        aggregates = DashboardAggregates()
+        for due_date, returned, fee in conn.execute("SELECT due_date, returned, late_fee FROM rentals"):
+            due = date_ordinal(due_date)
+            aggregates.rental_opened(due)
+            if returned:
+                aggregates.rental_closed(due, fee)
+        aggregates.games, aggregates.stock_on_hand = conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(stock), 0) FROM games").fetchone()
+        self.aggregates = aggregates
+
+    # --- Serialization ---
+    def dashboard(self):
+        # Rows are encoded one at a time into a single buffer as the cursor
+        # steps through them; no list of records is ever built.
+        conn = self._connection()
+        out = bytearray(b'{"users":[')
+        self._encode_rows(out, conn.execute(f"SELECT {USER_COLUMNS} FROM users ORDER BY user_id"), _user)
+        out += b'],"games":['
+        self._encode_rows(out, conn.execute(f"SELECT {GAME_COLUMNS} FROM games ORDER BY game_id"), _game)
+        out += b'],"rentals":['
+        self._encode_rows(out, conn.execute(f"SELECT {RENTAL_COLUMNS} FROM rentals ORDER BY rental_id"), _rental)
+        out += b"]}"
+        return RawJSON(out)
+
+    @staticmethod
+    def _encode_rows(out, cursor, make):
+        first = True
+        for row in cursor:
+            if not first:
+                out += b","
+            out += dumps(make(row).to_dict())
+            first = False
+
+
+class _ThreadConnection:
+    # Kept in the store's thread-local. A thread's locals are dropped when it
+    # exits, so the threaded engine's one thread per client connection
+    # closes its SQLite connection (and frees its page cache) on the way out.
+    __slots__ = ("store", "conn")
+
+    def __init__(self, store, conn):
+        self.store = store
+        self.conn = conn
+
+    def __del__(self):
+        self.store._release(self.conn)
+
+
+class _Transaction:
+    # BEGIN IMMEDIATE takes SQLite's write lock up front, so the reads inside
+    # a write transaction see exactly the state the writes will apply to.
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __enter__(self):
+        self.conn.execute("BEGIN IMMEDIATE")
+        return self.conn
+
+    def __exit__(self, exc_type, exc, tb):
+        self.conn.execute("ROLLBACK" if exc_type else "COMMIT")
+        return False
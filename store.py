@@ -0,0 +1,643 @@
+import bisect
+import threading
+from dataclasses import dataclass
+
+from aggregates import DashboardAggregates, date_ordinal, late_fee, ordinal_date, today_ordinal
+from concurrency import DEFAULT_STRIPES, IdAllocator, LockStripes, MultiLock
+from feed import GAME_ADDED, RENTAL_CREATED, RENTAL_RETURNED, USER_ADDED, ChangeFeed
+from overdue import OverdueIndex
+from search import SearchIndex
+
+DATE_FORMAT = "%Y-%m-%d"
+RENTAL_DAYS = 7
+
+
+class StoreError(Exception):
+    pass
+
+
+class BulkError(StoreError):
+    # Per-record problems found in a bulk batch; nothing was applied
+    def __init__(self, errors):
+        super().__init__(f"{len(errors)} records rejected; nothing was imported")
+        self.errors = errors
+
+
+# --- Records ---
+# Slotted dataclasses keep per-record overhead small enough to hold millions
+# of rentals; to_dict() produces the same JSON shape the dict records had.
+@dataclass(slots=True)
+class User:
+    user_id: int
+    name: str
+    email: str
+    password: str
+
+    def to_dict(self):
+        # Never expose the password in replies
+        return {"user_id": self.user_id, "name": self.name, "email": self.email}
+
+
+@dataclass(slots=True)
+class Game:
+    game_id: int
+    title: str
+    stock: int
+    available: bool = True
+
+    def to_dict(self):
+        return {"game_id": self.game_id, "title": self.title, "stock": self.stock, "available": self.available}
+
+
+@dataclass(slots=True)
+class Rental:
+    # Dates are day ordinals (aggregates.date_ordinal); due_date and
+    # return_date give the ISO strings used on the wire
+    rental_id: int
+    user_id: int
+    game_id: int
+    due_day: int
+    returned: bool = False
+    late_fee: int = 0
+    return_day: int = None
+
+    @property
+    def due_date(self):
+        return ordinal_date(self.due_day)
+
+    @property
+    def return_date(self):
+        return None if self.return_day is None else ordinal_date(self.return_day)
+
+    def to_dict(self):
+        data = {"rental_id": self.rental_id, "user_id": self.user_id, "game_id": self.game_id,
+                "returned": self.returned, "late_fee": self.late_fee, "due_date": self.due_date}
+        if self.return_day is not None:
+            data["return_date"] = ordinal_date(self.return_day)
+        return data
+
+
+# Fields a query may project, per record type
+USER_FIELDS = ("user_id", "name", "email")
+GAME_FIELDS = ("game_id", "title", "stock", "available")
+RENTAL_FIELDS = ("rental_id", "user_id", "game_id", "returned", "late_fee", "due_date", "return_date")
+
+
+def user_text(user):
+    # What the user search index matches against
+    return f"{user.name} {user.email}"
+
+
+# --- Helper functions ---
+def valid_stock(stock):
+    return isinstance(stock, int) and not isinstance(stock, bool) and stock >= 0
+
+
+def ids_after(ids, after):
+    # ids is sorted ascending; yields those greater than the cursor
+    start = bisect.bisect_right(ids, after) if after is not None else 0
+    for i in range(start, len(ids)):
+        yield ids[i]
+
+
+# --- Store ---
+class Store:
+    # Primary indexes map id -> record. Rentals by user/game are sorted lists
+    # of rental ids, so a cursor seeks with bisect and a page costs
+    # O(log n + page size). Open rentals are a dict for O(1) membership plus
+    # a sorted id list with lazy removal, compacted once half of it is stale.
+    #
+    # Game.stock is the number of copies on hand: renting takes one copy and
+    # returning puts it back, both under the game's lock, and
+    # Game.available mirrors stock > 0.
+    #
+    # Locking: ids come from IdAllocator. Per-game state is guarded by the
+    # game's stripe and per-user indexes by the user's stripe, always taken
+    # in that order. Single dict inserts/deletes on the shared primary
+    # indexes are atomic on their own.
+    #
+    # As one shard of a cluster (cluster.py) the store allocates every
+    # `shards`-th game and rental id starting at shard + 1, so an id alone
+    # names its shard. User ids come from shard 0 and are copied to the
+    # other shards with replicate_users().
+    # Can keep a replication log and serve read replicas (replication.py)
+    supports_replication = True
+
+    def __init__(self, stripes=DEFAULT_STRIPES, shard=0, shards=1):
+        self.users = {}
+        self.games = {}
+        self.rentals = {}
+
+        self.users_by_email = {}
+        self.rentals_by_user = {}
+        self.rentals_by_game = {}
+        self.open_rentals = {}
+        self._open_order = []
+        self._open_lock = threading.Lock()
+
+        self.user_ids = IdAllocator()
+        self.game_ids = IdAllocator(shard + 1, shards)
+        self.rental_ids = IdAllocator(shard + 1, shards)
+
+        self.game_locks = LockStripes(stripes)
+        self.user_locks = LockStripes(stripes)
+        self.email_locks = LockStripes(stripes)
+
+        self.aggregates = DashboardAggregates()
+        self.overdue = OverdueIndex()
+        self.feed = ChangeFeed()
+        # Word indexes for the search action, updated on every insert
+        self.user_search = SearchIndex(lambda user_id: user_text(self.users[user_id]))
+        self.game_search = SearchIndex(lambda game_id: self.games[game_id].title)
+        # Set by persistence.attach(); receives one record per mutation
+        self.journal = None
+        # Set on a primary that serves read replicas (replication.py); gets
+        # the same records as the journal
+        self.replication = None
+
+    # --- Lookups ---
+    def get_user(self, user_id):
+        user = self.users.get(user_id)
+        if user is None:
+            raise StoreError(f"User {user_id} not found")
+        return user
+
+    def get_game(self, game_id):
+        game = self.games.get(game_id)
+        if game is None:
+            raise StoreError(f"Game {game_id} not found")
+        return game
+
+    def get_rental(self, rental_id):
+        rental = self.rentals.get(rental_id)
+        if rental is None:
+            raise StoreError("Rental not found")
+        return rental
+
+    def find_user_by_email(self, email):
+        return self.users_by_email.get(email.lower())
+
+    def search_users(self, query, limit, fuzzy=False):
+        return [(self.users[user_id], match) for user_id, match in self.user_search.search(query, limit, fuzzy)]
+
+    def search_games(self, query, limit, fuzzy=False):
+        return [(self.games[game_id], match) for game_id, match in self.game_search.search(query, limit, fuzzy)]
+
+    def user_rentals(self, user_id):
+        return [self.rentals[i] for i in self.rentals_by_user.get(user_id, ())]
+
+    def game_rentals(self, game_id):
+        return [self.rentals[i] for i in self.rentals_by_game.get(game_id, ())]
+
+    # --- Ordered scans (cursor = last id already seen) ---
+    def iter_users(self, after=None):
+        users = self.users
+        for user_id in self.user_ids.after(after):
+            user = users.get(user_id)
+            if user is not None:
+                yield user
+
+    def iter_games(self, after=None):
+        games = self.games
+        for game_id in self.game_ids.after(after):
+            game = games.get(game_id)
+            if game is not None:
+                yield game
+
+    def iter_rentals(self, after=None, user_id=None, game_id=None, status="all"):
+        # Walk the narrowest index that satisfies the filters
+        rentals = self.rentals
+        open_only = status in ("open", "overdue")
+        today = today_ordinal()
+        if user_id is not None or game_id is not None:
+            if user_id is not None and game_id is not None:
+                by_user = self.rentals_by_user.get(user_id, ())
+                by_game = self.rentals_by_game.get(game_id, ())
+                ids = by_user if len(by_user) <= len(by_game) else by_game
+            elif user_id is not None:
+                ids = self.rentals_by_user.get(user_id, ())
+            else:
+                ids = self.rentals_by_game.get(game_id, ())
+            candidates = (rentals[i] for i in ids_after(ids, after))
+        elif status == "overdue":
+            self.overdue.advance(today)
+            # get(), not a membership test and a lookup: a return can remove
+            # the rental in between
+            overdue = self.overdue.overdue
+            candidates = (rental for rental in map(overdue.get, ids_after(self.overdue.ids(), after))
+                          if rental is not None)
+        elif open_only:
+            candidates = (rentals[i] for i in ids_after(self._open_order, after) if i in self.open_rentals)
+        else:
+            candidates = (rentals[i] for i in self.rental_ids.after(after) if i in rentals)
+        for rental in candidates:
+            if user_id is not None and rental.user_id != user_id:
+                continue
+            if game_id is not None and rental.game_id != game_id:
+                continue
+            if open_only and rental.returned:
+                continue
+            if status == "returned" and not rental.returned:
+                continue
+            if status == "overdue" and rental.due_day >= today:
+                continue
+            yield rental
+
+    # --- Counts ---
+    def count_users(self):
+        return len(self.users)
+
+    def count_games(self):
+        return len(self.games)
+
+    def count_rentals(self, status="all", user_id=None, game_id=None):
+        # Totals come straight from index sizes when the filter lines up with
+        # an index; otherwise only the narrowed candidate set is counted.
+        if user_id is None and game_id is None:
+            if status == "all":
+                return len(self.rentals)
+            if status == "open":
+                return len(self.open_rentals)
+            if status == "returned":
+                return len(self.rentals) - len(self.open_rentals)
+            if status == "overdue":
+                self.overdue.advance()
+                return len(self.overdue)
+        elif status == "all" and (user_id is None or game_id is None):
+            index = self.rentals_by_user if user_id is not None else self.rentals_by_game
+            return len(index.get(user_id if user_id is not None else game_id, ()))
+        return sum(1 for _ in self.iter_rentals(None, user_id, game_id, status))
+
+    @property
+    def version(self):
+        # Bumped by every mutation once it is visible, since each one
+        # publishes a change event; tags cached replies (serializer.py)
+        return self.feed.seq
+
+    @property
+    def epoch(self):
+        # Which run of which server the version belongs to
+        return self.feed.epoch
+
+    def stock_by_game(self):
+        return {g.game_id: g.stock for g in list(self.games.values())}
+
+    def lock_waits(self):
+        return {"game": self.game_locks.wait_stats(), "user": self.user_locks.wait_stats(),
+                "email": self.email_locks.wait_stats()}
+
+    def track_overdue(self):
+        # An OverdueScheduler will call advance_overdue() from now on
+        self.overdue.track_newly = True
+
+    def advance_overdue(self, today=None):
+        # Rentals that became overdue since the last call (OverdueScheduler),
+        # including those a query already moved into the overdue index
+        self.overdue.advance(today)
+        return self.overdue.take_newly()
+
+    # --- Mutations ---
+    # Multi-record operations pass a `batch` list down; their journal
+    # records are collected there and written as one ["B", [...]] record,
+    # so recovery replays the whole operation or none of it.
+    def _log(self, record, batch=None):
+        if batch is not None:
+            batch.append(record)
+        else:
+            self._write(record)
+
+    def _log_batch(self, batch):
+        if batch:
+            self._write(["B", batch])
+
+    def _write(self, record):
+        if self.journal is not None:
+            self.journal.append(record)
+        if self.replication is not None:
+            self.replication.append(record)
+
+    def add_user(self, name, email, password):
+        key = email.lower()
+        with self.email_locks.lock_for(key):
+            if key in self.users_by_email:
+                raise StoreError(f"Email {email} already registered")
+            return self._insert_user(name, email, password)
+
+    def _insert_user(self, name, email, password, batch=None):
+        # Caller holds the email's stripe lock and has checked uniqueness
+        user = User(self.user_ids.allocate(), name, email, password)
+        self.users[user.user_id] = user
+        self.users_by_email[email.lower()] = user
+        self.user_search.add(user.user_id, user_text(user))
+        self._log(["U", user.user_id, name, email, password], batch)
+        self.feed.publish(USER_ADDED, user.to_dict())
+        return user
+
+    def replicate_users(self, rows):
+        # rows: (user_id, name, email, password) of users created on another
+        # shard; already known ids are skipped, so a retry is harmless
+        batch = []
+        for user_id, name, email, password in rows:
+            with self.email_locks.lock_for(email.lower()):
+                if user_id in self.users:
+                    continue
+                user = User(user_id, name, email, password)
+                self.users[user_id] = user
+                self.users_by_email[email.lower()] = user
+                self.user_search.add(user_id, user_text(user))
+                self.user_ids.advance_past(user_id)
+                self._log(["U", user_id, name, email, password], batch)
+                self.feed.publish(USER_ADDED, user.to_dict())
+        self._log_batch(batch)
+
+    def add_game(self, title, stock):
+        if not valid_stock(stock):
+            raise StoreError("Stock must be a non-negative integer")
+        return self._insert_game(title, stock)
+
+    def _insert_game(self, title, stock):
+        game = Game(self.game_ids.allocate(), title, stock, stock > 0)
+        self._insert_games([game], ["G", game.game_id, title, stock])
+        return game
+
+    def _insert_games(self, games, record):
+        # Visible before they are logged, like rentals, so a snapshot whose
+        # rotation lands in between still copies them. Their stripe locks
+        # are held throughout: a rental of a new game waits for them, so it
+        # is never logged ahead of its game.
+        with MultiLock(self.game_locks.locks_for(game.game_id for game in games)):
+            for game in games:
+                self.games[game.game_id] = game
+                self.game_search.add(game.game_id, game.title)
+            self._log(record)
+            for game in games:
+                self.aggregates.game_added(game.stock)
+                self.feed.publish(GAME_ADDED, game.to_dict())
+
+    def _due_day(self, today):
+        return (today or today_ordinal()) + RENTAL_DAYS
+
+    def _take_copy(self, game, user_id, due_day, batch=None):
+        # Caller holds the game's stripe lock and has checked stock
+        game.stock -= 1
+        game.available = game.stock > 0
+        rental = Rental(self.rental_ids.allocate(), user_id, game.game_id, due_day)
+        self._index_rental(rental)
+        self._log(["R", rental.rental_id, user_id, game.game_id, ordinal_date(due_day), game.stock], batch)
+        self.aggregates.rental_opened(due_day)
+        self.feed.publish(RENTAL_CREATED, {"rental": rental.to_dict(), "game": game.to_dict()})
+        return rental
+
+    def _index_rental(self, rental):
+        self.rentals[rental.rental_id] = rental
+        # insort, not append: ids are allocated before the locks below are
+        # taken, so two threads can arrive here slightly out of order
+        bisect.insort(self.rentals_by_game.setdefault(rental.game_id, []), rental.rental_id)
+        if not rental.returned:
+            with self._open_lock:
+                self.open_rentals[rental.rental_id] = rental
+                bisect.insort(self._open_order, rental.rental_id)
+            self.overdue.add(rental)
+        with self.user_locks.lock_for(rental.user_id):
+            bisect.insort(self.rentals_by_user.setdefault(rental.user_id, []), rental.rental_id)
+
+    def _close_rental(self, rental, return_day, fee):
+        # Caller holds the game's stripe lock
+        rental.returned = True
+        rental.return_day = return_day
+        rental.late_fee = fee
+        with self._open_lock:
+            del self.open_rentals[rental.rental_id]
+            if len(self._open_order) > 2 * len(self.open_rentals) + 1024:
+                self._open_order = sorted(self.open_rentals)
+        self.overdue.remove(rental)
+
+    def create_rental(self, user_id, game_id, today=None):
+        self.get_user(user_id)
+        game = self.get_game(game_id)
+        due_day = self._due_day(today)
+        with self.game_locks.lock_for(game_id):
+            if game.stock <= 0:
+                raise StoreError(f"Game {game_id} is out of stock")
+            return self._take_copy(game, user_id, due_day)
+
+    def reserve_games(self, user_id, game_ids, today=None):
+        # All-or-nothing: every requested copy is checked under the locks of
+        # all involved games before any stock is taken.
+        self.get_user(user_id)
+        if not game_ids:
+            raise StoreError("No games requested")
+        wanted = {}
+        for game_id in game_ids:
+            wanted[game_id] = wanted.get(game_id, 0) + 1
+        games = {game_id: self.get_game(game_id) for game_id in wanted}
+        due_day = self._due_day(today)
+        with MultiLock(self.game_locks.locks_for(wanted)):
+            short = [game_id for game_id, count in wanted.items() if games[game_id].stock < count]
+            if short:
+                raise StoreError(f"Not enough stock for games {short}")
+            batch = []
+            rentals = [self._take_copy(games[game_id], user_id, due_day, batch) for game_id in game_ids]
+            self._log_batch(batch)
+            return rentals
+
+    def return_rental(self, rental_id, today=None):
+        rental = self.get_rental(rental_id)
+        game = self.games[rental.game_id]
+        today = today or today_ordinal()
+        with self.game_locks.lock_for(rental.game_id):
+            if rental.returned:
+                raise StoreError(f"Rental {rental_id} already returned")
+            game.stock += 1
+            game.available = True
+            self._close_rental(rental, today, late_fee(rental.due_day, today))
+            self._log(["X", rental_id, ordinal_date(today), rental.late_fee, game.stock])
+            # Before publishing: that bumps the version, and a stats reply
+            # cached under it must already see the return
+            self.aggregates.rental_closed(rental.due_day, rental.late_fee)
+            self.feed.publish(RENTAL_RETURNED, {"rental": rental.to_dict(), "game": game.to_dict()})
+        return rental
+
+    # --- Bulk imports ---
+    # Each batch is checked as a whole under the locks it needs; if any
+    # record conflicts with the store (duplicate email, unknown user or
+    # game, not enough stock) BulkError lists every such record and nothing
+    # is applied. Otherwise all of it is applied and journaled as one record.
+    def import_users(self, rows):
+        # rows: (name, email, password) with the password already hashed
+        keys = [email.lower() for _, email, _ in rows]
+        with MultiLock(self.email_locks.locks_for(keys)):
+            errors, seen = [], set()
+            for index, key in enumerate(keys):
+                if key in self.users_by_email or key in seen:
+                    errors.append({"index": index, "message": f"Email {rows[index][1]} already registered"})
+                seen.add(key)
+            if errors:
+                raise BulkError(errors)
+            batch = []
+            users = [self._insert_user(name, email, password, batch) for name, email, password in rows]
+            self._log_batch(batch)
+        return users
+
+    def import_games(self, rows):
+        # rows: (title, stock)
+        errors = [{"index": index, "message": "Stock must be a non-negative integer"}
+                  for index, (_, stock) in enumerate(rows) if not valid_stock(stock)]
+        if errors:
+            raise BulkError(errors)
+        games = [Game(self.game_ids.allocate(), title, stock, stock > 0) for title, stock in rows]
+        self._insert_games(games, ["B", [["G", game.game_id, game.title, game.stock] for game in games]])
+        return games
+
+    def import_rentals(self, rows, today=None):
+        # rows: (user_id, game_id, due day ordinal or None for the default)
+        default_due = self._due_day(today)
+        errors, wanted = [], {}
+        for index, (user_id, game_id, _) in enumerate(rows):
+            if user_id not in self.users:
+                errors.append({"index": index, "message": f"User {user_id} not found"})
+            elif game_id not in self.games:
+                errors.append({"index": index, "message": f"Game {game_id} not found"})
+            else:
+                wanted.setdefault(game_id, []).append(index)
+        if errors:
+            raise BulkError(errors)
+        with MultiLock(self.game_locks.locks_for(wanted)):
+            for game_id, indexes in wanted.items():
+                for index in indexes[self.games[game_id].stock:]:
+                    errors.append({"index": index, "message": f"Game {game_id} is out of stock"})
+            if errors:
+                raise BulkError(sorted(errors, key=lambda e: e["index"]))
+            batch = []
+            rentals = [self._take_copy(self.games[game_id], user_id, due_day or default_due, batch)
+                       for user_id, game_id, due_day in rows]
+            self._log_batch(batch)
+        return rentals
+
+    # --- Journal records ---
+    # One compact list per mutation, describing the state it left behind:
+    #   ["U", user_id, name, email, password]
+    #   ["G", game_id, title, stock]
+    #   ["R", rental_id, user_id, game_id, due_date, game_stock_after]
+    #   ["X", rental_id, return_date, late_fee, game_stock_after]
+    #   ["B", [record, ...]]   several of the above from one operation
+    # Applying a record twice, or on top of a snapshot that already saw it,
+    # leaves the same state, which is what fuzzy snapshots rely on.
+    def apply_record(self, record):
+        op = record[0]
+        if op == "U":
+            _, user_id, name, email, password = record
+            if user_id not in self.users:
+                user = User(user_id, name, email, password)
+                self.users[user_id] = user
+                self.users_by_email[email.lower()] = user
+                self.user_search.add(user_id, user_text(user))
+                self.user_ids.advance_past(user_id)
+        elif op == "G":
+            _, game_id, title, stock = record
+            if game_id not in self.games:
+                self.games[game_id] = Game(game_id, title, stock, stock > 0)
+                self.game_search.add(game_id, title)
+                self.game_ids.advance_past(game_id)
+        elif op == "R":
+            _, rental_id, user_id, game_id, due_date, stock = record
+            if rental_id not in self.rentals:
+                self._index_rental(Rental(rental_id, user_id, game_id, date_ordinal(due_date)))
+                self.rental_ids.advance_past(rental_id)
+            self._set_stock(game_id, stock)
+        elif op == "X":
+            _, rental_id, return_date, fee, stock = record
+            rental = self.rentals[rental_id]
+            if not rental.returned:
+                self._close_rental(rental, date_ordinal(return_date), fee)
+            self._set_stock(rental.game_id, stock)
+        elif op == "B":
+            for entry in record[1]:
+                self.apply_record(entry)
+        else:
+            raise StoreError(f"Unknown journal record {op!r}")
+
+    def replay(self, record):
+        # apply_record() for a live read replica: records that change the
+        # store also update the aggregates and the change feed, which
+        # recovery instead rebuilds once at the end
+        op = record[0]
+        if op == "B":
+            for entry in record[1]:
+                self.replay(entry)
+            return
+        record_id = record[1]
+        if op == "U":
+            new = record_id not in self.users
+        elif op == "G":
+            new = record_id not in self.games
+        elif op == "R":
+            new = record_id not in self.rentals
+        else:
+            new = op == "X" and not self.get_rental(record_id).returned
+        self.apply_record(record)
+        if not new:
+            return
+        if op == "U":
+            self.feed.publish(USER_ADDED, self.users[record_id].to_dict())
+        elif op == "G":
+            game = self.games[record_id]
+            self.aggregates.game_added(game.stock)
+            self.feed.publish(GAME_ADDED, game.to_dict())
+        else:
+            rental = self.rentals[record_id]
+            game = self.games[rental.game_id].to_dict()
+            if op == "R":
+                self.aggregates.rental_opened(rental.due_day)
+                self.feed.publish(RENTAL_CREATED, {"rental": rental.to_dict(), "game": game})
+            else:
+                self.aggregates.rental_closed(rental.due_day, rental.late_fee)
+                self.feed.publish(RENTAL_RETURNED, {"rental": rental.to_dict(), "game": game})
+
+    def _set_stock(self, game_id, stock):
+        game = self.games[game_id]
+        game.stock = stock
+        game.available = stock > 0
+
+    def snapshot_records(self):
+        # Yields records that rebuild the whole store; used for snapshots.
+        # Each index is copied first, so concurrent writers are tolerated and
+        # whatever they change is covered by replaying the journal tail.
+        # Rentals whose user or game was added after the copy are skipped;
+        # the tail replays them too.
+        users = list(self.users.values())
+        games = {g.game_id: g for g in list(self.games.values())}
+        user_ids = {u.user_id for u in users}
+        for user in users:
+            yield ["U", user.user_id, user.name, user.email, user.password]
+        for game in games.values():
+            yield ["G", game.game_id, game.title, game.stock]
+        for rental in list(self.rentals.values()):
+            game = games.get(rental.game_id)
+            if game is None or rental.user_id not in user_ids:
+                continue
+            yield ["R", rental.rental_id, rental.user_id, rental.game_id, rental.due_date, game.stock]
+            if rental.returned:
+                yield ["X", rental.rental_id, rental.return_date, rental.late_fee, game.stock]
+
+    def rebuild_aggregates(self):
+        # Bulk loads bypass the per-mutation hooks; recount once afterwards
+        aggregates = DashboardAggregates()
+        for rental in self.rentals.values():
+            aggregates.rental_opened(rental.due_day)
+            if rental.returned:
+                aggregates.rental_closed(rental.due_day, rental.late_fee)
+        aggregates.games = len(self.games)
+        aggregates.stock_on_hand = sum(g.stock for g in self.games.values())
+        self.aggregates = aggregates
+        # Sort the words a bulk load added now rather than in the first search
+        self.user_search.settle()
+        self.game_search.settle()
+
+    # --- Serialization ---
+    def dashboard(self):
+        # list() copies each index in one C-level step, so writers on other
+        # threads cannot change the dict mid-iteration.
+        return {"users": [u.to_dict() for u in list(self.users.values())],
+                "games": [g.to_dict() for g in list(self.games.values())],
+                "rentals": [r.to_dict() for r in list(self.rentals.values())]}
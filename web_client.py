@@ -1,41 +1,122 @@
-from flask import Flask, render_template_string, request, redirect
-import socket
-import json
+import threading
+import time
+from collections import OrderedDict
+from datetime import date
+
+from flask import Flask, request, redirect
+from client import ClientError, ConnectionPool
+from serializer import dumps
 
 HOST = "127.0.0.1"
 PORT = 5000
+# Read replicas (host, port); the dashboard is read from them when set
+REPLICAS = []
+
+# Items per dashboard section and per search reply
+PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+# Seconds a page is served without asking the server whether its data
+# changed; the web client's own writes skip the wait
+CACHE_TTL = 2.0
+CACHE_ENTRIES = 256
 
 app = Flask(__name__)
 
 USERNAME = ""
 PASSWORD = ""
 
+# Shared by all request threads; created once the credentials are known
+pool = None
+
 # --- Communication helper ---
 def send_request(data):
-    client = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-    client.connect((HOST, PORT))
-    # Authenticate first
-    auth_request = {"type": "auth", "username": USERNAME, "password": PASSWORD}
-    client.send(json.dumps(auth_request).encode())
-    auth_response = json.loads(client.recv(1024).decode())
-    if auth_response.get("status") != "ok":
-        client.close()
-        raise Exception("Authentication failed: " + auth_response.get("message", ""))
-    # Send actual request
-    client.send(json.dumps(data).encode())
-    response = json.loads(client.recv(8192).decode())
-    client.close()
-    return response
-
-# --- Dashboard data ---
-def get_dashboard_data():
-    try:
-        response = send_request({"action": "list_dashboard"})
-        return response
-    except Exception as e:
-        return {"users": [], "games": [], "rentals": [], "error": str(e)}
+    return pool.request(data)
+
+def fetch_page(message):
+    # One page of a paged query; an error reply raises, so it is not cached
+    reply = send_request(message)
+    if reply.get("status") != "ok":
+        raise ClientError(reply.get("message", "Request failed"))
+    return reply
+
+# --- Response cache ---
+class ServerCache:
+    # Rendered pages and JSON bodies, tagged with the server's data version:
+    # the stats action's "version", bumped by every mutation, qualified by
+    # its "epoch", since the count restarts with the server and each replica
+    # keeps its own. The version is asked for at most once per ttl, so
+    # within that window a page costs no round trip at all, and after it
+    # only one small request.
+    def __init__(self, ttl=CACHE_TTL, max_entries=CACHE_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._version = None
+        self._checked = float("-inf")
+        self._lock = threading.Lock()
+
+    def version(self):
+        now = time.monotonic()
+        with self._lock:
+            if now - self._checked < self.ttl:
+                return self._version
+        reply = fetch_page({"action": "stats"})
+        version = reply.get("version")
+        if version is not None:
+            version = f"{reply.get('epoch')}.{version}"
+        with self._lock:
+            self._version, self._checked = version, now
+        return version
+
+    def invalidate(self):
+        # After a write: the next request asks for the version again
+        with self._lock:
+            self._checked = float("-inf")
+
+    def get(self, key, build):
+        # Returns (version, body); a server without a version is never cached
+        version = self.version()
+        with self._lock:
+            cached = self._entries.get(key)
+            if cached is not None and version is not None and cached[0] == version:
+                self._entries.move_to_end(key)
+                return cached
+        body = build()
+        with self._lock:
+            self._entries[key] = (version, body)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return version, body
+
+cache = ServerCache()
+
+def cached_response(build, mimetype):
+    # Keyed by path, query string and day (overdue state moves with the
+    # date). The version doubles as the ETag, so a browser revalidating an
+    # unchanged page gets an empty 304.
+    day = date.today().toordinal()
+    key = (day, request.path, tuple(sorted(request.args.items(multi=True))))
+    version, body = cache.get(key, build)
+    response = app.response_class(body, mimetype=mimetype)
+    response.headers["Cache-Control"] = "no-cache"
+    if version is not None:
+        response.set_etag(f"{version}-{day}")
+    return response.make_conditional(request)
+
+def page_request(action, **filters):
+    # A paged query from the URL: ?cursor=&limit=
+    message = {"action": action, "limit": min(max(request.args.get("limit", PAGE_SIZE, type=int), 1), MAX_PAGE_SIZE)}
+    cursor = request.args.get("cursor", type=int)
+    if cursor is not None:
+        message["cursor"] = cursor
+    message.update((k, v) for k, v in filters.items() if v is not None)
+    return message
 
 # --- HTML Template ---
+# Only the first page of each list is rendered. The create/return inputs
+# fill their suggestions from the JSON endpoints as the user types, so the
+# page stays small however large the catalog is.
 TEMPLATE = """
 <!doctype html>
 <title>GameHub Web Client</title>
@@ -43,68 +124,163 @@ TEMPLATE = """
 
 <h2>Create Rental</h2>
 <form method="post" action="/create_rental">
-  User: 
-  <select name="user_id">
-    {% for u in users %}
-      <option value="{{ u.user_id }}">{{ u.name }} (ID: {{ u.user_id }})</option>
-    {% endfor %}
-  </select>
-  Game: 
-  <select name="game_id">
-    {% for g in games %}
-      <option value="{{ g.game_id }}">{{ g.title }} (ID: {{ g.game_id }})</option>
-    {% endfor %}
-  </select>
+  User:
+  <input name="user_id" list="user-options" data-source="/api/users" data-id="user_id"
+         data-label="{name} <{email}>" placeholder="Name, email or ID" autocomplete="off" required>
+  <datalist id="user-options"></datalist>
+  Game:
+  <input name="game_id" list="game-options" data-source="/api/games" data-id="game_id"
+         data-label="{title} (stock {stock})" placeholder="Title or ID" autocomplete="off" required>
+  <datalist id="game-options"></datalist>
   <input type="submit" value="Create Rental">
 </form>
 
 <h2>Return Rental</h2>
 <form method="post" action="/return_rental">
-  Rental: 
-  <select name="rental_id">
-    {% for r in rentals %}
-      <option value="{{ r.rental_id }}">Rental {{ r.rental_id }}: User {{ r.user_id }} - Game {{ r.game_id }}</option>
-    {% endfor %}
-  </select>
+  Rental:
+  <input name="rental_id" list="rental-options" data-source="/api/rentals" data-id="rental_id"
+         data-label="User {user_id} - Game {game_id}, due {due_date}" placeholder="Rental ID"
+         autocomplete="off" required>
+  <datalist id="rental-options"></datalist>
   <input type="submit" value="Return Rental">
 </form>
 
 <h2>Dashboard</h2>
+{% if stats %}
+<p>Active rentals: {{ stats.active_rentals }}, overdue: {{ stats.overdue_rentals }},
+   stock on hand: {{ stats.stock_on_hand }}, outstanding late fees: ${{ stats.outstanding_late_fees }}</p>
+{% endif %}
 
-<h3>Users</h3>
+<h3>Users ({{ users.total }})</h3>
 <ul>
-{% for u in users %}
+{% for u in users["items"] %}
   <li>ID: {{ u.user_id }}, Name: {{ u.name }}, Email: {{ u.email }}</li>
 {% endfor %}
 </ul>
+{% if users.next_cursor %}<a href="?users={{ users.next_cursor }}">Next users</a>{% endif %}
 
-<h3>Games</h3>
+<h3>Games ({{ games.total }})</h3>
 <ul>
-{% for g in games %}
+{% for g in games["items"] %}
   <li>ID: {{ g.game_id }}, Title: {{ g.title }}, Stock: {{ g.stock }}, Available: {{ g.available }}</li>
 {% endfor %}
 </ul>
+{% if games.next_cursor %}<a href="?games={{ games.next_cursor }}">Next games</a>{% endif %}
 
-<h3>Rentals</h3>
+<h3>Rentals ({{ rentals.total }})</h3>
 <ul>
-{% for r in rentals %}
+{% for r in rentals["items"] %}
   <li>Rental ID: {{ r.rental_id }}, User ID: {{ r.user_id }}, Game ID: {{ r.game_id }}, Returned: {{ r.returned }}, Late Fee: ${{ r.late_fee }}, Due: {{ r.due_date }}</li>
 {% endfor %}
 </ul>
+{% if rentals.next_cursor %}<a href="?rentals={{ rentals.next_cursor }}">Next rentals</a>{% endif %}
 
 {% if error %}
 <p style="color:red">Error: {{ error }}</p>
 {% endif %}
+
+<script>
+// Suggestions for the create/return inputs, fetched a short pause after
+// typing stops; the browser revalidates repeated searches with the ETag
+for (const input of document.querySelectorAll("input[data-source]")) {
+  const list = document.getElementById(input.getAttribute("list"));
+  let timer;
+  const load = () => {
+    fetch(input.dataset.source + "?limit=20&q=" + encodeURIComponent(input.value))
+      .then(reply => reply.json())
+      .then(page => list.replaceChildren(...(page.items || []).map(item => {
+        const option = document.createElement("option");
+        option.value = item[input.dataset.id];
+        option.textContent = input.dataset.label.replace(/\\{(\\w+)\\}/g, (_, field) => item[field]);
+        return option;
+      })));
+  };
+  input.addEventListener("focus", load, {once: true});
+  input.addEventListener("input", () => { clearTimeout(timer); timer = setTimeout(load, 200); });
+}
+</script>
 """
+EMPTY_PAGE = {"items": [], "next_cursor": None, "total": 0}
+# Parsed and compiled once instead of on every page load
+PAGE = app.jinja_env.from_string(TEMPLATE)
+
+def render_index():
+    # Each section pages on its own: ?users=, ?games=, ?rentals= cursors
+    sections = {}
+    for name, action in (("users", "list_users"), ("games", "list_games"), ("rentals", "list_rentals")):
+        message = {"action": action, "limit": PAGE_SIZE}
+        cursor = request.args.get(name, type=int)
+        if cursor is not None:
+            message["cursor"] = cursor
+        sections[name] = fetch_page(message)
+    stats = fetch_page({"action": "stats"})["stats"]
+    return PAGE.render(stats=stats, error=None, **sections)
 
 # --- Routes ---
 @app.route("/", methods=["GET"])
 def index():
-    data = get_dashboard_data()
-    return render_template_string(TEMPLATE, users=data.get("users", []),
-                                  games=data.get("games", []),
-                                  rentals=data.get("rentals", []),
-                                  error=data.get("error", None))
+    try:
+        return cached_response(render_index, "text/html")
+    except Exception as e:
+        return PAGE.render(stats=None, users=EMPTY_PAGE, games=EMPTY_PAGE, rentals=EMPTY_PAGE, error=str(e))
+
+# --- JSON endpoints ---
+# Pages of {"items", "next_cursor", "total"} for the inputs' suggestions and
+# for scripts: ?q= searches, ?cursor= and ?limit= page
+def json_response(build):
+    try:
+        return cached_response(build, "application/json")
+    except Exception as e:
+        return app.response_class(dumps({"error": str(e)}), status=502, mimetype="application/json")
+
+def json_page(message):
+    def build():
+        reply = fetch_page(message)
+        return dumps({"items": reply["items"], "next_cursor": reply["next_cursor"], "total": reply["total"]})
+    return json_response(build)
+
+def json_search(kind, text):
+    # Best matches first, typos allowed; one page only, so no cursor or total
+    message = {"action": "search", "kind": kind, "query": text, "fuzzy": True,
+               "limit": page_request("search")["limit"]}
+
+    def build():
+        return dumps({"items": fetch_page(message)[kind], "next_cursor": None, "total": None})
+    return json_response(build)
+
+def search_text():
+    return request.args.get("q", "").strip() or None
+
+@app.route("/api/users", methods=["GET"])
+def api_users():
+    # Words of the name or email; a number jumps to that user id
+    text = search_text()
+    if text is None:
+        return json_page(page_request("list_users"))
+    if text.isdigit():
+        return json_page(dict(page_request("list_users"), cursor=int(text) - 1))
+    return json_search("users", text)
+
+@app.route("/api/games", methods=["GET"])
+def api_games():
+    text = search_text()
+    if text is None:
+        return json_page(page_request("list_games"))
+    if text.isdigit():
+        return json_page(dict(page_request("list_games"), cursor=int(text) - 1))
+    return json_search("games", text)
+
+@app.route("/api/rentals", methods=["GET"])
+def api_rentals():
+    # Open rentals by default (what can be returned); q is a rental id to
+    # start from
+    text = search_text()
+    message = page_request("list_rentals", status=request.args.get("status", "open"),
+                           user_id=request.args.get("user_id", type=int),
+                           game_id=request.args.get("game_id", type=int))
+    if text is not None and text.isdigit():
+        message["cursor"] = int(text) - 1
+    return json_page(message)
 
 @app.route("/create_rental", methods=["POST"])
 def create_rental():
@@ -114,6 +290,7 @@ def create_rental():
         send_request({"action": "create_rental", "user_id": user_id, "game_id": game_id})
     except Exception as e:
         print("Error creating rental:", e)
+    cache.invalidate()
     return redirect("/")
 
 @app.route("/return_rental", methods=["POST"])
@@ -123,10 +300,12 @@ def return_rental():
         send_request({"action": "return_rental", "rental_id": rental_id})
     except Exception as e:
         print("Error returning rental:", e)
+    cache.invalidate()
     return redirect("/")
 
 if __name__ == "__main__":
     # Ask for login once at start
     USERNAME = input("Enter server username: ")
     PASSWORD = input("Enter server password: ")
+    pool = ConnectionPool(HOST, PORT, USERNAME, PASSWORD, size=8, replicas=REPLICAS)
     app.run(host="0.0.0.0", port=8080)